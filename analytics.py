@@ -0,0 +1,185 @@
+"""
+Long-range nutrition analytics for /api/historical-data
+A user's dense daily history (get_daily_history rows, up to a year) is converted once into
+flat columns and then into prefix sums (array('d'), like user_store.py), so the total of any
+column over any day range is one subtraction. Windows (last 30/90/365 days), weekly and
+monthly rollups and trailing rolling averages are all built from those sums, which keeps
+a year of data in the low milliseconds without NumPy.
+
+Adherence is measured against the targets stored with each day's summary (the targets the
+user had that day), falling back to their current targets for days without one.
+"""
+
+import datetime
+from array import array
+from operator import sub
+from itertools import accumulate
+from config import ANALYTICS_ADHERENCE_TOLERANCE
+
+# Same cap as the get_daily_nutrition_history function
+MAX_DAYS = 366
+MAX_ROLLING_WINDOW = 90
+ROLLUP_PERIODS = ('week', 'month')
+MACROS = ('calories', 'protein', 'carbs', 'fats')
+# History row columns of each macro's current and per-day target
+TARGET_KEYS = {
+    'calories': ('calorie_target', 'day_calorie_target'),
+    'protein': ('protein_target_g', 'day_protein_target_g'),
+    'carbs': ('carbs_target_g', 'day_carbs_target_g'),
+    'fats': ('fat_target_g', 'day_fat_target_g')
+}
+DEFAULT_TARGETS = {'calories': 2000, 'protein': 150, 'carbs': 250, 'fats': 65}
+# kcal per gram, for macro ratios
+MACRO_CALORIES = {'protein': 4, 'carbs': 4, 'fats': 9}
+
+
+def parse_days(value) -> int:
+    """The `days` query parameter, capped at MAX_DAYS. Raises ValueError unless it is a whole number of at least 1."""
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("days must be a whole number") from None
+    if days < 1:
+        raise ValueError("days must be at least 1")
+    return min(days, MAX_DAYS)
+
+
+def parse_analytics_options(query) -> dict:
+    """Analytics options from /api/historical-data query parameters, or None when none are given.
+
+    windows=30,90,365  summaries of the last N days
+    rollup=week|month  per-period summaries over the requested days
+    rolling=7          trailing N-day averages aligned with the daily rows
+    daily=false        leave out the per-day rows (last_7_days)
+    Raises ValueError for invalid values.
+    """
+    options = {}
+    if query.get('windows'):
+        windows = sorted({int(value) for value in query['windows'].split(',') if value.strip()})
+        if not windows or windows[0] < 1 or windows[-1] > MAX_DAYS:
+            raise ValueError(f"windows must be between 1 and {MAX_DAYS} days")
+        options['windows'] = windows
+    if query.get('rollup'):
+        if query['rollup'] not in ROLLUP_PERIODS:
+            raise ValueError(f"rollup must be one of {', '.join(ROLLUP_PERIODS)}")
+        options['rollup'] = query['rollup']
+    if query.get('rolling'):
+        rolling = int(query['rolling'])
+        if not 1 < rolling <= MAX_ROLLING_WINDOW:
+            raise ValueError(f"rolling must be between 2 and {MAX_ROLLING_WINDOW} days")
+        options['rolling'] = rolling
+    if query.get('daily'):
+        options['daily'] = query['daily'].lower() not in ('0', 'false', 'no')
+    return options or None
+
+
+def days_to_load(days: int, options: dict) -> int:
+    """History length needed for `days` of output plus the analytics windows and rolling warm-up"""
+    if not options:
+        return days
+    needed = max([days, *options.get('windows', ())])
+    if options.get('rolling'):
+        needed = max(needed, days + options['rolling'] - 1)
+    return min(needed, MAX_DAYS)
+
+
+class DailySeries:
+    """Dense daily history as columns and their prefix sums (sums[column][i] = total of days before i)"""
+
+    def __init__(self, rows: list, tolerance: float = ANALYTICS_ADHERENCE_TOLERANCE):
+        self.dates = [datetime.date.fromisoformat(str(row['date'])[:10]) for row in rows]
+        self.size = len(rows)
+        logged = [1.0 if row.get('meals_logged_count') or row.get('calories') else 0.0 for row in rows]
+        columns = {'logged': logged}
+        for macro, (current_key, day_key) in TARGET_KEYS.items():
+            current = float((rows[-1].get(current_key) if rows else None) or DEFAULT_TARGETS[macro])
+            columns[macro] = [float(row.get(macro) or 0) for row in rows]
+            # Targets only count on logged days, so consumed / target compares like with like
+            columns[f'{macro}_target'] = [is_logged * float(row.get(day_key) or current) for is_logged, row in zip(logged, rows)]
+        columns['adherent'] = [1.0 if is_logged and abs(consumed - target) <= tolerance * target else 0.0
+                               for is_logged, consumed, target in zip(logged, columns['calories'], columns['calories_target'])]
+        self.sums = {name: array('d', accumulate(column, initial=0.0)) for name, column in columns.items()}
+
+    def total(self, column: str, start: int, end: int) -> float:
+        sums = self.sums[column]
+        return sums[end] - sums[start]
+
+    def summarize(self, start: int, end: int) -> dict:
+        """Averages per logged day, share of target eaten, calorie adherence and macro ratio of days [start, end)"""
+        days = end - start
+        logged = self.total('logged', start, end)
+        totals = {macro: self.total(macro, start, end) for macro in MACROS}
+        macro_calories = {macro: totals[macro] * kcal for macro, kcal in MACRO_CALORIES.items()}
+        macro_total = sum(macro_calories.values())
+        target_pct = {}
+        for macro in MACROS:
+            target = self.total(f'{macro}_target', start, end)
+            target_pct[macro] = round(totals[macro] / target * 100, 1) if target else None
+        return {
+            'start': self.dates[start].isoformat(),
+            'end': self.dates[end - 1].isoformat(),
+            'days': days,
+            'logged_days': int(logged),
+            'logged_pct': round(logged / days * 100, 1),
+            'average': {macro: round(totals[macro] / logged, 1) if logged else 0.0 for macro in MACROS},
+            'target_pct': target_pct,
+            'adherence_pct': round(self.total('adherent', start, end) / days * 100, 1),
+            'macro_ratio': {macro: round(value / macro_total, 3) if macro_total else None
+                            for macro, value in macro_calories.items()}
+        }
+
+    def windows(self, sizes: list) -> dict:
+        """Summaries of the last N days for each size (capped at the loaded history)"""
+        return {str(size): self.summarize(max(0, self.size - size), self.size) for size in sizes}
+
+    def rollups(self, period: str, start: int) -> list:
+        """Per-week (Monday first) or per-month summaries of days [start, size); edge periods may be partial"""
+        keys = [self._period_key(date, period) for date in self.dates]
+        periods = []
+        begin = start
+        for i in range(start + 1, self.size + 1):
+            if i == self.size or keys[i] != keys[begin]:
+                periods.append({'period': keys[begin], **self.summarize(begin, i)})
+                begin = i
+        return periods
+
+    @staticmethod
+    def _period_key(date: datetime.date, period: str) -> str:
+        if period == 'week':
+            year, week, _ = date.isocalendar()
+            return f'{year}-W{week:02d}'
+        return f'{date.year}-{date.month:02d}'
+
+    def trailing_means(self, column: str, window: int, start: int) -> list:
+        """Trailing `window`-day means of a column for days [start, size), over fewer days where the history is shorter"""
+        sums = self.sums[column]
+        # Days before the first full window average over the days so far
+        full_from = max(start, window - 1)
+        means = [(sums[i + 1] - sums[0]) / (i + 1) for i in range(start, min(full_from, self.size))]
+        means.extend(total / window for total in map(sub, sums[full_from + 1:], sums[full_from + 1 - window:self.size + 1 - window]))
+        return means
+
+    def rolling(self, window: int, start: int) -> dict:
+        """Trailing averages per macro (over all days, unlogged ones count as zero) and calorie adherence"""
+        result = {'window': window}
+        for macro in MACROS:
+            result[macro] = [round(value, 1) for value in self.trailing_means(macro, window, start)]
+        result['adherence_pct'] = [round(value * 100, 1) for value in self.trailing_means('adherent', window, start)]
+        return result
+
+
+def build_analytics(rows: list, days: int, options: dict) -> dict:
+    """The analytics section of /api/historical-data for dense history rows (oldest first)"""
+    series = DailySeries(rows)
+    # Rollups and rolling averages cover the requested days; windows may reach further back
+    start = max(0, series.size - days)
+    analytics = {'adherence_tolerance': ANALYTICS_ADHERENCE_TOLERANCE}
+    if series.size == 0:
+        return analytics
+    if options.get('windows'):
+        analytics['windows'] = series.windows(options['windows'])
+    if options.get('rollup'):
+        analytics['rollup'] = {'period': options['rollup'], 'periods': series.rollups(options['rollup'], start)}
+    if options.get('rolling'):
+        analytics['rolling'] = series.rolling(options['rolling'], start)
+    return analytics
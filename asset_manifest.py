@@ -0,0 +1,173 @@
+"""
+Runtime side of the image pipeline (see build_assets.py)
+Reads images/dist/manifest.json, rewrites image references in the dashboard HTML to the
+hashed, srcset-capable variants and picks AVIF/WebP/PNG for a request from its Accept header.
+Without a manifest everything falls back to the original images.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+ASSET_DIST_DIR = 'images/dist'
+ASSET_MANIFEST_PATH = os.path.join(ASSET_DIST_DIR, 'manifest.json')
+MANIFEST_VERSION = 1
+
+# Best first; PNG is always acceptable as the fallback
+FORMAT_PREFERENCE = ('image/avif', 'image/webp', 'image/png')
+
+IMG_TAG_RE = re.compile(r'<img\b[^>]*>')
+IMG_SRC_RE = re.compile(r'\bsrc="(images/[\w.-]+\.png)"')
+IMAGE_PATH_RE = re.compile(r'(?<![\w/])images/[\w.-]+\.png')
+
+def parse_accept(header_value: str) -> dict:
+    """Media range -> q value of an Accept header"""
+    qualities = {}
+    for media_range in header_value.split(','):
+        media_type, *params = media_range.split(';')
+        media_type = media_type.strip().lower()
+        if not media_type:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[media_type] = q
+    return qualities
+
+def accepted_quality(qualities: dict, mime_type: str) -> float:
+    """q value the client gave `mime_type`; newer formats only count when listed explicitly"""
+    if mime_type in qualities:
+        return qualities[mime_type]
+    if mime_type != 'image/png':
+        # Browsers send image/* and */* without supporting every image format
+        return 0.0
+    for media_range in ('image/*', '*/*'):
+        if media_range in qualities:
+            return qualities[media_range]
+    return 0.0
+
+
+class AssetManifest:
+    """manifest.json written by build_assets.py, reloaded when the file changes"""
+
+    def __init__(self, path: str = ASSET_MANIFEST_PATH, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._mtime = None
+        self._images = {}        # 'images/coin.png' -> manifest entry
+        self._alternates = {}    # '/images/dist/coin-30w.<hash>.png' -> {mime type: request path}
+
+    def _maybe_reload(self):
+        """Re-read the manifest if it changed (at most once per check_interval)"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._mtime:
+                return
+            self._load(mtime)
+
+    def _load(self, mtime):
+        images = {}
+        if mtime is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == MANIFEST_VERSION:
+                    images = manifest['images']
+                else:
+                    logger.warning(f"⚠️ Ignoring {self.path}: unsupported version {manifest.get('version')}")
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"❌ Could not read asset manifest {self.path}: {e}")
+
+        alternates = {}
+        for entry in images.values():
+            for variant in entry['variants']:
+                files = {mime_type: '/' + url for mime_type, url in variant['files'].items()}
+                if 'image/png' in files:
+                    alternates[files['image/png']] = files
+
+        self._images = images
+        self._alternates = alternates
+        self._mtime = mtime
+        if images:
+            logger.info(f"🖼️ Loaded asset manifest {self.path}: {len(images)} images")
+
+    @property
+    def version(self):
+        """mtime of the loaded manifest (None without one); changes whenever it is rebuilt"""
+        self._maybe_reload()
+        return self._mtime
+
+    def rewrite_html(self, html_content: str) -> str:
+        """Point images/*.png references at the built variants.
+
+        <img> tags get the 1x PNG as src plus a density srcset. Tags with an id keep a
+        plain src (the largest variant) because the dashboard script swaps their src,
+        which a srcset would override; image paths in script strings are rewritten the same way.
+        """
+        self._maybe_reload()
+        images = self._images
+        if not images:
+            return html_content
+
+        def rewrite_img_tag(match):
+            tag = match.group(0)
+            src_match = IMG_SRC_RE.search(tag)
+            if not src_match or src_match.group(1) not in images:
+                return tag
+            variants = images[src_match.group(1)]['variants']
+            if ' id="' in tag or ' srcset=' in tag:
+                attributes = f'src="{variants[-1]["files"]["image/png"]}"'
+            else:
+                srcset = ', '.join(f'{variant["files"]["image/png"]} {variant["density"]}x' for variant in variants)
+                attributes = f'src="{variants[0]["files"]["image/png"]}" srcset="{srcset}"'
+            return tag[:src_match.start()] + attributes + tag[src_match.end():]
+
+        def rewrite_path(match):
+            entry = images.get(match.group(0))
+            if entry is None:
+                return match.group(0)
+            return entry['variants'][-1]['files']['image/png']
+
+        html_content = IMG_TAG_RE.sub(rewrite_img_tag, html_content)
+        return IMAGE_PATH_RE.sub(rewrite_path, html_content)
+
+    def negotiate(self, path: str, accept: str):
+        """(request path to serve, whether the choice depended on Accept) for a built PNG variant"""
+        self._maybe_reload()
+        files = self._alternates.get(path)
+        if files is None:
+            return path, False
+
+        qualities = parse_accept(accept or '')
+        best_path, best_quality = path, 0.0
+        for mime_type in FORMAT_PREFERENCE:
+            if mime_type not in files:
+                continue
+            quality = accepted_quality(qualities, mime_type)
+            if quality > best_quality:
+                best_path, best_quality = files[mime_type], quality
+        return best_path, True
+
+
+asset_manifest = AssetManifest()
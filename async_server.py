@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Async Mini App Server for Nutrition Dashboard
+Serves the same routes as mini_app_server.py from one long-lived asyncio event loop (aiohttp),
+so many requests can wait on Supabase at the same time
+"""
+
+import asyncio
+import logging
+from aiohttp import web
+from aiohttp.web import Request, Response
+from mini_app_server import (
+    USER_DATA,
+    apply_user_data_update,
+    ingest_user_data_batch,
+    summary_write_behind,
+    build_dashboard_html,
+    build_test_dashboard_html,
+    build_health_response,
+    build_nutrition_api_response,
+    build_historical_api_response,
+    build_streak_api_response,
+    build_dashboard_bundle_response,
+    event_hub,
+    change_poller,
+    parse_server_args,
+)
+from static_files import resolve_static_request
+from compression import negotiate_encoding, encode_body
+from serialization import encode_payload, VARY as ENCODED_VARY
+from analytics import parse_days, parse_analytics_options
+from events import format_sse, SSE_HEARTBEAT
+from bulk_ingest import BulkIngestion
+from config import EVENTS_HEARTBEAT_INTERVAL, INGEST_COALESCE_WINDOW, INGEST_BATCH_SIZE
+from config import QUERY_DEBUG_HEADER, METRICS_ENABLED
+from supabase_db import close_shared_client, summary_replica
+from query_log import track_queries, HEADER_NAME as QUERY_LOG_HEADER
+from log_config import configure_logging, request_log_context
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, track_request
+from server_timing import track_timing, timed, HEADER_NAME as SERVER_TIMING_HEADER
+
+# Configure logging (LOG_* settings, see log_config.py)
+configure_logging()
+logger = logging.getLogger(__name__)
+
+NO_CACHE_HEADERS = {
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0'
+}
+
+def html_encoding(request: Request):
+    """'gzip' or None for a dashboard page (only gzip is precompressed, so HTML never uses brotli)"""
+    return negotiate_encoding(request.headers.get('Accept-Encoding'), allow_brotli=False)
+
+def html_response(html_content: bytes, encoding=None) -> Response:
+    """No-cache HTML response for an already rendered (and possibly compressed) page"""
+    headers = {**NO_CACHE_HEADERS, 'Vary': 'Accept-Encoding'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return web.Response(body=html_content, content_type='text/html', charset='utf-8', headers=headers)
+
+def json_response(request: Request, data, status: int = 200) -> Response:
+    """JSON (or, if the client asks, MessagePack) response, compressed when it is large enough and accepted"""
+    with timed('serialize'):
+        body, content_type = encode_payload(data, request.headers.get('Accept'))
+        body, encoding = encode_body(body, request.headers.get('Accept-Encoding'))
+    headers = {'Vary': ENCODED_VARY}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return web.Response(body=body, status=status, content_type=content_type, headers=headers)
+
+async def nutrition_dashboard(request: Request) -> Response:
+    """Serve the nutrition dashboard"""
+    user_id = request.query.get('user_id')
+
+    if not user_id:
+        return web.Response(status=400, text="User ID required")
+
+    try:
+        encoding = html_encoding(request)
+        html_content = await build_dashboard_html(user_id, gzip=encoding == 'gzip')
+        if not html_content:
+            return web.Response(status=500, text="HTML template not found")
+
+        return html_response(html_content, encoding)
+
+    except Exception as e:
+        logger.error(f"❌ Error serving dashboard: {e}")
+        return web.Response(status=500, text=f"Error loading dashboard: {str(e)}")
+
+async def test_dashboard(request: Request) -> Response:
+    """Serve test dashboard without user data"""
+    encoding = html_encoding(request)
+    html_content = build_test_dashboard_html(gzip=encoding == 'gzip')
+    if not html_content:
+        return web.Response(status=500, text="HTML template not found")
+
+    return html_response(html_content, encoding)
+
+async def health_check(request: Request) -> Response:
+    """Health check endpoint"""
+    return json_response(request, build_health_response())
+
+async def metrics(request: Request) -> Response:
+    """Prometheus metrics in the text exposition format"""
+    return Response(body=REGISTRY.render().encode('utf-8'), headers={'Content-Type': METRICS_CONTENT_TYPE})
+
+async def api_nutrition_data(request: Request) -> Response:
+    """API endpoint to return JSON nutrition data for a user"""
+    user_id = request.query.get('user_id', 'user_123')
+    return json_response(request, await build_nutrition_api_response(user_id))
+
+async def api_historical_data(request: Request) -> Response:
+    """API endpoint to return historical nutrition data for analytics"""
+    user_id = request.query.get('user_id', 'user_123')
+    try:
+        days = parse_days(request.query.get('days', '7'))
+        analytics_options = parse_analytics_options(request.query)
+    except ValueError as e:
+        return json_response(request, {'status': 'error', 'message': str(e)}, status=400)
+    return json_response(request, await build_historical_api_response(user_id, days, analytics_options))
+
+async def api_streak_data(request: Request) -> Response:
+    """API endpoint to return user's current streak and days since last meal log"""
+    user_id = request.query.get('user_id', 'user_123')
+    return json_response(request, await build_streak_api_response(user_id))
+
+async def api_dashboard(request: Request) -> Response:
+    """API endpoint to return nutrition, streak and history in one response"""
+    user_id = request.query.get('user_id', 'user_123')
+    try:
+        days = parse_days(request.query.get('days', '7'))
+    except ValueError as e:
+        return json_response(request, {'status': 'error', 'message': str(e)}, status=400)
+    return json_response(request, await build_dashboard_bundle_response(user_id, days))
+
+async def api_events(request: Request) -> web.StreamResponse:
+    """Server-sent events stream of nutrition changes for one user"""
+    user_id = request.query.get('user_id')
+    if not user_id:
+        return web.Response(status=400, text="User ID required")
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    await response.prepare(request)
+
+    subscription = event_hub.subscribe(user_id, asyncio.get_running_loop())
+    try:
+        await response.write(b"retry: 5000\n\n")
+        while True:
+            if not await subscription.wait_async(EVENTS_HEARTBEAT_INTERVAL):
+                await response.write(SSE_HEARTBEAT)
+                continue
+            message = subscription.take()
+            if message:
+                await response.write(format_sse(*message))
+    except ConnectionResetError:
+        pass
+    finally:
+        event_hub.unsubscribe(subscription)
+    return response
+
+async def api_update_user_data(request: Request) -> Response:
+    """API endpoint for bot to update user nutrition data"""
+    try:
+        data = await request.json()
+        return json_response(request, apply_user_data_update(data))
+
+    except Exception as e:
+        logger.error(f"❌ Error updating user data: {e}")
+        return json_response(request, {'status': 'error', 'message': str(e)}, status=400)
+
+async def api_bulk_update_user_data(request: Request) -> Response:
+    """API endpoint for the bot to stream many updates (NDJSON or a JSON array) in one request"""
+    ingestion = BulkIngestion(INGEST_COALESCE_WINDOW, INGEST_BATCH_SIZE)
+    try:
+        async for chunk in request.content.iter_any():
+            for batch in ingestion.feed(chunk):
+                # Waits while the write-behind queue is full, so the body is read no faster than it is stored
+                ingestion.count_applied(await ingest_user_data_batch(batch))
+        for batch in ingestion.finish():
+            ingestion.count_applied(await ingest_user_data_batch(batch))
+    except ValueError as e:
+        logger.error(f"❌ Error in bulk user data update: {e}")
+        return json_response(request, {**ingestion.result(), 'status': 'error', 'message': str(e)}, status=400)
+
+    result = ingestion.result()
+    logger.info("📥 Bulk update: %s received, %s applied, %s invalid", result['received'], result['applied'], result['invalid'])
+    return json_response(request, result)
+
+class StaticFileResponse(web.FileResponse):
+    """FileResponse that reports its status to the request's metrics once it has been sent:
+    aiohttp only decides between 200, 206, 304 and 416 (and sends the file) in prepare()"""
+
+    request_metrics = None
+
+    async def prepare(self, request: Request):
+        try:
+            return await super().prepare(request)
+        finally:
+            if self.request_metrics is not None:
+                self.request_metrics.status = self.status
+                self.request_metrics.finish()
+
+async def static_file(request: Request) -> Response:
+    """Serve static files like images (aiohttp handles conditional and Range requests with sendfile)"""
+    try:
+        info, extra_headers = resolve_static_request(request.path, request.headers.get('Accept', ''))
+    except PermissionError:
+        return web.Response(status=403, text="Forbidden")
+    except FileNotFoundError:
+        return web.Response(status=404, text="File not found")
+
+    return StaticFileResponse(info.path, headers={
+        'Content-Type': info.content_type,
+        **extra_headers
+    })
+
+@web.middleware
+async def request_context(request: Request, handler):
+    """Per-request metrics (metrics.py), log sampling/levels (log_config.py), backend query accounting (query_log.py)
+    and phase timing (server_timing.py)"""
+    with track_request(request.method, request.path) as request_metrics, \
+            request_log_context(request.path, request.query.get('user_id')), \
+            track_queries(f"{request.method} {request.path}") as query_log, \
+            track_timing(f"{request.method} {request.path}") as timing:
+        try:
+            response = await handler(request)
+        except web.HTTPException as e:
+            request_metrics.status = e.status
+            raise
+        request_metrics.status = response.status
+        if isinstance(response, StaticFileResponse):
+            response.request_metrics = request_metrics
+            request_metrics.defer()
+        if timing is not None and not response.prepared:
+            response.headers[SERVER_TIMING_HEADER] = timing.header_value()
+        if QUERY_DEBUG_HEADER and query_log is not None and not response.prepared:
+            response.headers[QUERY_LOG_HEADER] = query_log.header_value()
+        return response
+
+def create_app():
+    """Create the web application."""
+    app = web.Application(middlewares=[request_context])
+
+    # Add routes (GET routes also answer HEAD)
+    app.router.add_get('/', nutrition_dashboard)
+    app.router.add_get('/nutrition-dashboard', nutrition_dashboard)
+    app.router.add_get('/test', test_dashboard)
+    app.router.add_get('/health', health_check)
+    if METRICS_ENABLED:
+        app.router.add_get('/metrics', metrics)
+    app.router.add_get('/api/nutrition-data', api_nutrition_data)
+    app.router.add_get('/api/historical-data', api_historical_data)
+    app.router.add_get('/api/streak-data', api_streak_data)
+    app.router.add_get('/api/dashboard', api_dashboard)
+    app.router.add_get('/api/events', api_events)
+    app.router.add_get('/images/{filename:.+}', static_file)
+    app.router.add_post('/api/update-user-data', api_update_user_data)
+    app.router.add_post('/api/bulk-update-user-data', api_bulk_update_user_data)
+
+    # Backend change detection for /api/events runs on this app's event loop
+    async def start_change_poller(app):
+        change_poller.start(asyncio.get_running_loop())
+    app.on_startup.append(start_change_poller)
+
+    # Keep the local summary replica in sync on the same loop
+    if summary_replica is not None:
+        async def start_summary_replica(app):
+            summary_replica.start(asyncio.get_running_loop())
+        app.on_startup.append(start_summary_replica)
+
+    # Flush queued write-behind batches, then close the pooled Supabase connections on shutdown
+    app.on_cleanup.append(lambda app: summary_write_behind.drain())
+    app.on_cleanup.append(lambda app: close_shared_client())
+
+    # Flush the user store journal last, after any in-flight updates
+    async def close_user_store(app):
+        USER_DATA.close()
+    app.on_cleanup.append(close_user_store)
+
+    return app
+
+def run_async_server(port=8080, workers=1):
+    """Run the aiohttp server on a single event loop per process, pre-forking when workers > 1"""
+    logger.info(f"🚀 Starting async mini app server on port {port}")
+    if workers > 1:
+        from prefork import serve_prefork
+        serve_prefork(lambda sock: web.run_app(create_app(), sock=sock, print=None), port, workers)
+    else:
+        web.run_app(create_app(), host='0.0.0.0', port=port)
+
+if __name__ == '__main__':
+    args = parse_server_args()
+    run_async_server(args.port, args.workers)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Build-time image pipeline for the dashboard
+Downscales the PNG originals in images/ to the sizes nutritions_files.html displays them at
+(1x/2x/3x), encodes PNG, WebP and AVIF variants with content-hashed filenames into
+images/dist/ and writes images/dist/manifest.json for asset_manifest.py.
+
+Usage: python build_assets.py [--clean]
+Requires Pillow (pip install Pillow); AVIF is skipped if this Pillow build lacks it.
+"""
+
+import io
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import logging
+from asset_manifest import ASSET_DIST_DIR, ASSET_MANIFEST_PATH, MANIFEST_VERSION
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SOURCE_DIR = 'images'
+DENSITIES = (1, 2, 3)
+
+# CSS box (width, height) each image is displayed in, from nutritions_files.html
+DISPLAY_SIZES = {
+    'full_heart.png': (20, 20),           # .heart
+    'broken_heart.png': (20, 20),         # .heart
+    'flash_streak.png': (30, 30),         # .streak-icon-top
+    'stairs_streak_black.png': (30, 30),  # .streak-icon-top
+    'coin.png': (30, 30),                 # .coin-icon
+    'cat_waving.png': (120, 240),         # .cat-avatar
+    'cat_1.png': (120, 240),              # .cat-avatar
+    'cat_2.png': (120, 240),              # .cat-avatar
+    'cat_3.png': (120, 240),              # .cat-avatar
+    'meditation.png': (120, 120),         # .sports-image
+    'addwhoop.png': (120, 120),           # .sports-image
+    'runagent.png': (120, 120),           # .sports-image
+}
+
+def load_pillow():
+    """Import Pillow, or exit with an install hint"""
+    try:
+        from PIL import Image, features
+    except ImportError:
+        logger.error("❌ Pillow is required to build assets: pip install Pillow")
+        sys.exit(1)
+    return Image, features
+
+def encoders(features):
+    """(mime type, extension, save kwargs) for each output format this Pillow build supports"""
+    formats = [
+        ('image/png', 'png', {'format': 'PNG', 'optimize': True}),
+    ]
+    if features.check('webp'):
+        formats.append(('image/webp', 'webp', {'format': 'WEBP', 'quality': 85, 'method': 6}))
+    else:
+        logger.warning("⚠️ Pillow has no WebP support, skipping WebP variants")
+    if features.check('avif'):
+        formats.append(('image/avif', 'avif', {'format': 'AVIF', 'quality': 60}))
+    else:
+        logger.warning("⚠️ Pillow has no AVIF support, skipping AVIF variants")
+    return formats
+
+def target_size(original_size, display_size, density):
+    """Smallest size covering the CSS box at `density`, never larger than the original"""
+    width, height = original_size
+    box_width, box_height = display_size
+    scale = min(1.0, max(box_width * density / width, box_height * density / height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def write_hashed(data: bytes, stem: str, extension: str) -> str:
+    """Write bytes under a content-hashed name in the dist directory; returns the URL path"""
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    file_name = f"{stem}.{digest}.{extension}"
+    with open(os.path.join(ASSET_DIST_DIR, file_name), 'wb') as f:
+        f.write(data)
+    return f"{ASSET_DIST_DIR}/{file_name}"
+
+def build_image(Image, formats, file_name, display_size):
+    """Encode all variants of one image; returns its manifest entry"""
+    source_path = os.path.join(SOURCE_DIR, file_name)
+    stem = os.path.splitext(file_name)[0]
+    entry = {'display': list(display_size), 'variants': []}
+
+    with Image.open(source_path) as original:
+        original.load()
+        image = original.convert('RGBA')
+        seen_sizes = set()
+        for density in DENSITIES:
+            size = target_size(image.size, display_size, density)
+            if size in seen_sizes:
+                # The original is too small for this density; the previous variant covers it
+                continue
+            seen_sizes.add(size)
+            resized = image.resize(size, Image.LANCZOS) if size != image.size else image
+
+            files = {}
+            for mime_type, extension, save_kwargs in formats:
+                buffer = io.BytesIO()
+                resized.save(buffer, **save_kwargs)
+                files[mime_type] = write_hashed(buffer.getvalue(), f"{stem}-{size[0]}w", extension)
+            entry['variants'].append({'density': density, 'width': size[0], 'height': size[1], 'files': files})
+
+    return entry
+
+def build_assets(clean=False):
+    """Build every image listed in DISPLAY_SIZES and write the manifest"""
+    Image, features = load_pillow()
+    formats = encoders(features)
+
+    if clean and os.path.isdir(ASSET_DIST_DIR):
+        shutil.rmtree(ASSET_DIST_DIR)
+    os.makedirs(ASSET_DIST_DIR, exist_ok=True)
+
+    images = {}
+    original_bytes = 0
+    built_bytes = 0
+    for file_name, display_size in sorted(DISPLAY_SIZES.items()):
+        source_path = os.path.join(SOURCE_DIR, file_name)
+        if not os.path.exists(source_path):
+            logger.warning(f"⚠️ {source_path} not found, skipping")
+            continue
+
+        entry = build_image(Image, formats, file_name, display_size)
+        images[f"{SOURCE_DIR}/{file_name}"] = entry
+
+        original_bytes += os.path.getsize(source_path)
+        smallest = min((os.path.getsize(path) for path in entry['variants'][0]['files'].values()))
+        built_bytes += smallest
+        logger.info(f"🖼️ {file_name}: {len(entry['variants'])} sizes x {len(formats)} formats")
+
+    manifest = {'version': MANIFEST_VERSION, 'images': images}
+    temp_path = ASSET_MANIFEST_PATH + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_path, ASSET_MANIFEST_PATH)
+
+    if original_bytes:
+        saved = 100 * (1 - built_bytes / original_bytes)
+        logger.info(f"✅ Wrote {ASSET_MANIFEST_PATH}: originals {original_bytes / 1024:.0f} KiB, "
+                    f"smallest 1x variants {built_bytes / 1024:.0f} KiB ({saved:.1f}% less)")
+    return manifest
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build resized, hashed WebP/AVIF/PNG image variants")
+    parser.add_argument('--clean', action='store_true', help="remove images/dist before building")
+    args = parser.parse_args()
+    build_assets(clean=args.clean)
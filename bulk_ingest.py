@@ -0,0 +1,283 @@
+"""
+Bulk ingestion of bot updates (POST /api/bulk-update-user-data)
+The body is NDJSON (one update per line, parsed as it streams in) or a JSON array of
+updates in the /api/update-user-data shape. Updates are coalesced per user (the last
+one wins) and handed over in batches once the batch is full or the coalescing window
+has passed. SummaryWriteBehind optionally upserts the batches into daily_nutrition_summary
+with a bounded queue, so a fast sender is slowed down instead of piling up memory.
+"""
+
+import json
+import math
+import time
+import asyncio
+import logging
+import datetime
+
+logger = logging.getLogger(__name__)
+
+MAX_ARRAY_BYTES = 64 * 1024 * 1024
+MAX_LINE_BYTES = 1024 * 1024
+MAX_REPORTED_ERRORS = 20
+
+
+def _is_number(value) -> bool:
+    """A JSON number that fits a float column (not a bool, NaN or infinity)"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return False
+    try:
+        return math.isfinite(value)
+    except OverflowError:
+        return False
+
+
+class BulkUpdateParser:
+    """Incremental NDJSON / JSON array parser; feed() returns the update dicts completed so far"""
+
+    def __init__(self):
+        self.mode = None      # 'ndjson' or 'array', decided by the first non-blank byte
+        self._buffer = b''
+        self.line_number = 0
+        self.errors = []
+        self.error_count = 0
+
+    def _error(self, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+    def _validate(self, item, where: str):
+        """The update if it can be stored as is, else None (counted as invalid)"""
+        if not isinstance(item, dict) or item.get('user_id') in (None, ''):
+            self._error(f"{where}: expected an object with user_id")
+            return None
+        for field in ('targets', 'consumed_today'):
+            values = item.get(field)
+            if values is None:
+                continue
+            if not isinstance(values, dict):
+                self._error(f"{where}: {field} must be an object")
+                return None
+            for name, value in values.items():
+                if not _is_number(value):
+                    self._error(f"{where}: {field}.{name} must be a number")
+                    return None
+        meal_count = item.get('meal_count')
+        if meal_count is not None and not (_is_number(meal_count) and 0 <= meal_count < 2 ** 31):
+            self._error(f"{where}: meal_count must be a non-negative number")
+            return None
+        return item
+
+    def feed(self, chunk: bytes) -> list:
+        if self.mode is None:
+            self._buffer += chunk
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return []
+            self.mode = 'array' if stripped[:1] == b'[' else 'ndjson'
+            chunk, self._buffer = self._buffer, b''
+
+        if self.mode == 'array':
+            self._buffer += chunk
+            if len(self._buffer) > MAX_ARRAY_BYTES:
+                raise ValueError(f"JSON array bodies are limited to {MAX_ARRAY_BYTES // (1024 * 1024)} MB; send NDJSON instead")
+            return []
+
+        # Only the new chunk is searched for line ends; the buffer holds at most one partial line
+        if b'\n' not in chunk:
+            self._buffer += chunk
+            self._check_line_length()
+            return []
+        *lines, rest = chunk.split(b'\n')
+        lines[0] = self._buffer + lines[0]
+        self._buffer = rest
+        self._check_line_length()
+        return self._parse_lines(lines)
+
+    def _check_line_length(self):
+        if len(self._buffer) > MAX_LINE_BYTES:
+            raise ValueError(f"NDJSON lines are limited to {MAX_LINE_BYTES // 1024} KB")
+
+    def _parse_lines(self, lines) -> list:
+        updates = []
+        for line in lines:
+            self.line_number += 1
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                self._error(f"line {self.line_number}: {e}")
+                continue
+            item = self._validate(item, f"line {self.line_number}")
+            if item is not None:
+                updates.append(item)
+        return updates
+
+    def close(self) -> list:
+        """Updates left in the buffer at the end of the body"""
+        buffer, self._buffer = self._buffer, b''
+        if self.mode == 'ndjson':
+            return self._parse_lines([buffer])
+        if self.mode != 'array':
+            return []
+
+        # A broken array loses every update in it, so it fails the request instead of one item
+        items = json.loads(buffer)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array of updates")
+        updates = []
+        for index, item in enumerate(items):
+            item = self._validate(item, f"item {index}")
+            if item is not None:
+                updates.append(item)
+        return updates
+
+
+class UpdateCoalescer:
+    """Latest update per user, released in batches of max_batch or every `window` seconds"""
+
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}   # user id -> latest update, in arrival order
+        self._window_started = None
+        self.received = 0
+        self.coalesced = 0
+
+    def add(self, updates: list) -> list:
+        """Add updates; returns the batches that became due"""
+        batches = []
+        for update in updates:
+            user_id = str(update['user_id'])
+            if self._pending.pop(user_id, None) is not None:
+                self.coalesced += 1
+            self._pending[user_id] = update
+            self.received += 1
+            if self._window_started is None:
+                self._window_started = time.monotonic()
+            if len(self._pending) >= self.max_batch:
+                batches.append(self.take())
+        if self._pending and time.monotonic() - self._window_started >= self.window:
+            batches.append(self.take())
+        return batches
+
+    def take(self) -> list:
+        batch = list(self._pending.values())
+        self._pending = {}
+        self._window_started = None
+        return batch
+
+
+class BulkIngestion:
+    """Parser + coalescer for one request body; feed() and finish() return batches to apply,
+    count_applied() records each one after it is stored"""
+
+    def __init__(self, window: float, max_batch: int):
+        self.parser = BulkUpdateParser()
+        self.coalescer = UpdateCoalescer(window, max_batch)
+        self.applied = 0
+        self.batches = 0
+
+    def feed(self, chunk: bytes) -> list:
+        return self.coalescer.add(self.parser.feed(chunk))
+
+    def finish(self) -> list:
+        batches = self.coalescer.add(self.parser.close())
+        remaining = self.coalescer.take()
+        if remaining:
+            batches.append(remaining)
+        return batches
+
+    def count_applied(self, stored: int):
+        """Record a batch once it has been stored (`stored` updates)"""
+        self.applied += stored
+        self.batches += 1
+
+    def result(self) -> dict:
+        return {
+            'status': 'success' if not self.parser.error_count else 'partial',
+            'received': self.coalescer.received,
+            'applied': self.applied,
+            'coalesced': self.coalescer.coalesced,
+            'batches': self.batches,
+            'invalid': self.parser.error_count,
+            'errors': self.parser.errors
+        }
+
+
+# daily_nutrition_summary column per update field
+CONSUMED_COLUMNS = {'calories': 'total_calories', 'protein_g': 'total_protein_g', 'carbs_g': 'total_carbs_g', 'fats_g': 'total_fat_g'}
+TARGET_COLUMNS = {'calories': 'calorie_target', 'protein_g': 'protein_target_g', 'carbs_g': 'carbs_target_g', 'fats_g': 'fat_target_g'}
+
+
+def summary_rows(updates: list, date: datetime.date = None) -> list:
+    """daily_nutrition_summary rows for numeric-user updates (today, UTC, unless `date` is given).
+
+    Rows only carry the columns the update has values for, so an upsert never overwrites
+    trigger-maintained totals or stored targets with zeros or NULL; updates without
+    consumed_today are skipped. Rows can therefore differ in their columns.
+    """
+    date = (date or datetime.datetime.now(datetime.timezone.utc).date()).isoformat()
+    rows = []
+    for update in updates:
+        user_id = str(update['user_id'])
+        consumed = update.get('consumed_today')
+        if not user_id.isdigit() or not consumed:
+            continue
+        row = {'user_telegram_id': int(user_id), 'date': date}
+        for fields, columns in ((consumed, CONSUMED_COLUMNS), (update.get('targets') or {}, TARGET_COLUMNS)):
+            row.update({column: fields[field] for field, column in columns.items() if fields.get(field) is not None})
+        if update.get('meal_count') is not None:
+            row['meals_logged_count'] = update['meal_count']
+        rows.append(row)
+    return rows
+
+
+class SummaryWriteBehind:
+    """Bounded queue of row batches upserted by one background task on the current event loop.
+
+    submit() waits while `max_pending` batches are queued, which propagates backpressure
+    to the request that is streaming updates in.
+    """
+
+    def __init__(self, upsert, max_pending: int = 4):
+        self.upsert = upsert
+        self.max_pending = max_pending
+        self._queue = None
+        self._task = None
+        self.written = 0
+        self.failed = 0
+
+    async def submit(self, rows: list):
+        if not rows:
+            return
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(self.max_pending)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        await self._queue.put(rows)
+
+    async def _run(self):
+        while True:
+            rows = await self._queue.get()
+            try:
+                await self.upsert(rows)
+                self.written += len(rows)
+            except Exception as e:
+                self.failed += len(rows)
+                logger.error(f"❌ Write-behind upsert of {len(rows)} summary rows failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def drain(self):
+        """Wait until every queued batch has been written"""
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    def stats(self) -> dict:
+        return {
+            'queued_batches': self._queue.qsize() if self._queue is not None else 0,
+            'written_rows': self.written,
+            'failed_rows': self.failed
+        }
@@ -0,0 +1,105 @@
+"""
+Response compression helpers
+Negotiates gzip/brotli from Accept-Encoding, compresses dynamic bodies above a size
+threshold and assembles gzip streams out of precompressed deflate segments, so the
+static parts of the dashboard template are compressed once instead of on every request.
+"""
+
+import zlib
+import struct
+import logging
+from config import COMPRESSION_LEVEL, COMPRESSION_MIN_SIZE
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# Fixed gzip member header: deflate, no flags, no mtime, unknown OS
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+# Empty final fixed-Huffman block that terminates a deflate stream
+DEFLATE_FINAL_BLOCK = b'\x03\x00'
+STORED_BLOCK_MAX = 0xffff
+
+def parse_accept_encoding(header_value: str) -> dict:
+    """Coding -> q value of an Accept-Encoding header"""
+    qualities = {}
+    for coding in (header_value or '').split(','):
+        name, *params = coding.split(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[name] = q
+    return qualities
+
+def negotiate_encoding(accept_encoding: str, allow_brotli: bool = True):
+    """Best content coding the client accepts: 'br', 'gzip' or None for identity"""
+    qualities = parse_accept_encoding(accept_encoding)
+    candidates = ['br', 'gzip'] if allow_brotli and BROTLI_AVAILABLE else ['gzip']
+    best, best_quality = None, 0.0
+    for coding in candidates:
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+def compress_body(body: bytes, encoding: str, level: int = COMPRESSION_LEVEL) -> bytes:
+    """Compress a whole body with gzip or brotli"""
+    if encoding == 'br':
+        # Brotli quality is 0-11; the zlib level (1-9) is used as-is
+        return brotli.compress(body, quality=min(11, max(0, level)))
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(body) + compressor.flush()
+    return GZIP_HEADER + deflated + struct.pack('<II', zlib.crc32(body), len(body) & 0xffffffff)
+
+def encode_body(body: bytes, accept_encoding: str, min_size: int = COMPRESSION_MIN_SIZE):
+    """(body, content encoding or None) for a dynamic response; small bodies are sent as-is"""
+    if len(body) < min_size:
+        return body, None
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    return compress_body(body, encoding), encoding
+
+def deflate_segment(data: bytes, level: int = COMPRESSION_LEVEL) -> bytes:
+    """Raw deflate blocks for `data`, byte-aligned and non-final so they can be concatenated"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def stored_blocks(data: bytes) -> bytes:
+    """Uncompressed (stored) non-final deflate blocks for short dynamic values"""
+    blocks = []
+    for start in range(0, len(data), STORED_BLOCK_MAX):
+        chunk = data[start:start + STORED_BLOCK_MAX]
+        blocks.append(struct.pack('<BHH', 0, len(chunk), len(chunk) ^ 0xffff))
+        blocks.append(chunk)
+    return b''.join(blocks)
+
+def gzip_from_parts(parts) -> bytes:
+    """Assemble one gzip stream from (raw bytes, deflated bytes or None) parts.
+
+    Parts with precomputed deflate data are copied as-is, the others (slot values)
+    are written as stored blocks; the CRC and size cover the raw bytes.
+    """
+    crc = 0
+    size = 0
+    output = [GZIP_HEADER]
+    for raw, deflated in parts:
+        crc = zlib.crc32(raw, crc)
+        size += len(raw)
+        output.append(deflated if deflated is not None else stored_blocks(raw))
+    output.append(DEFLATE_FINAL_BLOCK)
+    output.append(struct.pack('<II', crc, size & 0xffffffff))
+    return b''.join(output)
@@ -18,6 +18,82 @@ if not SUPABASE_URL:
 if not SUPABASE_ANON_KEY:
     SUPABASE_ANON_KEY = "demo_key"
 
+# Supabase connection pool: max concurrent connections per process and per-call timeout (seconds)
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", 20))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 5))
+
+# users row cache (targets, streak, coins): TTL in seconds, TTL for "no such user", max cached users
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 300))
+USER_CACHE_NEGATIVE_TTL = float(os.getenv("USER_CACHE_NEGATIVE_TTL", 60))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", 10000))
+
+# Cache-Control sent with content-hashed /images/dist/* files, and with original images (same URL when they change,
+# so clients revalidate them by ETag / Last-Modified once max-age has passed)
+STATIC_CACHE_CONTROL = os.getenv("STATIC_CACHE_CONTROL", "public, max-age=31536000, immutable")
+STATIC_ORIGINAL_CACHE_CONTROL = os.getenv("STATIC_ORIGINAL_CACHE_CONTROL", "public, max-age=300")
+
+# Response compression: zlib/brotli level, and bodies smaller than this many bytes are sent uncompressed
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", 6))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+
+# /api/events: seconds between backend change checks for subscribed users, and between keep-alive pings
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", 1))
+EVENTS_HEARTBEAT_INTERVAL = float(os.getenv("EVENTS_HEARTBEAT_INTERVAL", 15))
+
+# In-memory store of bot-pushed nutrition data (USER_DATA): memory cap in MB, least recently used users are evicted
+USER_STORE_MAX_MB = float(os.getenv("USER_STORE_MAX_MB", 32))
+
+# Crash-safe journal of USER_DATA replayed on startup: file path (empty = memory only), compaction once it holds
+# this many records per user, and how old (hours) a user's last update may be to still be replayed
+USER_STORE_JOURNAL = os.getenv("USER_STORE_JOURNAL", "")
+USER_STORE_COMPACT_RATIO = float(os.getenv("USER_STORE_COMPACT_RATIO", 4))
+USER_STORE_MAX_AGE_HOURS = float(os.getenv("USER_STORE_MAX_AGE_HOURS", 24))
+
+# Local SQLite replica of daily_nutrition_summary and users targets: file path (empty = off), seconds between
+# syncs, and how stale (seconds since the last good sync) it may get before reads go back to Supabase
+SUMMARY_REPLICA_PATH = os.getenv("SUMMARY_REPLICA_PATH", "")
+SUMMARY_REPLICA_SYNC_INTERVAL = float(os.getenv("SUMMARY_REPLICA_SYNC_INTERVAL", 2))
+SUMMARY_REPLICA_MAX_STALENESS = float(os.getenv("SUMMARY_REPLICA_MAX_STALENESS", 30))
+
+# Bulk ingestion (/api/bulk-update-user-data): coalescing window in seconds and max users per batch,
+# optional write-behind of each batch to daily_nutrition_summary and how many batches may wait for it
+INGEST_COALESCE_WINDOW = float(os.getenv("INGEST_COALESCE_WINDOW", 0.5))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 1000))
+INGEST_WRITE_BEHIND = os.getenv("INGEST_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+INGEST_WRITE_QUEUE_SIZE = int(os.getenv("INGEST_WRITE_QUEUE_SIZE", 4))
+
+# Per-request backend query accounting: on/off, warn when one request makes more than this many Supabase queries,
+# and whether to return the count / DB time in an X-Backend-Queries response header (for debugging)
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "true").lower() in ("1", "true", "yes")
+QUERY_WARN_THRESHOLD = int(os.getenv("QUERY_WARN_THRESHOLD", 5))
+QUERY_DEBUG_HEADER = os.getenv("QUERY_DEBUG_HEADER", "false").lower() in ("1", "true", "yes")
+
+# Logging: level, "text" or "json" lines, write from a background thread (LOG_ASYNC), per-route levels and
+# sample rates for request logs ("/images=WARNING,/api/nutrition-data=0.1"), and one user id to log in full DEBUG detail
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_ASYNC = os.getenv("LOG_ASYNC", "false").lower() in ("1", "true", "yes")
+LOG_ROUTE_LEVELS = os.getenv("LOG_ROUTE_LEVELS", "")
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_DEBUG_USER_ID = os.getenv("LOG_DEBUG_USER_ID", "")
+
+# Prometheus metrics at /metrics (request/Supabase latency histograms, cache and memory gauges)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Per-request phase timing (profile, summary, db, render, serialize) in a Server-Timing response header,
+# and optionally as one structured log record per request
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+SERVER_TIMING_LOG = os.getenv("SERVER_TIMING_LOG", "false").lower() in ("1", "true", "yes")
+
+# Response encoding: JSON backend ("auto" uses orjson when installed, or "orjson" / "json"), MessagePack for clients
+# that ask for it in Accept (needs the msgpack package), and how long the stdlib server keeps idle connections open
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto").lower()
+MSGPACK_ENABLED = os.getenv("MSGPACK_ENABLED", "true").lower() in ("1", "true", "yes")
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 15))
+
+# /api/historical-data analytics: a day counts as on target when its calories are within this fraction of its target
+ANALYTICS_ADHERENCE_TOLERANCE = float(os.getenv("ANALYTICS_ADHERENCE_TOLERANCE", 0.1))
+
 # Mini App Configuration
 MINI_APP_URL = os.getenv("MINI_APP_URL", "https://your-mini-app.onrender.com")
 
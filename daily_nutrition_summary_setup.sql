@@ -99,61 +99,290 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
--- Trigger to automatically update daily summary when nutrition_logs are inserted/updated
-CREATE OR REPLACE FUNCTION trigger_update_daily_nutrition_summary()
-RETURNS TRIGGER AS $$
+-- Incremental maintenance: instead of re-running the full SUM/COUNT over a user's day for
+-- every logged meal, each statement on nutrition_logs adds its NEW minus OLD totals to the
+-- affected summary rows. Statement-level triggers with transition tables aggregate once per
+-- user-day however many rows the statement touched, so logging a meal costs the same on
+-- the 1st and the 50th meal of the day and bulk imports stay linear.
+-- update_daily_nutrition_summary() above is still the full recompute, for repairs.
+
+-- One user-day change: positive for inserted rows, negative for deleted ones
+DO $$
 BEGIN
-    -- Update for the date of the new/updated nutrition log
-    PERFORM update_daily_nutrition_summary(
-        COALESCE(NEW.user_telegram_id, OLD.user_telegram_id),
-        DATE(COALESCE(NEW.logged_at, OLD.logged_at) AT TIME ZONE 'UTC')
+    CREATE TYPE daily_nutrition_delta AS (
+        user_telegram_id BIGINT,
+        date DATE,
+        calories DECIMAL(10,2),
+        protein_g DECIMAL(10,2),
+        carbs_g DECIMAL(10,2),
+        fat_g DECIMAL(10,2),
+        meals INTEGER
     );
+EXCEPTION WHEN duplicate_object THEN
+    NULL;
+END $$;
+
+-- Add deltas to daily_nutrition_summary, one UPDATE per statement (targets refreshed from users).
+-- User-days that have no summary row yet (first meal of the day, or days logged before this
+-- trigger existed) are recomputed in full instead, which only sums that one day's logs.
+CREATE OR REPLACE FUNCTION apply_daily_nutrition_deltas(p_deltas daily_nutrition_delta[])
+RETURNS void AS $$
+DECLARE
+    missing RECORD;
+BEGIN
+    UPDATE daily_nutrition_summary dns
+    SET
+        total_calories = dns.total_calories + d.calories,
+        total_protein_g = dns.total_protein_g + d.protein_g,
+        total_carbs_g = dns.total_carbs_g + d.carbs_g,
+        total_fat_g = dns.total_fat_g + d.fat_g,
+        meals_logged_count = dns.meals_logged_count + d.meals,
+        calorie_target = COALESCE(u.calorie_target, dns.calorie_target),
+        protein_target_g = COALESCE(u.protein_target_g, dns.protein_target_g),
+        carbs_target_g = COALESCE(u.carbs_target_g, dns.carbs_target_g),
+        fat_target_g = COALESCE(u.fat_target_g, dns.fat_target_g),
+        updated_at = NOW()
+    FROM (
+        SELECT
+            user_telegram_id,
+            date,
+            SUM(calories) AS calories,
+            SUM(protein_g) AS protein_g,
+            SUM(carbs_g) AS carbs_g,
+            SUM(fat_g) AS fat_g,
+            SUM(meals) AS meals
+        FROM unnest(p_deltas)
+        GROUP BY user_telegram_id, date
+    ) d
+    LEFT JOIN users u ON u.user_id = d.user_telegram_id
+    WHERE dns.user_telegram_id = d.user_telegram_id
+    AND dns.date = d.date
+    -- Updates that didn't touch the nutrition columns cancel out
+    AND (d.calories <> 0 OR d.protein_g <> 0 OR d.carbs_g <> 0 OR d.fat_g <> 0 OR d.meals <> 0);
+
+    FOR missing IN
+        SELECT DISTINCT d.user_telegram_id, d.date
+        FROM unnest(p_deltas) d
+        WHERE NOT EXISTS (
+            SELECT 1 FROM daily_nutrition_summary dns
+            WHERE dns.user_telegram_id = d.user_telegram_id AND dns.date = d.date
+        )
+        ORDER BY d.user_telegram_id, d.date
+    LOOP
+        PERFORM update_daily_nutrition_summary(missing.user_telegram_id, missing.date);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
 
-    -- If the date changed in an update, also update the old date
-    IF TG_OP = 'UPDATE' AND DATE(OLD.logged_at AT TIME ZONE 'UTC') != DATE(NEW.logged_at AT TIME ZONE 'UTC') THEN
-        PERFORM update_daily_nutrition_summary(
-            OLD.user_telegram_id,
-            DATE(OLD.logged_at AT TIME ZONE 'UTC')
+-- Statement-level trigger: turn the statement's transition tables into user-day deltas
+CREATE OR REPLACE FUNCTION trigger_apply_daily_nutrition_deltas()
+RETURNS TRIGGER AS $$
+DECLARE
+    deltas daily_nutrition_delta[] := '{}';
+BEGIN
+    -- Only the transition tables declared for this trigger exist, hence one branch per operation
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        deltas := deltas || ARRAY(
+            SELECT ROW(
+                user_telegram_id,
+                DATE(logged_at AT TIME ZONE 'UTC'),
+                COALESCE(total_calories, 0),
+                COALESCE(protein_g, 0),
+                COALESCE(carbs_g, 0),
+                COALESCE(fat_g, 0),
+                1
+            )::daily_nutrition_delta
+            FROM new_rows
         );
     END IF;
 
-    RETURN COALESCE(NEW, OLD);
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        deltas := deltas || ARRAY(
+            SELECT ROW(
+                user_telegram_id,
+                DATE(logged_at AT TIME ZONE 'UTC'),
+                -COALESCE(total_calories, 0),
+                -COALESCE(protein_g, 0),
+                -COALESCE(carbs_g, 0),
+                -COALESCE(fat_g, 0),
+                -1
+            )::daily_nutrition_delta
+            FROM old_rows
+        );
+    END IF;
+
+    IF cardinality(deltas) > 0 THEN
+        PERFORM apply_daily_nutrition_deltas(deltas);
+    END IF;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Create trigger
+-- Replace the old per-row full-recompute trigger (a trigger with transition tables handles one event)
 DROP TRIGGER IF EXISTS nutrition_logs_daily_summary_trigger ON nutrition_logs;
-CREATE TRIGGER nutrition_logs_daily_summary_trigger
-    AFTER INSERT OR UPDATE OR DELETE ON nutrition_logs
-    FOR EACH ROW
-    EXECUTE FUNCTION trigger_update_daily_nutrition_summary();
+DROP FUNCTION IF EXISTS trigger_update_daily_nutrition_summary();
 
--- Function to backfill historical daily summaries
+DROP TRIGGER IF EXISTS nutrition_logs_daily_summary_insert ON nutrition_logs;
+CREATE TRIGGER nutrition_logs_daily_summary_insert
+    AFTER INSERT ON nutrition_logs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trigger_apply_daily_nutrition_deltas();
+
+DROP TRIGGER IF EXISTS nutrition_logs_daily_summary_update ON nutrition_logs;
+CREATE TRIGGER nutrition_logs_daily_summary_update
+    AFTER UPDATE ON nutrition_logs
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trigger_apply_daily_nutrition_deltas();
+
+DROP TRIGGER IF EXISTS nutrition_logs_daily_summary_delete ON nutrition_logs;
+CREATE TRIGGER nutrition_logs_daily_summary_delete
+    AFTER DELETE ON nutrition_logs
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION trigger_apply_daily_nutrition_deltas();
+
+-- Lets the backfill read a date range of logs per user instead of scanning every log
+CREATE INDEX IF NOT EXISTS idx_nutrition_logs_user_logged_at ON nutrition_logs(user_telegram_id, logged_at);
+
+-- Set-based backfill: recompute the last p_days_back days (today included) for one user, a
+-- user id range [p_from_user_id, p_to_user_id) or everyone, in one INSERT ... SELECT ... GROUP BY.
+-- Logs are selected by a logged_at range (index-friendly) rather than DATE(logged_at) = day.
+-- Only rows whose values change are written, and rows whose logs were all deleted are zeroed;
+-- days without any logs get no row (readers already treat a missing day as zero).
+-- Returns the number of summary rows written.
+DROP FUNCTION IF EXISTS backfill_daily_nutrition_summaries(BIGINT, INTEGER);
 CREATE OR REPLACE FUNCTION backfill_daily_nutrition_summaries(
     p_user_telegram_id BIGINT DEFAULT NULL,
-    p_days_back INTEGER DEFAULT 30
+    p_days_back INTEGER DEFAULT 30,
+    p_from_user_id BIGINT DEFAULT NULL,
+    p_to_user_id BIGINT DEFAULT NULL
 )
-RETURNS void AS $$
+RETURNS INTEGER AS $$
 DECLARE
-    user_id_to_process BIGINT;
-    day_offset INTEGER;
-    target_date DATE;
+    first_day DATE := CURRENT_DATE - (GREATEST(p_days_back, 1) - 1);
+    range_start TIMESTAMP WITH TIME ZONE := first_day::timestamp AT TIME ZONE 'UTC';
+    range_end TIMESTAMP WITH TIME ZONE := (CURRENT_DATE + 1)::timestamp AT TIME ZONE 'UTC';
+    written INTEGER;
+    zeroed INTEGER;
 BEGIN
-    -- If specific user provided, process only that user
-    -- Otherwise process all users
-    FOR user_id_to_process IN
-        SELECT CASE
-            WHEN p_user_telegram_id IS NOT NULL THEN p_user_telegram_id
-            ELSE user_id
-        END as user_id
-        FROM users
-        WHERE p_user_telegram_id IS NULL OR user_id = p_user_telegram_id
-    LOOP
-        -- Process each day going back p_days_back days
-        FOR day_offset IN 0..p_days_back-1 LOOP
-            target_date := CURRENT_DATE - day_offset;
-            PERFORM update_daily_nutrition_summary(user_id_to_process, target_date);
-        END LOOP;
+    INSERT INTO daily_nutrition_summary AS dns (
+        user_telegram_id,
+        date,
+        total_calories,
+        total_protein_g,
+        total_carbs_g,
+        total_fat_g,
+        meals_logged_count,
+        calorie_target,
+        protein_target_g,
+        carbs_target_g,
+        fat_target_g,
+        updated_at
+    )
+    SELECT
+        t.user_telegram_id,
+        t.date,
+        t.total_calories,
+        t.total_protein_g,
+        t.total_carbs_g,
+        t.total_fat_g,
+        t.meals_count,
+        u.calorie_target,
+        u.protein_target_g,
+        u.carbs_target_g,
+        u.fat_target_g,
+        NOW()
+    FROM (
+        SELECT
+            user_telegram_id,
+            DATE(logged_at AT TIME ZONE 'UTC') AS date,
+            COALESCE(SUM(total_calories), 0) AS total_calories,
+            COALESCE(SUM(protein_g), 0) AS total_protein_g,
+            COALESCE(SUM(carbs_g), 0) AS total_carbs_g,
+            COALESCE(SUM(fat_g), 0) AS total_fat_g,
+            COUNT(*) AS meals_count
+        FROM nutrition_logs
+        WHERE logged_at >= range_start
+        AND logged_at < range_end
+        AND (p_user_telegram_id IS NULL OR user_telegram_id = p_user_telegram_id)
+        AND (p_from_user_id IS NULL OR user_telegram_id >= p_from_user_id)
+        AND (p_to_user_id IS NULL OR user_telegram_id < p_to_user_id)
+        GROUP BY user_telegram_id, DATE(logged_at AT TIME ZONE 'UTC')
+    ) t
+    JOIN users u ON u.user_id = t.user_telegram_id
+    ON CONFLICT (user_telegram_id, date)
+    DO UPDATE SET
+        total_calories = EXCLUDED.total_calories,
+        total_protein_g = EXCLUDED.total_protein_g,
+        total_carbs_g = EXCLUDED.total_carbs_g,
+        total_fat_g = EXCLUDED.total_fat_g,
+        meals_logged_count = EXCLUDED.meals_logged_count,
+        calorie_target = EXCLUDED.calorie_target,
+        protein_target_g = EXCLUDED.protein_target_g,
+        carbs_target_g = EXCLUDED.carbs_target_g,
+        fat_target_g = EXCLUDED.fat_target_g,
+        updated_at = NOW()
+    -- Leave correct rows alone (no dead tuples, no updated_at churn for replicas and pollers)
+    WHERE (dns.total_calories, dns.total_protein_g, dns.total_carbs_g, dns.total_fat_g, dns.meals_logged_count,
+           dns.calorie_target, dns.protein_target_g, dns.carbs_target_g, dns.fat_target_g)
+        IS DISTINCT FROM
+          (EXCLUDED.total_calories, EXCLUDED.total_protein_g, EXCLUDED.total_carbs_g, EXCLUDED.total_fat_g, EXCLUDED.meals_logged_count,
+           EXCLUDED.calorie_target, EXCLUDED.protein_target_g, EXCLUDED.carbs_target_g, EXCLUDED.fat_target_g);
+    GET DIAGNOSTICS written = ROW_COUNT;
+
+    -- Summary rows in the range whose logs have all been deleted
+    UPDATE daily_nutrition_summary dns
+    SET
+        total_calories = 0,
+        total_protein_g = 0,
+        total_carbs_g = 0,
+        total_fat_g = 0,
+        meals_logged_count = 0,
+        updated_at = NOW()
+    WHERE dns.date >= first_day
+    AND dns.date <= CURRENT_DATE
+    AND (p_user_telegram_id IS NULL OR dns.user_telegram_id = p_user_telegram_id)
+    AND (p_from_user_id IS NULL OR dns.user_telegram_id >= p_from_user_id)
+    AND (p_to_user_id IS NULL OR dns.user_telegram_id < p_to_user_id)
+    AND (dns.meals_logged_count <> 0 OR dns.total_calories <> 0 OR dns.total_protein_g <> 0
+         OR dns.total_carbs_g <> 0 OR dns.total_fat_g <> 0)
+    AND NOT EXISTS (
+        SELECT 1 FROM nutrition_logs l
+        WHERE l.user_telegram_id = dns.user_telegram_id
+        AND l.logged_at >= dns.date::timestamp AT TIME ZONE 'UTC'
+        AND l.logged_at < (dns.date + 1)::timestamp AT TIME ZONE 'UTC'
+    );
+    GET DIAGNOSTICS zeroed = ROW_COUNT;
+
+    RETURN written + zeroed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Online backfill of the whole user base: consecutive user id ranges of p_batch_size users,
+-- committed one by one so locks stay short and progress survives an interruption.
+-- Run with: CALL backfill_daily_nutrition_summaries_in_batches(90);
+CREATE OR REPLACE PROCEDURE backfill_daily_nutrition_summaries_in_batches(
+    p_days_back INTEGER DEFAULT 90,
+    p_batch_size INTEGER DEFAULT 5000
+)
+AS $$
+DECLARE
+    batch_start BIGINT;
+    batch_last BIGINT;
+    written INTEGER;
+BEGIN
+    SELECT MIN(user_id) INTO batch_start FROM users;
+    WHILE batch_start IS NOT NULL LOOP
+        SELECT MAX(user_id) INTO batch_last
+        FROM (SELECT user_id FROM users WHERE user_id >= batch_start ORDER BY user_id LIMIT p_batch_size) batch;
+
+        written := backfill_daily_nutrition_summaries(NULL, p_days_back, batch_start, batch_last + 1);
+        RAISE NOTICE 'Backfilled users % to %: % summary rows written', batch_start, batch_last, written;
+        COMMIT;
+
+        SELECT MIN(user_id) INTO batch_start FROM users WHERE user_id > batch_last;
     END LOOP;
 END;
 $$ LANGUAGE plpgsql;
@@ -171,4 +400,67 @@ SELECT
 FROM daily_nutrition_summary dns
 LEFT JOIN users u ON dns.user_telegram_id = u.user_id
 WHERE dns.date >= CURRENT_DATE - INTERVAL '30 days'
-ORDER BY dns.user_telegram_id, dns.date DESC;
\ No newline at end of file
+ORDER BY dns.user_telegram_id, dns.date DESC;
+
+-- Dense per-user history for /api/historical-data (POST /rest/v1/rpc/get_daily_nutrition_history).
+-- One row per day for the last p_days days (today included, up to a year), oldest first, with
+-- zeros for days without a summary row and the user's current targets on every row, so the
+-- server can use the result as-is. The day_* columns are the targets stored with that day's summary
+-- row (NULL without one), for adherence against the targets the user had at the time.
+-- Reads the user's range with one scan of idx_daily_nutrition_user_date
+-- instead of going through the 30-day, all-users recent_daily_nutrition_summary view.
+-- (Dropped first because CREATE OR REPLACE can't change the result columns of an older version.)
+DROP FUNCTION IF EXISTS get_daily_nutrition_history(BIGINT, INTEGER);
+CREATE FUNCTION get_daily_nutrition_history(
+    p_user_telegram_id BIGINT,
+    p_days INTEGER DEFAULT 7
+)
+RETURNS TABLE (
+    date DATE,
+    calories DECIMAL(10,2),
+    protein DECIMAL(10,2),
+    carbs DECIMAL(10,2),
+    fats DECIMAL(10,2),
+    meals_logged_count INTEGER,
+    calorie_target DECIMAL(10,2),
+    protein_target_g DECIMAL(10,2),
+    carbs_target_g DECIMAL(10,2),
+    fat_target_g DECIMAL(10,2),
+    day_calorie_target DECIMAL(10,2),
+    day_protein_target_g DECIMAL(10,2),
+    day_carbs_target_g DECIMAL(10,2),
+    day_fat_target_g DECIMAL(10,2),
+    user_exists BOOLEAN
+) AS $$
+    WITH bounds AS (
+        SELECT CURRENT_DATE - (LEAST(GREATEST(p_days, 1), 366) - 1) AS first_day
+    )
+    SELECT
+        day::date,
+        COALESCE(s.total_calories, 0),
+        COALESCE(s.total_protein_g, 0),
+        COALESCE(s.total_carbs_g, 0),
+        COALESCE(s.total_fat_g, 0),
+        COALESCE(s.meals_logged_count, 0),
+        u.calorie_target,
+        u.protein_target_g,
+        u.carbs_target_g,
+        u.fat_target_g,
+        s.calorie_target,
+        s.protein_target_g,
+        s.carbs_target_g,
+        s.fat_target_g,
+        u.user_id IS NOT NULL
+    FROM bounds
+    CROSS JOIN generate_series(bounds.first_day, CURRENT_DATE, INTERVAL '1 day') AS day
+    LEFT JOIN (
+        SELECT dns.date, dns.total_calories, dns.total_protein_g, dns.total_carbs_g, dns.total_fat_g, dns.meals_logged_count,
+               dns.calorie_target, dns.protein_target_g, dns.carbs_target_g, dns.fat_target_g
+        FROM daily_nutrition_summary dns, bounds
+        WHERE dns.user_telegram_id = p_user_telegram_id
+        AND dns.date >= bounds.first_day
+        AND dns.date <= CURRENT_DATE
+    ) s ON s.date = day::date
+    LEFT JOIN users u ON u.user_id = p_user_telegram_id
+    ORDER BY day;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,231 @@
+"""
+Server-sent events push channel for dashboard updates
+EventHub keeps the open /api/events subscriptions per user and hands each one the
+changes since the last payload it saw. ChangePoller runs on an asyncio loop and checks
+the backend for the subscribed users only, in one batched query per interval, so idle
+dashboards cost a heartbeat instead of a poll.
+"""
+
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+def diff_payload(old: dict, new: dict) -> dict:
+    """Keys of `new` whose values differ from `old`, recursing into nested dicts"""
+    delta = {}
+    for key, value in new.items():
+        old_value = old.get(key)
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            nested = diff_payload(old_value, value)
+            if nested:
+                delta[key] = nested
+        elif value != old_value or key not in old:
+            delta[key] = value
+    return delta
+
+def merge_payload(base: dict, delta: dict) -> dict:
+    """Copy of `base` with `delta` applied on top (nested dicts are merged)"""
+    merged = dict(base)
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_payload(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def format_sse(event: str, data: dict) -> bytes:
+    """One server-sent event frame"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode('utf-8')
+
+SSE_HEARTBEAT = b": ping\n\n"
+
+
+class Subscription:
+    """One open event stream. Pending changes are coalesced, so a slow client gets one merged delta."""
+
+    def __init__(self, user_id: str, loop: asyncio.AbstractEventLoop = None):
+        self.user_id = user_id
+        self.loop = loop
+        self._lock = threading.Lock()
+        self._known = None      # last payload handed to this subscriber
+        self._pending = None    # changes not yet taken by the consumer
+        self._snapshot_sent = False
+        self._wakeup = asyncio.Event() if loop is not None else threading.Event()
+
+    def offer(self, payload: dict):
+        """Queue the difference between `payload` and what this subscriber already has (any thread)"""
+        with self._lock:
+            delta = payload if self._known is None else diff_payload(self._known, payload)
+            if not delta:
+                return
+            self._known = payload
+            self._pending = delta if self._pending is None else merge_payload(self._pending, delta)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+        else:
+            self._wakeup.set()
+
+    def take(self):
+        """(event name, data) for the pending changes, or None: 'snapshot' first, then 'delta'"""
+        self._wakeup.clear()
+        with self._lock:
+            pending, self._pending = self._pending, None
+            if pending is None:
+                return None
+            event = 'delta' if self._snapshot_sent else 'snapshot'
+            self._snapshot_sent = True
+            return event, pending
+
+    def wait(self, timeout: float) -> bool:
+        """Block the calling thread until changes are pending or `timeout` passes"""
+        return self._wakeup.wait(timeout)
+
+    async def wait_async(self, timeout: float) -> bool:
+        """Await changes for at most `timeout` seconds (subscriptions created with a loop)"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class EventHub:
+    """Subscriptions per user and the latest payload published for each subscribed user"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)  # user id -> {Subscription}
+        self._latest = {}                       # user id -> last published payload
+        self.refresh_callback = None            # called with a user id to request a backend check
+
+    def subscribe(self, user_id: str, loop: asyncio.AbstractEventLoop = None) -> Subscription:
+        """Open a subscription; it receives the latest payload (if any) as its snapshot"""
+        subscription = Subscription(user_id, loop)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+            latest = self._latest.get(user_id)
+        if latest is not None:
+            subscription.offer(latest)
+        self.request_refresh(user_id)
+        logger.info(f"📡 Events subscriber added for user {user_id} ({self.subscriber_count()} open)")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+                    self._latest.pop(subscription.user_id, None)
+        logger.info(f"📡 Events subscriber removed for user {subscription.user_id} ({self.subscriber_count()} open)")
+
+    def subscribed_users(self) -> list:
+        with self._lock:
+            return list(self._subscriptions)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, user_id: str, payload: dict):
+        """Send `payload` to the user's subscribers if it differs from the last one published"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+            if not subscriptions or self._latest.get(user_id) == payload:
+                return
+            self._latest[user_id] = payload
+        for subscription in subscriptions:
+            subscription.offer(payload)
+
+    def request_refresh(self, user_id: str):
+        """Ask the change poller to re-read this user now (e.g. after the bot posted an update)"""
+        with self._lock:
+            if user_id not in self._subscriptions:
+                return
+        if self.refresh_callback is not None:
+            self.refresh_callback(user_id)
+
+
+class ChangePoller:
+    """Backend change detection for subscribed users.
+
+    `fetch_versions(user_ids)` returns a comparable version per user (cheap, batched);
+    `fetch_payload(user_id)` builds the full payload, and is only called for users whose
+    version changed or who were explicitly refreshed.
+    """
+
+    def __init__(self, hub: EventHub, fetch_versions, fetch_payload, interval: float = 1.0):
+        self.hub = hub
+        self.fetch_versions = fetch_versions
+        self.fetch_payload = fetch_payload
+        self.interval = interval
+        self._loop = None
+        self._wakeup = None
+        self._forced = set()
+        self._forced_lock = threading.Lock()
+        self._versions = {}
+        hub.refresh_callback = self.request_refresh
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start polling on `loop` (once per process; safe to call from any thread)"""
+        if self._loop is not None:
+            return
+        self._loop = loop
+
+        def create_task():
+            self._wakeup = asyncio.Event()
+            loop.create_task(self.run())
+        loop.call_soon_threadsafe(create_task)
+
+    def request_refresh(self, user_id: str):
+        with self._forced_lock:
+            self._forced.add(user_id)
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self):
+        logger.info(f"📡 Change poller started (every {self.interval}s)")
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.error(f"❌ Change poll failed: {e}")
+                await asyncio.sleep(self.interval)
+
+    async def poll_once(self):
+        """Check all subscribed users and publish payloads for the ones that changed"""
+        users = self.hub.subscribed_users()
+        with self._forced_lock:
+            forced, self._forced = self._forced, set()
+        if not users:
+            self._versions = {}
+            return
+
+        started = time.perf_counter()
+        versions = await self.fetch_versions(users)
+        changed = [user_id for user_id in users
+                   if user_id in forced or user_id not in self._versions or versions.get(user_id) != self._versions[user_id]]
+        self._versions = {user_id: versions.get(user_id) for user_id in users}
+        if not changed:
+            return
+
+        payloads = await asyncio.gather(*(self.fetch_payload(user_id) for user_id in changed), return_exceptions=True)
+        for user_id, payload in zip(changed, payloads):
+            if isinstance(payload, Exception):
+                logger.warning(f"⚠️ Could not refresh events payload for user {user_id}: {payload}")
+                # Retry on the next poll
+                self._versions.pop(user_id, None)
+                continue
+            self.hub.publish(user_id, payload)
+        logger.info(f"📡 Polled {len(users)} subscribed users, {len(changed)} refreshed in {(time.perf_counter() - started) * 1000:.0f}ms")
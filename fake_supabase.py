@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+In-process stand-in for the Supabase REST API (PostgREST), for offline load tests
+Serves the subset of PostgREST the app uses - select with eq/neq/gt/gte/lt/lte/in/is and
+or(...) filters, order, limit, upserts and the get_daily_nutrition_history RPC - over an
+in-memory SQLite copy of users, nutrition_logs and daily_nutrition_summary generated by
+seed_data.py. Every request can be delayed (latency + jitter) and failed at a given rate,
+to see how the servers behave against a slow or flaky backend.
+
+Usage: python fake_supabase.py --port 54321 --users 1000 --days 90 --latency-ms 20
+       then start a server with SUPABASE_URL=http://127.0.0.1:54321
+"""
+
+import re
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import datetime
+import argparse
+import logging
+import threading
+from collections import Counter
+from aiohttp import web
+import seed_data
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    calorie_target REAL,
+    protein_target_g REAL,
+    fat_target_g REAL,
+    carbs_target_g REAL,
+    current_streak INTEGER DEFAULT 0,
+    days_since_last_meal_log INTEGER DEFAULT 0,
+    coins INTEGER DEFAULT 0
+);
+CREATE TABLE nutrition_logs (
+    id INTEGER PRIMARY KEY,
+    user_telegram_id INTEGER NOT NULL,
+    logged_at TEXT NOT NULL,
+    total_calories REAL,
+    protein_g REAL,
+    carbs_g REAL,
+    fat_g REAL
+);
+CREATE INDEX idx_nutrition_logs_user_logged_at ON nutrition_logs(user_telegram_id, logged_at);
+CREATE TABLE daily_nutrition_summary (
+    id INTEGER PRIMARY KEY,
+    user_telegram_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    total_calories REAL DEFAULT 0,
+    total_protein_g REAL DEFAULT 0,
+    total_carbs_g REAL DEFAULT 0,
+    total_fat_g REAL DEFAULT 0,
+    meals_logged_count INTEGER DEFAULT 0,
+    calorie_target REAL,
+    protein_target_g REAL,
+    carbs_target_g REAL,
+    fat_target_g REAL,
+    created_at TEXT,
+    updated_at TEXT,
+    UNIQUE (user_telegram_id, date)
+);
+CREATE INDEX idx_daily_nutrition_updated ON daily_nutrition_summary(updated_at, id);
+CREATE VIEW recent_daily_nutrition_summary AS
+    SELECT * FROM daily_nutrition_summary WHERE date >= date('now', '-30 days');
+"""
+
+TABLES = ('users', 'nutrition_logs', 'daily_nutrition_summary', 'recent_daily_nutrition_summary')
+OPERATORS = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<=', 'like': 'LIKE', 'ilike': 'LIKE'}
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+# Query string keys that are not column filters
+RESERVED_PARAMS = ('select', 'order', 'limit', 'offset', 'on_conflict', 'columns')
+
+
+class QueryError(ValueError):
+    """A request this stand-in can't (or PostgREST wouldn't) answer; sent back as a 400"""
+
+
+def identifier(name: str) -> str:
+    name = name.strip()
+    if not IDENTIFIER.match(name):
+        raise QueryError(f"unsupported identifier: {name!r}")
+    return name
+
+
+def split_top_level(text: str) -> list:
+    """Split on commas that are not inside parentheses or double quotes"""
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        if char == ',' and depth == 0 and not quoted:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    parts.append(current)
+    return parts
+
+
+def unquote(value: str) -> str:
+    value = value.strip()
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def condition(column: str, expression: str) -> tuple:
+    """SQL and parameters for one `column=op.value` filter"""
+    column = identifier(column)
+    negate = expression.startswith('not.')
+    if negate:
+        expression = expression[4:]
+    operator, _, value = expression.partition('.')
+    if operator == 'in':
+        values = [unquote(v) for v in split_top_level(value.strip()[1:-1])] if value.strip() not in ('', '()') else []
+        sql = f'{column} IN ({", ".join("?" * len(values))})' if values else '0'
+        params = values
+    elif operator == 'is':
+        literal = {'null': 'NULL', 'true': '1', 'false': '0'}.get(value.lower())
+        if literal is None:
+            raise QueryError(f"unsupported is value: {value!r}")
+        sql, params = f'{column} IS {literal}', []
+    elif operator in OPERATORS:
+        sql, params = f'{column} {OPERATORS[operator]} ?', [unquote(value).replace('*', '%')]
+    else:
+        raise QueryError(f"unsupported operator: {operator!r}")
+    return (f'NOT ({sql})', params) if negate else (sql, params)
+
+
+def logic_tree(expression: str, joiner: str) -> tuple:
+    """SQL and parameters for the body of or=(...) / and=(...), nested and()/or() included"""
+    clauses, params = [], []
+    for part in split_top_level(expression):
+        part = part.strip()
+        nested = re.match(r'^(and|or)\((.*)\)$', part)
+        if nested:
+            sql, nested_params = logic_tree(nested.group(2), nested.group(1).upper())
+        else:
+            column, _, rest = part.partition('.')
+            sql, nested_params = condition(column, rest)
+        clauses.append(f'({sql})')
+        params.extend(nested_params)
+    return f' {joiner} '.join(clauses), params
+
+
+def build_select(table: str, query) -> tuple:
+    """SELECT statement and parameters for a PostgREST GET on `table`"""
+    select = query.get('select', '*')
+    columns = '*' if select.strip() == '*' else ', '.join(identifier(column) for column in select.split(','))
+    where, params = [], []
+    for key, value in query.items():
+        if key in RESERVED_PARAMS:
+            continue
+        if key in ('or', 'and'):
+            sql, clause_params = logic_tree(value.strip()[1:-1], key.upper())
+        else:
+            sql, clause_params = condition(key, value)
+        where.append(f'({sql})')
+        params.extend(clause_params)
+
+    sql = f'SELECT {columns} FROM {table}'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    orders = [part for value in query.getall('order', []) for part in value.split(',')]
+    if orders:
+        terms = []
+        for order in orders:
+            column, *modifiers = order.split('.')
+            terms.append(identifier(column) + (' DESC' if 'desc' in modifiers else '') +
+                         (' NULLS FIRST' if 'nullsfirst' in modifiers else ''))
+        sql += ' ORDER BY ' + ', '.join(terms)
+    if 'limit' in query:
+        sql += f' LIMIT {int(query["limit"])}'
+        if 'offset' in query:
+            sql += f' OFFSET {int(query["offset"])}'
+    return sql, params
+
+
+class FakeSupabase:
+    """PostgREST look-alike over a generated in-memory dataset, with injectable latency and errors"""
+
+    def __init__(self, users: int = 1000, days: int = 90, seed: int = 1, latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = Counter()   # "METHOD table" -> count
+        self.injected_errors = 0
+        self.url = None
+        self._loop = None
+        self._thread = None
+        self.db = sqlite3.connect(':memory:', check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        self.dataset = seed_data.parse_args(['--users', str(users), '--days', str(days), '--seed', str(seed)])
+        self._load()
+
+    def _load(self):
+        """Fill the tables from seed_data's generator"""
+        started = time.perf_counter()
+        generator = seed_data.DatasetGenerator(self.dataset)
+        with self.db:
+            for users, logs, summaries in generator.batches():
+                self.db.executemany(f'INSERT INTO users ({", ".join(seed_data.USER_COLUMNS)}) VALUES ({", ".join("?" * len(seed_data.USER_COLUMNS))})', users)
+                self.db.executemany(f'INSERT INTO nutrition_logs ({", ".join(seed_data.LOG_COLUMNS)}) VALUES ({", ".join("?" * len(seed_data.LOG_COLUMNS))})', logs)
+                self.db.executemany(f'INSERT INTO daily_nutrition_summary ({", ".join(seed_data.SUMMARY_COLUMNS)}) VALUES ({", ".join("?" * len(seed_data.SUMMARY_COLUMNS))})', summaries)
+        logger.info(f"🧪 Fake Supabase loaded {self.dataset.users} users x {self.dataset.days} days in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    @property
+    def user_ids(self) -> range:
+        """Telegram ids of the generated users"""
+        return range(self.dataset.user_id_start, self.dataset.user_id_start + self.dataset.users)
+
+    # PostgREST routes
+
+    async def _delay_or_fail(self, request):
+        """Apply the configured latency; returns an error response when this request should fail"""
+        self.requests[f"{request.method} {request.match_info['name']}"] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.random.gauss(self.latency, self.jitter)))
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.injected_errors += 1
+            return web.json_response({'code': 'PGRST000', 'message': 'injected error', 'details': None, 'hint': None}, status=503)
+        return None
+
+    async def handle_table(self, request):
+        failure = await self._delay_or_fail(request)
+        if failure is not None:
+            return failure
+        table = request.match_info['name']
+        if table not in TABLES:
+            return web.json_response({'code': '42P01', 'message': f'relation "{table}" does not exist'}, status=404)
+        try:
+            if request.method == 'GET':
+                sql, params = build_select(table, request.query)
+                rows = [dict(row) for row in self.db.execute(sql, params)]
+                return web.json_response(rows)
+            if request.method == 'POST':
+                return await self._upsert(table, request)
+        except (QueryError, sqlite3.Error) as e:
+            return web.json_response({'code': 'PGRST100', 'message': str(e), 'details': None, 'hint': None}, status=400)
+        return web.json_response({'code': 'PGRST105', 'message': f'{request.method} is not supported by the fake'}, status=405)
+
+    async def _upsert(self, table: str, request):
+        body = await request.json()
+        rows = body if isinstance(body, list) else [body]
+        if not rows:
+            return web.json_response([], status=201)
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        merge = 'resolution=merge-duplicates' in request.headers.get('Prefer', '')
+        with self.db:
+            for row in rows:
+                if table == 'daily_nutrition_summary':
+                    row = {**row, 'updated_at': now}
+                columns = [identifier(column) for column in row]
+                sql = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+                if merge:
+                    conflict = request.query.get('on_conflict') or ('user_id' if table == 'users' else 'id')
+                    keys = [identifier(column) for column in conflict.split(',')]
+                    updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column not in keys)
+                    sql += f' ON CONFLICT ({", ".join(keys)}) DO ' + (f'UPDATE SET {updates}' if updates else 'NOTHING')
+                self.db.execute(sql, [row[column] for column in columns])
+        return web.json_response(rows if 'return=representation' in request.headers.get('Prefer', '') else [], status=201)
+
+    async def handle_rpc(self, request):
+        failure = await self._delay_or_fail(request)
+        if failure is not None:
+            return failure
+        if request.match_info['name'] != 'get_daily_nutrition_history':
+            return web.json_response({'code': 'PGRST202', 'message': f"function {request.match_info['name']} not found"}, status=404)
+        arguments = await request.json()
+        return web.json_response(self.daily_history(int(arguments['p_user_telegram_id']), int(arguments.get('p_days', 7))))
+
+    def daily_history(self, user_telegram_id: int, days: int) -> list:
+        """get_daily_nutrition_history: dense last-N-days rows, oldest first, targets on every row"""
+        days = min(max(days, 1), 366)
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        user = self.db.execute('SELECT * FROM users WHERE user_id = ?', (user_telegram_id,)).fetchone()
+        summaries = {row['date']: row for row in self.db.execute(
+            'SELECT * FROM daily_nutrition_summary WHERE user_telegram_id = ? AND date >= ? AND date <= ?',
+            (user_telegram_id, (today - datetime.timedelta(days=days - 1)).isoformat(), today.isoformat())
+        )}
+        rows = []
+        for offset in range(days - 1, -1, -1):
+            date = (today - datetime.timedelta(days=offset)).isoformat()
+            summary = summaries.get(date)
+            rows.append({
+                'date': date,
+                'calories': summary['total_calories'] if summary else 0,
+                'protein': summary['total_protein_g'] if summary else 0,
+                'carbs': summary['total_carbs_g'] if summary else 0,
+                'fats': summary['total_fat_g'] if summary else 0,
+                'meals_logged_count': summary['meals_logged_count'] if summary else 0,
+                'calorie_target': user['calorie_target'] if user else None,
+                'protein_target_g': user['protein_target_g'] if user else None,
+                'carbs_target_g': user['carbs_target_g'] if user else None,
+                'fat_target_g': user['fat_target_g'] if user else None,
+                'day_calorie_target': summary['calorie_target'] if summary else None,
+                'day_protein_target_g': summary['protein_target_g'] if summary else None,
+                'day_carbs_target_g': summary['carbs_target_g'] if summary else None,
+                'day_fat_target_g': summary['fat_target_g'] if summary else None,
+                'user_exists': user is not None
+            })
+        return rows
+
+    # Lifecycle
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route('*', '/rest/v1/rpc/{name}', self.handle_rpc)
+        app.router.add_route('*', '/rest/v1/{name}', self.handle_table)
+        return app
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Serve on a background thread with its own event loop; returns the base URL (SUPABASE_URL)"""
+        ready = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            runner = web.AppRunner(self.app(), access_log=None)
+            self._loop.run_until_complete(runner.setup())
+            self._loop.run_until_complete(web.TCPSite(runner, host, port).start())
+            self.url = f'http://{host}:{runner.addresses[0][1]}'
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name='fake-supabase', daemon=True)
+        self._thread.start()
+        ready.wait()
+        logger.info(f"🧪 Fake Supabase listening on {self.url}")
+        return self.url
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def stats(self) -> dict:
+        return {
+            'requests': dict(self.requests),
+            'injected_errors': self.injected_errors
+        }
+
+
+def add_backend_arguments(parser):
+    """Dataset and fault-injection options shared with loadtest.py"""
+    backend = parser.add_argument_group('fake Supabase')
+    backend.add_argument('--users', type=int, default=1000, help="generated users")
+    backend.add_argument('--days', type=int, default=90, help="days of generated history per user")
+    backend.add_argument('--seed', type=int, default=1)
+    backend.add_argument('--latency-ms', type=float, default=0.0, help="delay added to every backend request")
+    backend.add_argument('--jitter-ms', type=float, default=0.0, help="standard deviation of that delay")
+    backend.add_argument('--error-rate', type=float, default=0.0, help="share of backend requests answered with a 503")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Supabase REST API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+    fake = FakeSupabase(args.users, args.days, args.seed, args.latency_ms, args.jitter_ms, args.error_rate)
+    fake.start(args.host, args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
+        print(json.dumps(fake.stats(), indent=2))
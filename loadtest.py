@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Endpoint load test and latency regression check, offline
+Starts fake_supabase.py in this process, runs mini_app_server.py (or async_server.py) as a
+subprocess pointed at it, and drives each scenario - the dashboard, /api/nutrition-data,
+/api/historical-data, /api/streak-data and static images - at a fixed concurrency for a
+fixed time. Reports throughput and p50/p95/p99 latency per scenario, can save them as a
+JSON baseline, and exits non-zero when a run is slower than a baseline by more than
+--max-regression (or errors more than --max-error-rate).
+
+Usage: python loadtest.py --save-baseline loadtest_baseline.json
+       python loadtest.py --baseline loadtest_baseline.json --max-regression 0.2
+       python loadtest.py --server async_server --concurrency 64 --latency-ms 30 --error-rate 0.01
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import datetime
+import logging
+import subprocess
+import tempfile
+import aiohttp
+from fake_supabase import FakeSupabase, add_backend_arguments
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCENARIOS = {
+    'dashboard': '/nutrition-dashboard?user_id={user_id}',
+    'nutrition-data': '/api/nutrition-data?user_id={user_id}',
+    'historical-data': '/api/historical-data?user_id={user_id}&days=7',
+    'streak-data': '/api/streak-data?user_id={user_id}',
+    'static': '/images/{image}',
+}
+# Compared against the baseline; latencies may not grow, throughput may not drop, by more than the threshold
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+SERVER_STARTUP_TIMEOUT = 30
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    requests = len(latencies)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'error_rate': round(errors / requests, 4) if requests else 0.0,
+        'rps': round(requests / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / requests * 1000, 2) if requests else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0
+    }
+
+
+def start_server(args, supabase_url: str):
+    """Run the server under test against the fake; returns (process, base URL, log path)"""
+    port = free_port()
+    env = {
+        **os.environ,
+        'SUPABASE_URL': supabase_url,
+        'SUPABASE_ANON_KEY': 'loadtest',
+        'PORT': str(port),
+        'WEB_CONCURRENCY': str(args.workers),
+        'PYTHONUNBUFFERED': '1'
+    }
+    log_path = os.path.join(tempfile.gettempdir(), f'loadtest_{args.server}_{port}.log')
+    log_file = open(log_path, 'wb')
+    process = subprocess.Popen(
+        [sys.executable, f'{args.server}.py'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, stdout=log_file, stderr=subprocess.STDOUT
+    )
+    log_file.close()
+    base_url = f'http://127.0.0.1:{port}'
+
+    deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{args.server} exited during startup, see {log_path}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                break
+        except OSError:
+            time.sleep(0.2)
+    else:
+        process.terminate()
+        raise RuntimeError(f"{args.server} did not start listening in {SERVER_STARTUP_TIMEOUT}s, see {log_path}")
+    logger.info(f"🚀 {args.server} ({args.workers} worker(s)) listening on {base_url}, log: {log_path}")
+    return process, base_url, log_path
+
+
+async def run_scenario(session, base_url: str, template: str, user_ids, images: list, concurrency: int,
+                       duration: float, rng: random.Random) -> dict:
+    """Keep `concurrency` requests in flight for `duration` seconds; returns the latency summary"""
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            url = base_url + template.format(user_id=rng.choice(user_ids), image=rng.choice(images))
+            started = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    failed = response.status >= 400
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_load(args, base_url: str, user_ids) -> dict:
+    images = sorted(name for name in os.listdir('images') if name.endswith('.png'))
+    rng = random.Random(args.seed)
+    timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    results = {}
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        for name in args.scenarios:
+            template = SCENARIOS[name]
+            if args.warmup:
+                await run_scenario(session, base_url, template, user_ids, images, args.concurrency, args.warmup, rng)
+            results[name] = await run_scenario(session, base_url, template, user_ids, images, args.concurrency, args.duration, rng)
+            logger.info(f"📈 {name}: {results[name]['rps']} req/s, p50 {results[name]['p50_ms']}ms, "
+                        f"p95 {results[name]['p95_ms']}ms, p99 {results[name]['p99_ms']}ms, {results[name]['errors']} errors")
+    return results
+
+
+def run_config(args) -> dict:
+    """The settings a baseline is only comparable under"""
+    return {
+        'server': args.server,
+        'workers': args.workers,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'users': args.users,
+        'days': args.days,
+        'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms,
+        'error_rate': args.error_rate
+    }
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list:
+    """Human-readable regressions of `results` against a saved baseline"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            continue
+        for metric in LATENCY_METRICS:
+            if previous[metric] and current[metric] > previous[metric] * (1 + max_regression):
+                regressions.append(f"{name} {metric}: {current[metric]}ms vs baseline {previous[metric]}ms "
+                                   f"(+{(current[metric] / previous[metric] - 1) * 100:.0f}%)")
+        if previous['rps'] and current['rps'] < previous['rps'] * (1 - max_regression):
+            regressions.append(f"{name} rps: {current['rps']} vs baseline {previous['rps']} "
+                               f"({(current['rps'] / previous['rps'] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_report(results: dict):
+    print(f"\n{'scenario':<16}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['requests']:>10}{r['errors']:>8}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}")
+    print()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline endpoint load test with a fake Supabase backend")
+    parser.add_argument('--server', choices=('mini_app_server', 'async_server'), default='mini_app_server')
+    parser.add_argument('--workers', type=int, default=1, help="pre-forked server workers (WEB_CONCURRENCY)")
+    parser.add_argument('--scenarios', nargs='+', choices=tuple(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=16, help="requests kept in flight")
+    parser.add_argument('--duration', type=float, default=10, help="measured seconds per scenario")
+    parser.add_argument('--warmup', type=float, default=2, help="unmeasured seconds before each scenario")
+    parser.add_argument('--request-timeout', type=float, default=30)
+    parser.add_argument('--save-baseline', metavar='PATH', help="write the results as a JSON baseline")
+    parser.add_argument('--baseline', metavar='PATH', help="compare against a saved baseline")
+    parser.add_argument('--max-regression', type=float, default=0.25, help="allowed slowdown vs the baseline (0.25 = 25%%)")
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help="allowed share of failed requests per scenario")
+    add_backend_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    fake = FakeSupabase(args.users, args.days, args.seed, args.latency_ms, args.jitter_ms, args.error_rate)
+    supabase_url = fake.start()
+    process = None
+    try:
+        process, base_url, _ = start_server(args, supabase_url)
+        results = asyncio.run(run_load(args, base_url, fake.user_ids))
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        fake.stop()
+
+    print_report(results)
+    logger.info(f"🧪 Backend requests: {fake.stats()}")
+    report = {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': run_config(args),
+        'scenarios': results
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"💾 Saved baseline to {args.save_baseline}")
+
+    failures = [f"{name} error rate {r['error_rate']:.2%} > {args.max_error_rate:.2%}"
+                for name, r in results.items() if r['error_rate'] > args.max_error_rate]
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != report['config']:
+            logger.warning(f"⚠️ Baseline was recorded with different settings: {baseline.get('config')}")
+        failures.extend(compare(results, baseline, args.max_regression))
+
+    for failure in failures:
+        logger.error(f"❌ {failure}")
+    if failures:
+        return 1
+    logger.info("✅ No regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Logging setup for the servers: optional background writer, JSON lines, per-route sampling
+With LOG_ASYNC the request threads only put records on a queue; a QueueListener thread
+formats and writes them, and message arguments are not even interpolated until then. With
+LOG_FORMAT=json every line is one JSON object carrying the request's route and user id plus
+any `extra={'fields': {...}}` (callables in it are only evaluated if the line is written).
+Below WARNING, request logging can be sampled per route (LOG_SAMPLE_RATES), raised to a higher
+level per route (LOG_ROUTE_LEVELS), or opened up to full DEBUG detail for one user
+(LOG_DEBUG_USER_ID). Warnings and errors are always written.
+"""
+
+import os
+import sys
+import json
+import queue
+import random
+import atexit
+import logging
+import datetime
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from config import LOG_LEVEL, LOG_FORMAT, LOG_ASYNC, LOG_ROUTE_LEVELS, LOG_SAMPLE_RATES, LOG_DEBUG_USER_ID
+
+# Same lines as logging.basicConfig()
+TEXT_FORMAT = '%(levelname)s:%(name)s:%(message)s'
+
+_request_context = contextvars.ContextVar('request_log_context', default=None)
+_configured = False
+
+
+def parse_route_settings(value: str, convert) -> dict:
+    """'/images=WARNING,/api/nutrition-data=0.1' -> {route prefix: converted value}"""
+    settings = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        route, _, setting = item.partition('=')
+        settings[route.strip()] = convert(setting.strip())
+    return settings
+
+
+def level_number(name: str) -> int:
+    level = logging.getLevelName(name.upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {name}")
+    return level
+
+
+ROOT_LEVEL = level_number(LOG_LEVEL)
+ROUTE_LEVELS = parse_route_settings(LOG_ROUTE_LEVELS, level_number)
+SAMPLE_RATES = parse_route_settings(LOG_SAMPLE_RATES, float)
+
+
+def route_setting(settings: dict, route: str, default):
+    """Value of the longest route prefix in `settings` matching `route`"""
+    best = None
+    for prefix in settings:
+        if route.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return settings[best] if best is not None else default
+
+
+class RequestLogContext:
+    """Route, user and logging decisions for one request, made once when it starts"""
+
+    __slots__ = ('route', 'user_id', 'level', 'sampled', 'debug')
+
+    def __init__(self, route: str, user_id):
+        self.route = route
+        self.user_id = user_id
+        self.debug = bool(LOG_DEBUG_USER_ID) and str(user_id) == LOG_DEBUG_USER_ID
+        self.level = logging.DEBUG if self.debug else route_setting(ROUTE_LEVELS, route, ROOT_LEVEL)
+        rate = route_setting(SAMPLE_RATES, route, 1.0)
+        self.sampled = self.debug or rate >= 1.0 or random.random() < rate
+
+
+@contextmanager
+def request_log_context(route: str, user_id=None):
+    """Apply the route's level/sampling (and the debug user switch) to log lines made while serving it"""
+    token = _request_context.set(RequestLogContext(route, user_id))
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+
+class RequestLogFilter(logging.Filter):
+    """Drop request log lines below the route's level or outside the sample; tag the rest with route and user"""
+
+    def filter(self, record) -> bool:
+        context = _request_context.get()
+        if context is None:
+            return record.levelno >= ROOT_LEVEL
+        if record.levelno < logging.WARNING and (record.levelno < context.level or not context.sampled):
+            return False
+        record.route = context.route
+        record.user_id = context.user_id
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, pid, route/user and extra fields"""
+
+    def format(self, record) -> str:
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process
+        }
+        if getattr(record, 'route', None):
+            entry['route'] = record.route
+        if getattr(record, 'user_id', None) is not None:
+            entry['user_id'] = record.user_id
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update({key: value() if callable(value) else value for key, value in fields.items()})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread and restarts it in forked workers"""
+
+    def __init__(self, target: logging.Handler):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self.listener = None
+        self._pid = None
+        self._start()
+        atexit.register(self.stop)
+
+    def _start(self):
+        # Listener threads don't survive fork(), so each pre-forked worker starts its own
+        self.queue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Same process, so the record (with its unformatted args) can be handed over as is;
+        # only a traceback is rendered now, while it still exists
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        super().emit(record)
+
+    def stop(self):
+        """Flush queued records and stop the listener (runs at exit)"""
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+
+
+def configure_logging():
+    """Install the LOG_* configured handler on the root logger (in place of logging.basicConfig)"""
+    global _configured
+    if _configured:
+        return
+    root = logging.getLogger()
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+    handler = BackgroundQueueHandler(stream) if LOG_ASYNC else stream
+    handler.addFilter(RequestLogFilter())
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    # Loggers must let DEBUG records through for the per-route / per-user overrides; the filter does the rest
+    root.setLevel(min([ROOT_LEVEL, *ROUTE_LEVELS.values()] + ([logging.DEBUG] if LOG_DEBUG_USER_ID else [])))
+    _configured = True
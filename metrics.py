@@ -0,0 +1,217 @@
+"""
+Prometheus metrics for the servers (/metrics, text exposition format 0.0.4)
+Counters, gauges and histograms are plain in-process objects: recording is a dict lookup
+and a few additions under the metric's own lock, and nothing is formatted until a scrape.
+Values that already exist elsewhere (cache counters, USER_DATA size, process memory) are
+read at scrape time through collector callbacks instead of being mirrored on every request.
+Each pre-forked worker keeps its own metrics, so scrape workers individually (or run one).
+"""
+
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from config import METRICS_ENABLED
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Request and backend latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Route label values; other paths are counted as "other" so scanners can't blow up the label set
+ROUTES = (
+    '/', '/nutrition-dashboard', '/test', '/health', '/metrics', '/api/nutrition-data', '/api/historical-data',
+    '/api/streak-data', '/api/dashboard', '/api/events', '/api/update-user-data', '/api/bulk-update-user-data'
+)
+_ROUTE_SET = frozenset(ROUTES)
+_PROCESS_START = time.time()
+
+
+def route_label(path: str) -> str:
+    if path in _ROUTE_SET:
+        return path
+    if path.startswith('/images/'):
+        return '/images/*'
+    return 'other'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self.kind = 'counter'
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _labels(self.label_names, labels), value
+
+
+class Gauge(Counter):
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        super().__init__(name, help, labels)
+        self.kind = 'gauge'
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, labels
+        self.kind = 'histogram'
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', _labels(self.label_names, labels, f'le="{_number(bound)}"'), cumulative
+            yield f'{self.name}_sum', _labels(self.label_names, labels), total
+            yield f'{self.name}_count', _labels(self.label_names, labels), cumulative
+
+
+class Registry:
+    """Metrics plus scrape-time collectors: callables returning (name, kind, help, [(labels dict, value)])"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name}{labels} {_number(value)}' for name, labels, value in metric.samples())
+        for collector in self.collectors:
+            for name, kind, help, samples in collector():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+HTTP_REQUESTS = REGISTRY.register(Counter('http_requests_total', 'HTTP requests by route, method and status code', ('route', 'method', 'status')))
+HTTP_DURATION = REGISTRY.register(Histogram('http_request_duration_seconds', 'HTTP request latency by route and method', ('route', 'method')))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge('http_requests_in_flight', 'HTTP requests being served, by route', ('route',)))
+SUPABASE_DURATION = REGISTRY.register(Histogram('supabase_query_duration_seconds', 'Supabase (PostgREST) call latency by table/RPC and method', ('table', 'method')))
+SUPABASE_ERRORS = REGISTRY.register(Counter('supabase_query_errors_total', 'Failed Supabase calls by table/RPC and method', ('table', 'method')))
+
+
+class RequestMetrics:
+    """Status code of the request being tracked (set by the server before the response goes out)"""
+
+    __slots__ = ('status', 'deferred', '_record')
+
+    def __init__(self):
+        self.status = 500
+        self.deferred = False
+        self._record = None
+
+    def defer(self):
+        """Record the request when finish() is called instead of when track_request exits
+        (for responses whose status is decided, and body sent, after the handler returns)"""
+        self.deferred = True
+
+    def finish(self):
+        record, self._record = self._record, None
+        if record is not None:
+            record()
+
+
+@contextmanager
+def track_request(method: str, path: str):
+    """Count the request, its status and latency, and keep it in the in-flight gauge meanwhile"""
+    request = RequestMetrics()
+    if not METRICS_ENABLED:
+        yield request
+        return
+    route = route_label(path)
+    HTTP_IN_FLIGHT.inc(route)
+    started = time.perf_counter()
+
+    def record():
+        HTTP_IN_FLIGHT.dec(route)
+        HTTP_DURATION.observe(time.perf_counter() - started, route, method)
+        HTTP_REQUESTS.inc(route, method, str(request.status))
+
+    request._record = record
+    try:
+        yield request
+    finally:
+        if not request.deferred:
+            request.finish()
+
+
+def observe_query(table: str, method: str, seconds: float, failed: bool = False):
+    """Record one Supabase call's latency (and failure)"""
+    if not METRICS_ENABLED:
+        return
+    SUPABASE_DURATION.observe(seconds, table, method)
+    if failed:
+        SUPABASE_ERRORS.inc(table, method)
+
+
+def process_metrics():
+    """Resident memory, CPU time and start time of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024   # peak, in KiB on Linux
+    times = os.times()
+    return [
+        ('process_resident_memory_bytes', 'gauge', 'Resident memory size in bytes', [({}, rss)]),
+        ('process_cpu_seconds_total', 'counter', 'User and system CPU time in seconds', [({}, round(times.user + times.system, 3))]),
+        ('process_start_time_seconds', 'gauge', 'Start time of the process since the epoch', [({}, round(_PROCESS_START, 3))]),
+    ]
+
+
+REGISTRY.add_collector(process_metrics)
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Simple Mini App Server for Nutrition Dashboard
-Uses only standard library - no external dependencies
+Serves HTTP with the standard library (ThreadingHTTPServer); data comes from Supabase
+through the supabase client (supabase_db.py), with orjson/msgpack/brotli used when installed
 """
 
 import os
@@ -9,228 +10,195 @@ import json
 import logging
 import asyncio
 import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import threading
+import contextvars
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import time
-from supabase_db import SupabaseMiniApp
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from supabase_db import SupabaseMiniApp, close_shared_client, invalidate_user_cache, user_cache_stats, summary_replica
+from user_store import UserNutritionStore, COLUMNS
+from user_store_journal import UserStoreJournal
+from template_renderer import CompiledTemplate
+from static_files import resolve_static_request, build_static_response
+from asset_manifest import asset_manifest
+from compression import negotiate_encoding, encode_body
+from serialization import PayloadTemplate, encode_payload, VARY as ENCODED_VARY
+from analytics import parse_days, parse_analytics_options, days_to_load, build_analytics
+from events import EventHub, ChangePoller, format_sse, SSE_HEARTBEAT
+from bulk_ingest import BulkIngestion, SummaryWriteBehind, summary_rows
+from query_log import track_queries, current_query_log, HEADER_NAME as QUERY_LOG_HEADER
+from log_config import configure_logging, request_log_context
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, track_request
+from server_timing import track_timing, current_timing, timed, timed_call, HEADER_NAME as SERVER_TIMING_HEADER
+from config import (
+    COMPRESSION_LEVEL, EVENTS_POLL_INTERVAL, EVENTS_HEARTBEAT_INTERVAL,
+    INGEST_COALESCE_WINDOW, INGEST_BATCH_SIZE, INGEST_WRITE_BEHIND, INGEST_WRITE_QUEUE_SIZE,
+    USER_STORE_JOURNAL, USER_STORE_COMPACT_RATIO, USER_STORE_MAX_AGE_HOURS, QUERY_DEBUG_HEADER, METRICS_ENABLED,
+    HTTP_KEEPALIVE_TIMEOUT
+)
+
+# Configure logging (LOG_* settings, see log_config.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# In-memory storage for user nutrition data
+# In-memory storage for user nutrition data pushed by the bot (compact, LRU-bounded; see user_store.py)
 # In production, this should be replaced with a proper database
-USER_DATA = {}
+# With USER_STORE_JOURNAL set it is journaled to disk and replayed here, so restarts come back warm
+USER_DATA = UserNutritionStore(journal=UserStoreJournal(
+    USER_STORE_JOURNAL, COLUMNS, USER_STORE_COMPACT_RATIO, USER_STORE_MAX_AGE_HOURS
+) if USER_STORE_JOURNAL else None)
 
 # Sample user data for testing
-sample_data = {
-    'user_123': {
-        'user_id': 'user_123',
-        'targets': {'calories': 2500, 'protein_g': 200, 'fats_g': 80, 'carbs_g': 300},
-        'consumed_today': {'calories': 301, 'protein_g': 39, 'fats_g': 19, 'carbs_g': 49},
-        'remaining': {'calories': 2199, 'protein_g': 161, 'fats_g': 61, 'carbs_g': 251},
-        'progress': {'calories': 0.12, 'protein_g': 0.195, 'fats_g': 0.2375, 'carbs_g': 0.1633},
-        'meal_count': 1
-    }
-}
-
-# Initialize with sample data
-USER_DATA.update(sample_data)
+if 'user_123' not in USER_DATA:
+    USER_DATA.update(
+        'user_123',
+        targets={'calories': 2500, 'protein_g': 200, 'fats_g': 80, 'carbs_g': 300},
+        consumed_today={'calories': 301, 'protein_g': 39, 'fats_g': 19, 'carbs_g': 49},
+        meal_count=1
+    )
 
 def update_user_nutrition_data(user_id, targets=None, consumed_today=None, meal_count=0):
     """
     Utility function for bots to update user nutrition data.
+    Remaining amounts and progress are derived from targets and consumed_today when read.
     """
-    user_id_str = str(user_id)
-
-    # Calculate remaining amounts
-    remaining = {}
-    progress = {}
-
-    if targets and consumed_today:
-        remaining = {
-            'calories': max(0, targets.get('calories', 2000) - consumed_today.get('calories', 0)),
-            'protein_g': max(0, targets.get('protein_g', 150) - consumed_today.get('protein_g', 0)),
-            'fats_g': max(0, targets.get('fats_g', 65) - consumed_today.get('fats_g', 0)),
-            'carbs_g': max(0, targets.get('carbs_g', 250) - consumed_today.get('carbs_g', 0))
-        }
+    user_data = USER_DATA.update(user_id, targets, consumed_today, meal_count)
+    logger.info("Updated nutrition data for user %s", user_id)
+    logger.debug("Updated nutrition record for user %s: %s", user_id, user_data)
+    return user_data
 
-        progress = {
-            'calories': min(1.0, consumed_today.get('calories', 0) / targets.get('calories', 2000)),
-            'protein_g': min(1.0, consumed_today.get('protein_g', 0) / targets.get('protein_g', 150)),
-            'fats_g': min(1.0, consumed_today.get('fats_g', 0) / targets.get('fats_g', 65)),
-            'carbs_g': min(1.0, consumed_today.get('carbs_g', 0) / targets.get('carbs_g', 250))
-        }
-
-    USER_DATA[user_id_str] = {
-        'user_id': user_id_str,
-        'targets': targets or {'calories': 2000, 'protein_g': 150, 'fats_g': 65, 'carbs_g': 250},
-        'consumed_today': consumed_today or {'calories': 0, 'protein_g': 0, 'fats_g': 0, 'carbs_g': 0},
-        'remaining': remaining or {'calories': 2000, 'protein_g': 150, 'fats_g': 65, 'carbs_g': 250},
-        'progress': progress or {'calories': 0, 'protein_g': 0, 'fats_g': 0, 'carbs_g': 0},
-        'meal_count': meal_count
-    }
-
-    logger.info(f"Updated nutrition data for user {user_id}: {USER_DATA[user_id_str]}")
-    return USER_DATA[user_id_str]
+# Global supabase client instance; every instance shares the process-wide connection pool
+supabase_client = SupabaseMiniApp()
 
 class NutritionDataHandler:
     """Handler for getting real nutrition data from Supabase - SAME LOGIC AS /consumed and /left commands"""
     
     def __init__(self):
-        self.supabase_client = SupabaseMiniApp()
+        self.supabase_client = supabase_client
     
-    async def get_user_nutrition_data(self, user_id: str) -> dict:
+    async def get_user_nutrition_data(self, user_id: str, use_replica: bool = True) -> dict:
         """Get REAL nutrition data using SAME logic as /consumed and /left commands"""
-        logger.info(f"Getting REAL nutrition data for user {user_id} - SAME LOGIC AS BOT COMMANDS")
+        logger.info("Getting REAL nutrition data for user %s - SAME LOGIC AS BOT COMMANDS", user_id)
         
         try:
             # Convert string user_id to int for database query
             user_telegram_id = int(user_id)
             
             # STEP 1: Get user's daily nutrition targets (SAME AS /consumed command)
-            user_profile = await self.supabase_client.get_user_profile(user_telegram_id)
-            logger.info(f"User profile from database: {user_profile}")
+            with timed('profile'):
+                user_profile = await self.supabase_client.get_user_profile(user_telegram_id)
+            logger.debug("User profile from database: %s", user_profile)
             
             if not user_profile:
                 logger.error(f"No user profile found for {user_telegram_id}")
                 raise Exception(f"No user profile found for user {user_telegram_id}")
             
-            # Get daily targets and convert Decimal to float (SAME AS /consumed command)
-            daily_calories = float(user_profile.get('calorie_target') or 2000)
-            daily_protein = float(user_profile.get('protein_target_g') or 150)
-            daily_carbs = float(user_profile.get('carbs_target_g') or 250)
-            daily_fats = float(user_profile.get('fat_target_g') or 65)
-            
-            logger.info(f"REAL Daily targets - Calories: {daily_calories}, Protein: {daily_protein}, Carbs: {daily_carbs}, Fats: {daily_fats}")
-            
-            if not all([daily_calories, daily_protein, daily_carbs, daily_fats]):
-                logger.error(f"Missing nutrition targets for user {user_telegram_id}")
-                raise Exception(f"Missing nutrition targets for user {user_telegram_id}")
-            
             # STEP 2: Get today's total nutrition from all logged meals (SAME AS /consumed command)
-            today_nutrition = await self.supabase_client.get_today_nutrition_summary(user_telegram_id)
-            logger.info(f"REAL Today's nutrition summary: {today_nutrition}")
-            
-            # Get today's totals from database (SAME AS /consumed command)
-            today_calories = today_nutrition.get('total_calories', 0)
-            today_protein = today_nutrition.get('total_protein_g', 0)
-            today_carbs = today_nutrition.get('total_carbs_g', 0)
-            today_fats = today_nutrition.get('total_fat_g', 0)
-            
-            logger.info(f"REAL Today's consumed - Calories: {today_calories}, Protein: {today_protein}g, Carbs: {today_carbs}g, Fats: {today_fats}g")
-            
-            # STEP 3: Calculate remaining amounts (SAME AS /left command)
-            calories_remaining = max(0, daily_calories - today_calories)
-            protein_remaining = max(0, daily_protein - today_protein)
-            carbs_remaining = max(0, daily_carbs - today_carbs)
-            fats_remaining = max(0, daily_fats - today_fats)
-            
-            logger.info(f"REAL Calculated remaining - Calories: {calories_remaining}, Protein: {protein_remaining}g, Carbs: {carbs_remaining}g, Fats: {fats_remaining}g")
-            
-            return {
-                'calories': {'value': calories_remaining, 'total': daily_calories},
-                'protein': {'value': protein_remaining, 'total': daily_protein},
-                'carbs': {'value': carbs_remaining, 'total': daily_carbs},
-                'fats': {'value': fats_remaining, 'total': daily_fats}
-            }
+            with timed('summary'):
+                today_nutrition = await self.supabase_client.get_today_nutrition_summary(user_telegram_id, use_replica)
+
+            return self.calculate_nutrition_data(user_telegram_id, user_profile, today_nutrition)
             
         except Exception as e:
             logger.error(f"Error getting REAL data for user {user_id}: {e}")
             raise Exception(f"Failed to get real nutrition data for user {user_id}: {str(e)}")
 
-# Global supabase client instance for historical data
-supabase_client = SupabaseMiniApp()
-
-async def get_historical_nutrition_data(user_id: str, days: int = 7) -> dict:
-    """Get historical nutrition data for the last N days"""
-    try:
-        logger.info(f"🔍 DEBUG: get_historical_nutrition_data called with user_id='{user_id}' (type: {type(user_id)}), days={days}")
-
-        user_telegram_id = int(user_id)
-        logger.info(f"🔍 DEBUG: Converted user_id to user_telegram_id={user_telegram_id} (type: {type(user_telegram_id)})")
-        logger.info(f"🍎 Getting {days} days of REAL historical nutrition data for user {user_telegram_id}")
-
-        # Get user profile for targets (same for all days)
-        user_profile = await supabase_client.get_user_profile(user_telegram_id)
-
-        if not user_profile:
-            logger.error(f"No user profile found for user {user_telegram_id}")
-            raise Exception(f"User profile not found")
-
-        # Get targets
+    @staticmethod
+    def calculate_nutrition_data(user_telegram_id: int, user_profile: dict, today_nutrition: dict) -> dict:
+        """Targets and remaining amounts from a users row and today's summary (SAME AS /left command)"""
+        # Get daily targets and convert Decimal to float (SAME AS /consumed command)
         daily_calories = float(user_profile.get('calorie_target') or 2000)
         daily_protein = float(user_profile.get('protein_target_g') or 150)
         daily_carbs = float(user_profile.get('carbs_target_g') or 250)
         daily_fats = float(user_profile.get('fat_target_g') or 65)
 
-        # Get REAL nutrition data directly from recent_daily_nutrition_summary view
-        logger.info(f"🔍 DEBUG: Using recent_daily_nutrition_summary view for user_telegram_id={user_telegram_id}")
+        logger.info("REAL Daily targets - Calories: %s, Protein: %s, Carbs: %s, Fats: %s", daily_calories, daily_protein, daily_carbs, daily_fats)
 
-        recent_summaries = await supabase_client.get_recent_daily_summaries(user_telegram_id, days)
-        logger.info(f"🔍 DEBUG: Got {len(recent_summaries)} days from recent_daily_nutrition_summary view")
+        if not all([daily_calories, daily_protein, daily_carbs, daily_fats]):
+            logger.error(f"Missing nutrition targets for user {user_telegram_id}")
+            raise Exception(f"Missing nutrition targets for user {user_telegram_id}")
 
-        # Convert view data to historical format, ensuring we have exactly 7 days
-        today = datetime.datetime.now(datetime.timezone.utc).date()
-        historical_data = []
-        total_real_calories = 0
-        days_with_data = 0
+        logger.debug("REAL Today's nutrition summary: %s", today_nutrition)
 
-        # Create a lookup dict from the view data
-        summary_lookup = {summary['date']: summary for summary in recent_summaries}
+        # Get today's totals from database (SAME AS /consumed command)
+        today_calories = today_nutrition.get('total_calories', 0)
+        today_protein = today_nutrition.get('total_protein_g', 0)
+        today_carbs = today_nutrition.get('total_carbs_g', 0)
+        today_fats = today_nutrition.get('total_fat_g', 0)
 
-        for i in range(days):
-            target_date = today - datetime.timedelta(days=days - 1 - i)
-            date_str = target_date.isoformat()
+        logger.info("REAL Today's consumed - Calories: %s, Protein: %sg, Carbs: %sg, Fats: %sg", today_calories, today_protein, today_carbs, today_fats)
 
-            if date_str in summary_lookup:
-                # Use data from recent_daily_nutrition_summary view
-                summary = summary_lookup[date_str]
-                calories_consumed = summary['total_calories']
-                protein_consumed = summary['total_protein_g']
-                carbs_consumed = summary['total_carbs_g']
-                fats_consumed = summary['total_fat_g']
+        # STEP 3: Calculate remaining amounts (SAME AS /left command)
+        calories_remaining = max(0, daily_calories - today_calories)
+        protein_remaining = max(0, daily_protein - today_protein)
+        carbs_remaining = max(0, daily_carbs - today_carbs)
+        fats_remaining = max(0, daily_fats - today_fats)
+
+        logger.info("REAL Calculated remaining - Calories: %s, Protein: %sg, Carbs: %sg, Fats: %sg", calories_remaining, protein_remaining, carbs_remaining, fats_remaining)
 
-                logger.info(f"✅ {date_str}: Found in view - {calories_consumed} calories, {summary['meals_logged_count']} meals")
-            else:
-                # No data for this day
-                calories_consumed = 0
-                protein_consumed = 0
-                carbs_consumed = 0
-                fats_consumed = 0
-
-                logger.info(f"❌ {date_str}: No data found in recent_daily_nutrition_summary view")
-
-            # Track real data statistics
-            if calories_consumed > 0:
-                days_with_data += 1
-            total_real_calories += calories_consumed
-
-            historical_data.append({
-                'date': date_str,
-                'calories': calories_consumed,
-                'protein': protein_consumed,
-                'carbs': carbs_consumed,
-                'fats': fats_consumed
-            })
-
-            logger.info(f"🔍 DEBUG: Day {i+1} ({date_str}): calories={calories_consumed}, protein={protein_consumed}, carbs={carbs_consumed}, fats={fats_consumed}")
-
-        # Always return real data from database (no sample data substitution)
-        average_calories = total_real_calories / days if days > 0 else 0
-        logger.info(f"✅ REAL DATA ONLY: {days_with_data}/{days} days with data, {total_real_calories} total calories, {average_calories:.0f} avg/day")
-
-        logger.info(f"✅ Successfully retrieved {days} days of historical data")
         return {
-            'daily_targets': {
-                'calories': daily_calories,
-                'protein': daily_protein,
-                'carbs': daily_carbs,
-                'fats': daily_fats
-            },
-            'historical_data': historical_data
+            'calories': {'value': calories_remaining, 'total': daily_calories},
+            'protein': {'value': protein_remaining, 'total': daily_protein},
+            'carbs': {'value': carbs_remaining, 'total': daily_carbs},
+            'fats': {'value': fats_remaining, 'total': daily_fats}
         }
 
+# Long-lived event loop shared by all requests of the stdlib server
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
+def get_event_loop():
+    """The shared background event loop, started on first use"""
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name='mini-app-event-loop', daemon=True).start()
+    return _event_loop
+
+async def _run_in_context(context: contextvars.Context, coro):
+    """Await `coro` with the context variables (query log, request log context) of `context`"""
+    for variable, value in context.items():
+        variable.set(value)
+    return await coro
+
+def run_async(coro):
+    """Run a coroutine on the shared background event loop and wait for its result.
+
+    It sees the calling handler thread's context variables, so its backend queries and
+    log lines are attributed to that thread's request.
+    """
+    return asyncio.run_coroutine_threadsafe(_run_in_context(contextvars.copy_context(), coro), get_event_loop()).result()
+
+def build_historical_data(history_rows: list) -> dict:
+    """Targets and per-day history from get_daily_history rows (already dense and oldest first)"""
+    if not history_rows or not history_rows[0].get('user_exists'):
+        raise Exception("User profile not found")
+
+    first = history_rows[0]
+    days_with_data = sum(1 for row in history_rows if row['calories'])
+    logger.info("✅ REAL DATA ONLY: %s/%s days with data", days_with_data, len(history_rows))
+    return {
+        'daily_targets': {
+            'calories': float(first.get('calorie_target') or 2000),
+            'protein': float(first.get('protein_target_g') or 150),
+            'carbs': float(first.get('carbs_target_g') or 250),
+            'fats': float(first.get('fat_target_g') or 65)
+        },
+        'historical_data': history_rows
+    }
+
+async def get_historical_nutrition_data(user_id: str, days: int = 7) -> dict:
+    """Get historical nutrition data for the last N days"""
+    try:
+        user_telegram_id = int(user_id)
+        logger.info("🍎 Getting %s days of REAL historical nutrition data for user %s", days, user_telegram_id)
+
+        # One query: dense day series with the user's targets (get_daily_nutrition_history)
+        with timed('history'):
+            history_rows = await supabase_client.get_daily_history(user_telegram_id, days)
+        return build_historical_data(history_rows)
+
     except Exception as e:
         logger.error(f"❌ Error getting historical data for user {user_id}: {e}")
         raise Exception(f"Failed to get historical nutrition data for user {user_id}: {str(e)}")
@@ -238,32 +206,602 @@ async def get_historical_nutrition_data(user_id: str, days: int = 7) -> dict:
 async def get_user_streak_data(user_id: str) -> dict:
     """Get user's current streak and days since last meal log from the database"""
     try:
-        logger.info(f"🔥 Getting streak data for user {user_id}")
+        logger.info("🔥 Getting streak data for user %s", user_id)
         user_telegram_id = int(user_id)
 
-        # Get current_streak, days_since_last_meal_log, and coins from the database
-        result = supabase_client.client.table('users').select('current_streak, days_since_last_meal_log, coins').eq('user_id', user_telegram_id).execute()
+        # Get current_streak, days_since_last_meal_log, and coins from the (cached) users row
+        with timed('streak'):
+            streak_data = await supabase_client.get_user_streak_stats(user_telegram_id)
 
-        if not result.data:
+        if not streak_data:
             logger.warning(f"No user found for user {user_telegram_id}, returning default values")
             return {'current_streak': 0, 'days_since_last_meal_log': 0, 'coins': 0}
 
-        current_streak = result.data[0].get('current_streak', 0) or 0
-        days_since_last_meal_log = result.data[0].get('days_since_last_meal_log', 0) or 0
-        coins = result.data[0].get('coins', 0) or 0
-        logger.info(f"✅ User {user_telegram_id} - current_streak: {current_streak}, days_since_last_meal_log: {days_since_last_meal_log}, coins: {coins}")
+        logger.info("✅ User %s - current_streak: %s, days_since_last_meal_log: %s, coins: %s", user_telegram_id, streak_data['current_streak'], streak_data['days_since_last_meal_log'], streak_data['coins'])
+        return streak_data
+
+    except Exception as e:
+        logger.error(f"❌ Error getting streak data for user {user_id}: {e}")
+        return {'current_streak': 0, 'days_since_last_meal_log': 0, 'coins': 0}
+
+TELEGRAM_TEST_SCRIPT = '''
+            <script src="https://telegram.org/js/telegram-web-app.js"></script>
+            <script>
+                console.log('Test Mini app loaded');
+                const tg = window.Telegram.WebApp;
+                tg.expand();
+                tg.ready();
+                console.log('Telegram WebApp test ready');
+                if (tg.MainButton) {
+                    tg.MainButton.setText('Test Dashboard');
+                }
+            </script>
+            '''
+
+TELEGRAM_DASHBOARD_SCRIPT = '''
+        <script src="https://telegram.org/js/telegram-web-app.js"></script>
+        <script>
+            console.log('Mini app loaded with user data');
+
+            // Telegram WebApp integration
+            const tg = window.Telegram.WebApp;
+            tg.expand();
+            tg.ready();
+            console.log('Telegram WebApp ready');
+
+            if (tg.MainButton) {
+                tg.MainButton.setText('Loading...');
+                setTimeout(() => {
+                    tg.MainButton.setText('Nutrition Dashboard');
+                    console.log('Nutrition Dashboard ready');
+                }, 1000);
+            }
+        </script>
+        '''
+
+# Anchors in nutritions_files.html and what replaces them; {fields} are filled per user by dashboard_slot_values
+DASHBOARD_REPLACEMENTS = {
+    # Update display values to show remaining amounts
+    'id="caloriesValue">2199</div>': 'id="caloriesValue">{calories_remaining}</div>',
+    'id="proteinValue">161</div>': 'id="proteinValue">{protein_remaining}g</div>',
+    'id="carbsValue">251</div>': 'id="carbsValue">{carbs_remaining}g</div>',
+    'id="fatsValue">61</div>': 'id="fatsValue">{fat_remaining}g</div>',
+
+    # Update subtitles to show "Kcal Left" and "Left"
+    'calories left</div>': 'Kcal Осталось</div>',
+    'protein left</div>': 'Белка Ост.</div>',
+    'carbs left</div>': 'Углеводов Ост.</div>',
+    'fats left</div>': 'Жиров Ост.</div>',
+
+    # Update user profile data in JavaScript
+    '''this.userProfile = {
+                    goals: {
+                        calories: 2500,
+                        protein: 200, // grams
+                        carbs: 300,   // grams
+                        fats: 80      // grams
+                    },
+                    consumed: {
+                        calories: 301,  // consumed today
+                        protein: 39,    // grams consumed
+                        carbs: 49,      // grams consumed
+                        fats: 19        // grams consumed
+                    }
+                };''': '''this.userProfile = {{
+                    goals: {{
+                        calories: {calories_total},
+                        protein: {protein_total}, // grams
+                        carbs: {carbs_total},   // grams
+                        fats: {fat_total}      // grams
+                    }},
+                    consumed: {{
+                        calories: {calories_consumed},  // consumed today
+                        protein: {protein_consumed},    // grams consumed
+                        carbs: {carbs_consumed},      // grams consumed
+                        fats: {fat_consumed}        // grams consumed
+                    }}
+                }};''',
+
+    # Add Telegram WebApp integration
+    '</head>': TELEGRAM_DASHBOARD_SCRIPT.replace('{', '{{').replace('}', '}}') + '</head>',
+}
+
+# Templates are compiled (and their static parts gzip-precompressed) once,
+# and recompiled when nutritions_files.html or the image manifest changes on disk
+DASHBOARD_TEMPLATE = CompiledTemplate('nutritions_files.html', DASHBOARD_REPLACEMENTS,
+                                      asset_manifest=asset_manifest, compress_level=COMPRESSION_LEVEL)
+TEST_DASHBOARD_TEMPLATE = CompiledTemplate('nutritions_files.html', {
+    '</head>': TELEGRAM_TEST_SCRIPT.replace('{', '{{').replace('}', '}}') + '</head>'
+}, asset_manifest=asset_manifest, compress_level=COMPRESSION_LEVEL)
+
+def dashboard_slot_values(user_data):
+    """Values for the DASHBOARD_TEMPLATE slots"""
+    # user_data['calories']['value'] is remaining, so consumed = total - remaining
+    return {
+        'calories_remaining': user_data['calories']['value'],
+        'protein_remaining': user_data['protein']['value'],
+        'carbs_remaining': user_data['carbs']['value'],
+        'fat_remaining': user_data['fats']['value'],
+        'calories_total': user_data['calories']['total'],
+        'protein_total': user_data['protein']['total'],
+        'carbs_total': user_data['carbs']['total'],
+        'fat_total': user_data['fats']['total'],
+        'calories_consumed': user_data['calories']['total'] - user_data['calories']['value'],
+        'protein_consumed': user_data['protein']['total'] - user_data['protein']['value'],
+        'carbs_consumed': user_data['carbs']['total'] - user_data['carbs']['value'],
+        'fat_consumed': user_data['fats']['total'] - user_data['fats']['value'],
+    }
+
+# Response builders shared by the stdlib server (RequestHandler) and the aiohttp server (async_server.py)
+
+def apply_user_data_update(data: dict) -> dict:
+    """Store a bot update posted to /api/update-user-data and build the response"""
+    user_id = str(data.get('user_id', 'user_123'))
+
+    # The bot changed this user's data, so their cached users row (targets, streak, coins) is stale
+    if user_id.isdigit():
+        invalidate_user_cache(int(user_id))
+    # Push the new numbers to their open dashboards right away
+    event_hub.request_refresh(user_id)
+
+    # Update user data
+    update_user_nutrition_data(
+        user_id=user_id,
+        targets=data.get('targets'),
+        consumed_today=data.get('consumed_today'),
+        meal_count=data.get('meal_count', 0)
+    )
+
+    return {
+        'status': 'success',
+        'message': f'Updated data for user {user_id}'
+    }
+
+def apply_user_data_updates(updates: list) -> int:
+    """Store a coalesced batch of bot updates from /api/bulk-update-user-data in one pass"""
+    stored = USER_DATA.update_many(updates)
+    for update in updates:
+        user_id = str(update['user_id'])
+        if user_id.isdigit():
+            invalidate_user_cache(int(user_id))
+        event_hub.request_refresh(user_id)
+    logger.info("📥 Applied %s bulk user updates", stored)
+    return stored
+
+async def ingest_user_data_batch(updates: list) -> int:
+    """Apply a bulk batch and, with INGEST_WRITE_BEHIND, queue it for daily_nutrition_summary; returns how many were stored"""
+    stored = apply_user_data_updates(updates)
+    if INGEST_WRITE_BEHIND:
+        await summary_write_behind.submit(summary_rows(updates))
+    return stored
+
+# Background Supabase refreshes of replayed USER_DATA records (kept referenced until done)
+_replay_refreshes = {}
+
+def get_replayed_user_data(user_id: str):
+    """The user's USER_DATA record if it was replayed from the journal after a restart and stored today (UTC), else None.
+    Serving it starts a background Supabase refresh that overwrites it, so later requests read Supabase again.
+    Only numeric (Telegram) ids are served this way; others have no users row to refresh from."""
+    if not user_id.isdigit():
+        return None
+    today = datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    record = USER_DATA.get_replayed(user_id, today.timestamp())
+    if record is not None and user_id not in _replay_refreshes:
+        # In an empty context, so its queries don't count towards this request's query log and timing
+        task = contextvars.Context().run(asyncio.get_running_loop().create_task, refresh_replayed_user_data(user_id, record['meal_count']))
+        _replay_refreshes[user_id] = task
+        task.add_done_callback(lambda _: _replay_refreshes.pop(user_id, None))
+    return record
+
+async def refresh_replayed_user_data(user_id: str, meal_count: int):
+    """Replace a replayed USER_DATA record with the user's targets and today's summary from Supabase"""
+    try:
+        user_telegram_id = int(user_id)
+        user_profile = await supabase_client.get_user_profile(user_telegram_id)
+        if not user_profile:
+            raise Exception(f"No user profile found for user {user_telegram_id}")
+        today_nutrition = await supabase_client.get_today_nutrition_summary(user_telegram_id)
+        USER_DATA.update(
+            user_id,
+            targets={
+                'calories': float(user_profile.get('calorie_target') or 2000),
+                'protein_g': float(user_profile.get('protein_target_g') or 150),
+                'fats_g': float(user_profile.get('fat_target_g') or 65),
+                'carbs_g': float(user_profile.get('carbs_target_g') or 250)
+            },
+            consumed_today={
+                'calories': today_nutrition.get('total_calories', 0),
+                'protein_g': today_nutrition.get('total_protein_g', 0),
+                'fats_g': today_nutrition.get('total_fat_g', 0),
+                'carbs_g': today_nutrition.get('total_carbs_g', 0)
+            },
+            meal_count=meal_count
+        )
+        logger.debug("Refreshed replayed nutrition data for user %s", user_id)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not refresh replayed nutrition data for user {user_id}: {e}")
+
+def replayed_dashboard_data(record: dict) -> dict:
+    """A USER_DATA record in the NutritionDataHandler.get_user_nutrition_data shape"""
+    return {
+        macro: {'value': record['remaining'][column], 'total': record['targets'][column]}
+        for macro, column in (('calories', 'calories'), ('protein', 'protein_g'), ('carbs', 'carbs_g'), ('fats', 'fats_g'))
+    }
+
+async def build_dashboard_html(user_id: str, gzip: bool = False):
+    """Render the nutrition dashboard for a user as UTF-8 bytes (gzip-compressed if asked), or None if the template is missing"""
+    logger.info("📱 Mini app accessed by user %s", user_id)
+
+    replayed = get_replayed_user_data(user_id)
+    if replayed is not None:
+        # Warm from the journal after a restart; Supabase is refreshing it in the background
+        user_data = replayed_dashboard_data(replayed)
+    else:
+        # Get user data from REAL database
+        nutrition_handler = NutritionDataHandler()
+        user_data = await nutrition_handler.get_user_nutrition_data(user_id)
+
+    try:
+        with timed('render'):
+            if gzip:
+                return DASHBOARD_TEMPLATE.render_gzip(dashboard_slot_values(user_data))
+            return DASHBOARD_TEMPLATE.render(dashboard_slot_values(user_data))
+    except FileNotFoundError:
+        return None
+
+def build_test_dashboard_html(gzip: bool = False):
+    """Render the test dashboard without user data as UTF-8 bytes (gzip-compressed if asked), or None if the template is missing"""
+    try:
+        if gzip:
+            return TEST_DASHBOARD_TEMPLATE.render_gzip()
+        return TEST_DASHBOARD_TEMPLATE.render()
+    except FileNotFoundError:
+        return None
+
+def app_metrics():
+    """Scrape-time metrics: USER_DATA size, cache hit ratios, summary replica and write-behind state"""
+    store = USER_DATA.stats()
+    cache = user_cache_stats()
+    write_behind = summary_write_behind.stats()
+    hits = [({'cache': 'users'}, cache['hits'])]
+    if summary_replica is not None:
+        hits.append(({'cache': 'summary_replica'}, summary_replica.hits))
+    families = [
+        ('user_data_users', 'gauge', 'Users held in the in-memory store (USER_DATA)', [({}, store['users'])]),
+        ('user_data_bytes', 'gauge', 'Memory of the USER_DATA row arrays and index', [({}, store['array_bytes'] + store['index_bytes'])]),
+        ('user_data_evictions_total', 'counter', 'Users evicted from USER_DATA at its memory cap', [({}, store['evictions'])]),
+        ('cache_hits_total', 'counter', 'Reads answered without a Supabase call, by cache', hits),
+        ('cache_misses_total', 'counter', 'Cache reads that went to Supabase, by cache', [({'cache': 'users'}, cache['misses'])]),
+        ('cache_hit_ratio', 'gauge', 'Hits / (hits + misses) since start, by cache', [({'cache': 'users'}, cache['hit_ratio'])]),
+        ('cache_entries', 'gauge', 'Entries held, by cache', [({'cache': 'users'}, cache['size'])]),
+        ('ingest_write_behind_queued_batches', 'gauge', 'Bulk-ingest batches waiting to be written to Supabase', [({}, write_behind['queued_batches'])]),
+        ('ingest_write_behind_failed_rows_total', 'counter', 'Write-behind rows that failed to reach Supabase', [({}, write_behind['failed_rows'])]),
+    ]
+    if summary_replica is not None:
+        families.append(('summary_replica_fresh', 'gauge', '1 while the summary replica is fresh enough to serve reads', [({}, int(summary_replica.is_fresh()))]))
+    return families
+
+REGISTRY.add_collector(app_metrics)
+
+def build_health_response() -> dict:
+    """Health check payload"""
+    return {
+        "status": "healthy",
+        "service": "nutrition-mini-app",
+        "database": "mock",
+        "user_cache": user_cache_stats(),
+        "user_store": USER_DATA.stats(),
+        "ingest_write_behind": summary_write_behind.stats(),
+        "summary_replica": summary_replica.stats() if summary_replica is not None else None,
+        "timestamp": str(time.time())
+    }
+
+def format_nutrition_api_response(user_id: str, real_data: dict) -> dict:
+    """/api/nutrition-data payload from NutritionDataHandler data (remaining 'value' and 'total' per macro)"""
+    # Calculate consumed amounts (opposite of remaining)
+    calories_consumed = real_data['calories']['total'] - real_data['calories']['value']
+    protein_consumed = real_data['protein']['total'] - real_data['protein']['value']
+    carbs_consumed = real_data['carbs']['total'] - real_data['carbs']['value']
+    fat_consumed = real_data['fats']['total'] - real_data['fats']['value']
+
+    logger.info("📊 API response: Consumed %s calories, %sg protein", calories_consumed, protein_consumed)
+
+    # Format response to match expected structure
+    return {
+        "user_id": user_id,
+        "targets": {
+            "calories": real_data['calories']['total'],
+            "protein_g": real_data['protein']['total'],
+            "carbs_g": real_data['carbs']['total'],
+            "fats_g": real_data['fats']['total']
+        },
+        "consumed_today": {
+            "calories": calories_consumed,
+            "protein_g": protein_consumed,
+            "carbs_g": carbs_consumed,
+            "fats_g": fat_consumed
+        },
+        "remaining": {
+            "calories": real_data['calories']['value'],
+            "protein_g": real_data['protein']['value'],
+            "carbs_g": real_data['carbs']['value'],
+            "fats_g": real_data['fats']['value']
+        }
+    }
+
+# Constant parts of the fallback payloads, encoded once (serialization.py)
+DEMO_NUTRITION_PAYLOAD = PayloadTemplate({
+    "targets": {"calories": 2500, "protein_g": 200, "carbs_g": 300, "fats_g": 80},
+    "consumed_today": {"calories": 0, "protein_g": 0, "carbs_g": 0, "fats_g": 0},
+    "remaining": {"calories": 2500, "protein_g": 200, "carbs_g": 300, "fats_g": 80}
+})
+EMPTY_STREAK_PAYLOAD = PayloadTemplate({"current_streak": 0, "days_since_last_meal_log": 0, "coins": 0})
+
+def user_data_api_response(user_id: str, record: dict) -> dict:
+    """/api/nutrition-data payload from a USER_DATA record"""
+    return {
+        "user_id": user_id,
+        "targets": record['targets'],
+        "consumed_today": record['consumed_today'],
+        "remaining": record['remaining']
+    }
+
+def fallback_nutrition_api_response(user_id: str) -> dict:
+    """/api/nutrition-data payload used when real data is unavailable: the bot's last push for the user if any, else demo targets"""
+    pushed = USER_DATA.get(user_id)
+    if pushed is not None:
+        return user_data_api_response(user_id, pushed)
+    return DEMO_NUTRITION_PAYLOAD.bind(user_id=user_id)
+
+async def build_nutrition_api_response(user_id: str) -> dict:
+    """JSON nutrition data for a user, with fallback data if the database lookup fails"""
+    try:
+        logger.info("🍎 API request for user: %s", user_id)
+
+        replayed = get_replayed_user_data(user_id)
+        if replayed is not None:
+            # Warm from the journal after a restart; Supabase is refreshing it in the background
+            return user_data_api_response(user_id, replayed)
+
+        # Get real nutrition data using Supabase
+        real_data = await NutritionDataHandler().get_user_nutrition_data(user_id)
+        return format_nutrition_api_response(user_id, real_data)
+
+    except Exception as e:
+        logger.error(f"❌ API Error for user {user_id}: {e}")
+        # Return fallback data if real data fails
+        return fallback_nutrition_api_response(user_id)
+
+def format_historical_api_response(user_id: str, days: int, historical_data: dict) -> dict:
+    """/api/historical-data payload from build_historical_data output"""
+    # Format response for frontend
+    response = {
+        "user_id": user_id,
+        "days": days,
+        "daily_targets": historical_data['daily_targets'],
+        "last_7_days": []
+    }
+
+    # Convert historical data to expected format
+    for day_data in historical_data['historical_data']:
+        day_response = {
+            "date": day_data['date'],
+            "calories": day_data['calories'],
+            "protein": day_data['protein'],
+            "carbs": day_data['carbs'],
+            "fats": day_data['fats'],
+            "caloriesSpent": 0  # Set to 0 as requested
+        }
+        response["last_7_days"].append(day_response)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        # Per-day detail only for DEBUG (e.g. the LOG_DEBUG_USER_ID user); values are formatted by the log writer
+        logger.debug("🔍 Historical API response for user %s: daily_targets=%s", response['user_id'], response['daily_targets'])
+        for i, day in enumerate(response['last_7_days']):
+            logger.debug("🔍 - Day %d: %s", i + 1, day)
+
+    logger.info("📈 Historical API response: %s days of data", len(response['last_7_days']))
+    return response
+
+def fallback_historical_api_response(user_id: str, days: int) -> dict:
+    """/api/historical-data payload with empty days, used when real data is unavailable"""
+    fallback_response = {
+        "user_id": user_id,
+        "days": days,
+        "daily_targets": {"calories": 2500, "protein": 200, "carbs": 300, "fats": 80},
+        "last_7_days": []
+    }
+    # Fill with empty days
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    for i in range(days):
+        target_date = today - datetime.timedelta(days=days - 1 - i)
+        fallback_response["last_7_days"].append({
+            "date": target_date.isoformat(),
+            "calories": 0,
+            "protein": 0,
+            "carbs": 0,
+            "fats": 0,
+            "caloriesSpent": 0
+        })
+    return fallback_response
+
+async def build_historical_api_response(user_id: str, days: int, analytics_options: dict = None) -> dict:
+    """JSON historical nutrition data for analytics, with empty days if the database lookup fails.
+
+    With analytics options (analytics.parse_analytics_options) the response also carries an
+    "analytics" section; enough history is loaded for its windows and rolling averages, but
+    the daily rows still cover `days`.
+    """
+    try:
+        logger.debug("🔍 Historical API request - raw user_id: %s, days: %s, analytics: %s", user_id, days, analytics_options)
+
+        # Get historical nutrition data
+        historical_data = await get_historical_nutrition_data(user_id, days_to_load(days, analytics_options))
+
+        logger.debug("🔍 Raw historical_data from database: %s", historical_data)
+
+        if not analytics_options:
+            return format_historical_api_response(user_id, days, historical_data)
+
+        history_rows = historical_data['historical_data']
+        daily_rows = history_rows[max(0, len(history_rows) - days):] if analytics_options.get('daily', True) else []
+        response = format_historical_api_response(user_id, days, {**historical_data, 'historical_data': daily_rows})
+        with timed('analytics'):
+            response['analytics'] = build_analytics(history_rows, days, analytics_options)
+        return response
+
+    except Exception as e:
+        logger.error(f"❌ Historical API Error for user {user_id}: {e}")
+        # Return fallback empty data if real data fails
+        return fallback_historical_api_response(user_id, days)
+
+def format_streak_api_response(user_id: str, streak_data: dict) -> dict:
+    """/api/streak-data payload"""
+    # Format response with all three values
+    return {
+        "user_id": user_id,
+        "current_streak": streak_data.get('current_streak', 0),
+        "days_since_last_meal_log": streak_data.get('days_since_last_meal_log', 0),
+        "coins": streak_data.get('coins', 0)
+    }
+
+async def build_streak_api_response(user_id: str) -> dict:
+    """JSON streak data for a user, with zeroes if the database lookup fails"""
+    try:
+        logger.info("🔥 Streak data API request for user: %s", user_id)
+
+        # Get both streak metrics from database
+        streak_data = await get_user_streak_data(user_id)
+        logger.debug("📊 Streak data for user %s: %s", user_id, streak_data)
 
+        return format_streak_api_response(user_id, streak_data)
+    except Exception as e:
+        logger.error(f"❌ Streak data API Error for user {user_id}: {e}")
+        # Return fallback of 0 if API fails
+        return EMPTY_STREAK_PAYLOAD.bind(user_id=user_id)
+
+async def build_dashboard_bundle_response(user_id: str, days: int = 7) -> dict:
+    """Nutrition, streak and N-day history for the dashboard in one payload.
+
+    The users row, today's summary and the dense day history are fetched concurrently,
+    and the users row is read once for the nutrition and streak sections. Each section falls back
+    independently, exactly like its standalone endpoint.
+    """
+    logger.info("📦 Dashboard bundle request for user: %s, days: %s", user_id, days)
+    try:
+        user_telegram_id = int(user_id)
+    except ValueError:
+        logger.warning(f"Non-numeric user id {user_id}, returning fallback bundle")
         return {
-            'current_streak': current_streak,
-            'days_since_last_meal_log': days_since_last_meal_log,
-            'coins': coins
+            "user_id": user_id,
+            "nutrition": fallback_nutrition_api_response(user_id),
+            "streak": EMPTY_STREAK_PAYLOAD.bind(user_id=user_id),
+            "history": fallback_historical_api_response(user_id, days)
         }
 
+    replayed = get_replayed_user_data(user_id)
+    if replayed is not None:
+        # Nutrition is warm from the journal after a restart, so today's summary isn't needed
+        user_row, history_rows = await asyncio.gather(
+            timed_call('profile', supabase_client.get_user_row(user_telegram_id)),
+            timed_call('history', supabase_client.get_daily_history(user_telegram_id, days)),
+            return_exceptions=True
+        )
+    else:
+        user_row, today_nutrition, history_rows = await asyncio.gather(
+            timed_call('profile', supabase_client.get_user_row(user_telegram_id)),
+            timed_call('summary', supabase_client.get_today_nutrition_summary(user_telegram_id)),
+            timed_call('history', supabase_client.get_daily_history(user_telegram_id, days)),
+            return_exceptions=True
+        )
+    if isinstance(user_row, Exception):
+        logger.error(f"❌ Failed to get users row for user {user_id}: {user_row}")
+        user_row = None
+
+    try:
+        if replayed is not None:
+            nutrition = user_data_api_response(user_id, replayed)
+        elif not user_row:
+            raise Exception(f"No user profile found for user {user_telegram_id}")
+        else:
+            real_data = NutritionDataHandler.calculate_nutrition_data(user_telegram_id, user_row, today_nutrition)
+            nutrition = format_nutrition_api_response(user_id, real_data)
     except Exception as e:
-        logger.error(f"❌ Error getting streak data for user {user_id}: {e}")
-        return {'current_streak': 0, 'days_since_last_meal_log': 0, 'coins': 0}
+        logger.error(f"❌ Bundle nutrition error for user {user_id}: {e}")
+        nutrition = fallback_nutrition_api_response(user_id)
+
+    try:
+        if isinstance(history_rows, Exception):
+            raise history_rows
+        history = format_historical_api_response(user_id, days, build_historical_data(history_rows))
+    except Exception as e:
+        logger.error(f"❌ Bundle history error for user {user_id}: {e}")
+        history = fallback_historical_api_response(user_id, days)
+
+    streak = format_streak_api_response(user_id, {
+        'current_streak': (user_row or {}).get('current_streak') or 0,
+        'days_since_last_meal_log': (user_row or {}).get('days_since_last_meal_log') or 0,
+        'coins': (user_row or {}).get('coins') or 0
+    })
+
+    return {
+        "user_id": user_id,
+        "nutrition": nutrition,
+        "streak": streak,
+        "history": history
+    }
+
+async def fetch_summary_versions(user_ids: list) -> dict:
+    """Today's summary version per subscribed user id (change detection for /api/events)"""
+    numeric_ids = [int(user_id) for user_id in user_ids if user_id.isdigit()]
+    versions = await supabase_client.get_today_summary_versions(numeric_ids)
+    return {str(user_telegram_id): version for user_telegram_id, version in versions.items()}
+
+async def build_nutrition_event_payload(user_id: str) -> dict:
+    """/api/nutrition-data payload for /api/events (errors propagate instead of falling back).
+
+    Read from Supabase, not the summary replica: the poller has just seen a new summary version
+    there, and the replica (synced less often) could still hold the old numbers.
+    """
+    real_data = await NutritionDataHandler().get_user_nutrition_data(user_id, use_replica=False)
+    return format_nutrition_api_response(user_id, real_data)
+
+# Open /api/events streams per user, fed by bot updates and by backend change detection
+event_hub = EventHub()
+change_poller = ChangePoller(event_hub, fetch_summary_versions, build_nutrition_event_payload, EVENTS_POLL_INTERVAL)
+
+# Bulk-ingested updates waiting to be upserted into daily_nutrition_summary (INGEST_WRITE_BEHIND)
+summary_write_behind = SummaryWriteBehind(supabase_client.upsert_daily_summaries, INGEST_WRITE_QUEUE_SIZE)
 
 class RequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive: every response carries a Content-Length (or closes the connection), and idle connections
+    # give their handler thread back after HTTP_KEEPALIVE_TIMEOUT. Headers and body are separate writes,
+    # so Nagle's algorithm would hold the body back for a delayed ACK on reused connections
+    protocol_version = 'HTTP/1.1'
+    timeout = HTTP_KEEPALIVE_TIMEOUT
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        """Route access logs through logging so pre-forked workers are identifiable"""
+        logger.info("%s - " + format, self.address_string(), *args)
+
+    def send_response(self, code, message=None):
+        """Note the status code for the request metrics"""
+        request_metrics = getattr(self, 'request_metrics', None)
+        if request_metrics is not None:
+            request_metrics.status = code
+        super().send_response(code, message)
+
+    def end_headers(self):
+        """Add the request's Server-Timing and backend query summary (QUERY_DEBUG_HEADER) headers to every response"""
+        timing = current_timing()
+        if timing is not None:
+            self.send_header(SERVER_TIMING_HEADER, timing.header_value())
+        query_log = current_query_log()
+        if QUERY_DEBUG_HEADER and query_log is not None:
+            self.send_header(QUERY_LOG_HEADER, query_log.header_value())
+        super().end_headers()
+
     def do_HEAD(self):
         """Handle HEAD requests (for health checks)"""
         self.do_GET()
@@ -274,46 +812,61 @@ class RequestHandler(BaseHTTPRequestHandler):
         path = parsed_url.path
         query_params = parse_qs(parsed_url.query)
 
-        logger.info(f"📡 Request: {path}")
-
-        try:
-            if path == '/' or path == '/nutrition-dashboard':
-                self.handle_nutrition_dashboard(query_params)
-            elif path == '/test':
-                self.handle_test_dashboard()
-            elif path == '/health':
-                self.handle_health_check()
-            elif path == '/api/nutrition-data':
-                self.handle_api_nutrition_data(query_params)
-            elif path == '/api/historical-data':
-                self.handle_api_historical_data(query_params)
-            elif path == '/api/streak-data':
-                self.handle_api_streak_data(query_params)
-            elif path.startswith('/images/'):
-                self.handle_static_file(path)
-            else:
-                self.send_error(404, "Not Found")
+        with track_request(self.command, path) as self.request_metrics, \
+                request_log_context(path, query_params.get('user_id', [None])[0]), \
+                track_queries(f"{self.command} {path}"), track_timing(f"{self.command} {path}"):
+            logger.info("📡 Request: %s", path)
 
-        except Exception as e:
-            logger.error(f"❌ Error handling request: {e}")
-            self.send_error(500, f"Internal Server Error: {str(e)}")
+            try:
+                if path == '/' or path == '/nutrition-dashboard':
+                    self.handle_nutrition_dashboard(query_params)
+                elif path == '/test':
+                    self.handle_test_dashboard()
+                elif path == '/health':
+                    self.handle_health_check()
+                elif path == '/metrics' and METRICS_ENABLED:
+                    self.handle_metrics()
+                elif path == '/api/nutrition-data':
+                    self.handle_api_nutrition_data(query_params)
+                elif path == '/api/historical-data':
+                    self.handle_api_historical_data(query_params)
+                elif path == '/api/streak-data':
+                    self.handle_api_streak_data(query_params)
+                elif path == '/api/dashboard':
+                    self.handle_api_dashboard(query_params)
+                elif path == '/api/events':
+                    self.handle_api_events(query_params)
+                elif path.startswith('/images/'):
+                    self.handle_static_file(path)
+                else:
+                    self.send_error(404, "Not Found")
+
+            except Exception as e:
+                logger.error(f"❌ Error handling request: {e}")
+                self.close_connection = True
+                self.send_error(500, f"Internal Server Error: {str(e)}")
 
     def do_POST(self):
         """Handle POST requests"""
         parsed_url = urlparse(self.path)
         path = parsed_url.path
 
-        logger.info(f"📡 POST Request: {path}")
+        with track_request('POST', path) as self.request_metrics, request_log_context(path), \
+                track_queries(f"POST {path}"), track_timing(f"POST {path}"):
+            logger.info("📡 POST Request: %s", path)
 
-        try:
-            if path == '/api/update-user-data':
-                self.handle_update_user_data()
-            else:
-                self.send_error(404, "Not Found")
-
-        except Exception as e:
-            logger.error(f"❌ Error handling POST request: {e}")
-            self.send_error(500, f"Internal Server Error: {str(e)}")
+            try:
+                if path == '/api/update-user-data':
+                    self.handle_update_user_data()
+                elif path == '/api/bulk-update-user-data':
+                    self.handle_bulk_update_user_data()
+                else:
+                    self.send_error(404, "Not Found")
+
+            except Exception as e:
+                logger.error(f"❌ Error handling POST request: {e}")
+                self.close_connection = True
+                self.send_error(500, f"Internal Server Error: {str(e)}")
 
     def handle_update_user_data(self):
         """Handle user data update requests"""
@@ -323,31 +876,62 @@ class RequestHandler(BaseHTTPRequestHandler):
             post_data = self.rfile.read(content_length)
             data = json.loads(post_data.decode('utf-8'))
 
-            user_id = str(data.get('user_id', 'user_123'))
-
-            # Update user data
-            update_user_nutrition_data(
-                user_id=user_id,
-                targets=data.get('targets'),
-                consumed_today=data.get('consumed_today'),
-                meal_count=data.get('meal_count', 0)
-            )
-
-            # Send success response
-            response = {
-                'status': 'success',
-                'message': f'Updated data for user {user_id}'
-            }
-
-            self.send_json_response(response)
+            self.send_json_response(apply_user_data_update(data))
 
         except Exception as e:
             logger.error(f"❌ Error updating user data: {e}")
+            # The body may not have been read, so the connection can't be reused
+            self.close_connection = True
             self.send_json_response({
                 'status': 'error',
                 'message': str(e)
             }, status_code=400)
 
+    def handle_bulk_update_user_data(self):
+        """Stream NDJSON / JSON array bot updates into the store in coalesced batches"""
+        ingestion = BulkIngestion(INGEST_COALESCE_WINDOW, INGEST_BATCH_SIZE)
+        try:
+            for chunk in self.iter_request_body():
+                for batch in ingestion.feed(chunk):
+                    # Blocks while the write-behind queue is full, which slows the sender down
+                    ingestion.count_applied(run_async(ingest_user_data_batch(batch)))
+            for batch in ingestion.finish():
+                ingestion.count_applied(run_async(ingest_user_data_batch(batch)))
+        except ValueError as e:
+            logger.error(f"❌ Error in bulk user data update: {e}")
+            self.close_connection = True
+            self.send_json_response({
+                **ingestion.result(),
+                'status': 'error',
+                'message': str(e)
+            }, status_code=400)
+            return
+
+        result = ingestion.result()
+        logger.info("📥 Bulk update: %s received, %s applied, %s invalid", result['received'], result['applied'], result['invalid'])
+        self.send_json_response(result)
+
+    def iter_request_body(self, chunk_size=64 * 1024):
+        """Request body chunks as they arrive (Content-Length or chunked transfer encoding)"""
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    # Skip trailers up to the blank line that ends the body
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                yield self.rfile.read(size)
+                self.rfile.readline()
+
+        remaining = int(self.headers.get('Content-Length') or 0)
+        while remaining > 0:
+            chunk = self.rfile.read1(min(remaining, chunk_size))
+            if not chunk:
+                raise ValueError("Request body ended early")
+            remaining -= len(chunk)
+            yield chunk
+
     def handle_nutrition_dashboard(self, query_params):
         """Serve the nutrition dashboard"""
         user_id = query_params.get('user_id', [None])[0]
@@ -357,28 +941,14 @@ class RequestHandler(BaseHTTPRequestHandler):
             return
 
         try:
-            logger.info(f"📱 Mini app accessed by user {user_id}")
-
-            # Get user data from REAL database
-            nutrition_handler = NutritionDataHandler()
-            
-            # Run async database query
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                user_data = loop.run_until_complete(nutrition_handler.get_user_nutrition_data(user_id))
-            finally:
-                loop.close()
-
-            # Read HTML template
-            html_content = self.read_html_file()
+            # Only gzip is precompressed, so HTML never uses brotli
+            encoding = negotiate_encoding(self.headers.get('Accept-Encoding'), allow_brotli=False)
+            html_content = run_async(build_dashboard_html(user_id, gzip=encoding == 'gzip'))
             if not html_content:
                 self.send_error(500, "HTML template not found")
                 return
 
-            # Inject data
-            html_content = self.inject_user_data(html_content, user_data)
-            self.send_html_response(html_content)
+            self.send_html_response(html_content, encoding)
 
         except Exception as e:
             logger.error(f"❌ Error serving dashboard: {e}")
@@ -387,28 +957,13 @@ class RequestHandler(BaseHTTPRequestHandler):
     def handle_test_dashboard(self):
         """Serve test dashboard without user data"""
         try:
-            html_content = self.read_html_file()
+            encoding = negotiate_encoding(self.headers.get('Accept-Encoding'), allow_brotli=False)
+            html_content = build_test_dashboard_html(gzip=encoding == 'gzip')
             if not html_content:
                 self.send_error(500, "HTML template not found")
                 return
 
-            # Add basic Telegram WebApp integration
-            telegram_script = '''
-            <script src="https://telegram.org/js/telegram-web-app.js"></script>
-            <script>
-                console.log('Test Mini app loaded');
-                const tg = window.Telegram.WebApp;
-                tg.expand();
-                tg.ready();
-                console.log('Telegram WebApp test ready');
-                if (tg.MainButton) {
-                    tg.MainButton.setText('Test Dashboard');
-                }
-            </script>
-            '''
-
-            html_content = html_content.replace('</head>', f'{telegram_script}</head>')
-            self.send_html_response(html_content)
+            self.send_html_response(html_content, encoding)
 
         except Exception as e:
             logger.error(f"❌ Error serving test dashboard: {e}")
@@ -416,344 +971,224 @@ class RequestHandler(BaseHTTPRequestHandler):
 
     def handle_health_check(self):
         """Health check endpoint"""
-        response = {
-            "status": "healthy",
-            "service": "nutrition-mini-app",
-            "database": "mock",
-            "timestamp": str(time.time())
-        }
-        self.send_json_response(response)
+        self.send_json_response(build_health_response())
+
+    def handle_metrics(self):
+        """Prometheus metrics in the text exposition format"""
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', METRICS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.write_body(body)
 
     def handle_api_nutrition_data(self, query_params):
         """API endpoint to return JSON nutrition data for a user"""
-        try:
-            # Get user_id from query parameters
-            user_id = query_params.get('user_id', ['user_123'])[0]
-            logger.info(f"🍎 API request for user: {user_id}")
-
-            # Get real nutrition data using Supabase
-            real_data = asyncio.run(self.get_real_user_nutrition_data(user_id))
-
-            # Calculate consumed amounts (opposite of remaining)
-            calories_consumed = real_data['calories']['total'] - real_data['calories']['value']
-            protein_consumed = real_data['protein']['total'] - real_data['protein']['value']
-            carbs_consumed = real_data['carbs']['total'] - real_data['carbs']['value']
-            fat_consumed = real_data['fats']['total'] - real_data['fats']['value']
-
-            # Format response to match expected structure
-            response = {
-                "user_id": user_id,
-                "targets": {
-                    "calories": real_data['calories']['total'],
-                    "protein_g": real_data['protein']['total'],
-                    "carbs_g": real_data['carbs']['total'],
-                    "fats_g": real_data['fats']['total']
-                },
-                "consumed_today": {
-                    "calories": calories_consumed,
-                    "protein_g": protein_consumed,
-                    "carbs_g": carbs_consumed,
-                    "fats_g": fat_consumed
-                },
-                "remaining": {
-                    "calories": real_data['calories']['value'],
-                    "protein_g": real_data['protein']['value'],
-                    "carbs_g": real_data['carbs']['value'],
-                    "fats_g": real_data['fats']['value']
-                }
-            }
-
-            logger.info(f"📊 API response: Consumed {calories_consumed} calories, {protein_consumed}g protein")
-            self.send_json_response(response)
-
-        except Exception as e:
-            logger.error(f"❌ API Error for user {user_id}: {e}")
-            # Return fallback data if real data fails
-            fallback_response = {
-                "user_id": user_id,
-                "targets": {"calories": 2500, "protein_g": 200, "carbs_g": 300, "fats_g": 80},
-                "consumed_today": {"calories": 0, "protein_g": 0, "carbs_g": 0, "fats_g": 0},
-                "remaining": {"calories": 2500, "protein_g": 200, "carbs_g": 300, "fats_g": 80}
-            }
-            self.send_json_response(fallback_response)
+        user_id = query_params.get('user_id', ['user_123'])[0]
+        self.send_json_response(run_async(build_nutrition_api_response(user_id)))
 
     def handle_api_historical_data(self, query_params):
         """API endpoint to return historical nutrition data for analytics"""
+        user_id = query_params.get('user_id', ['user_123'])[0]
         try:
-            # Get user_id and days from query parameters
-            user_id = query_params.get('user_id', ['user_123'])[0]
-            days = int(query_params.get('days', ['7'])[0])
-            logger.info(f"🔍 DEBUG: Historical API request - Raw user_id: {user_id}, days: {days}")
-
-            # DEBUG: Log the exact user ID we're using
-            logger.info(f"🔍 DEBUG: About to call get_historical_nutrition_data with user_id={user_id}")
-
-            # Get historical nutrition data
-            historical_data = asyncio.run(get_historical_nutrition_data(user_id, days))
-
-            # DEBUG: Log what we got back from the database
-            logger.info(f"🔍 DEBUG: Raw historical_data from database: {historical_data}")
-
-            # Format response for frontend
-            response = {
-                "user_id": user_id,
-                "days": days,
-                "daily_targets": historical_data['daily_targets'],
-                "last_7_days": []
-            }
-
-            # Convert historical data to expected format
-            for i, day_data in enumerate(historical_data['historical_data']):
-                day_response = {
-                    "date": day_data['date'],
-                    "calories": day_data['calories'],
-                    "protein": day_data['protein'],
-                    "carbs": day_data['carbs'],
-                    "fats": day_data['fats'],
-                    "caloriesSpent": 0  # Set to 0 as requested
-                }
-                response["last_7_days"].append(day_response)
+            days = parse_days(query_params.get('days', ['7'])[0])
+            analytics_options = parse_analytics_options({name: values[0] for name, values in query_params.items()})
+        except ValueError as e:
+            self.send_json_response({'status': 'error', 'message': str(e)}, status_code=400)
+            return
+        self.send_json_response(run_async(build_historical_api_response(user_id, days, analytics_options)))
 
-                # DEBUG: Log each day's data
-                logger.info(f"🔍 DEBUG: Day {i+1} ({day_data['date']}): calories={day_data['calories']}, protein={day_data['protein']}, carbs={day_data['carbs']}, fats={day_data['fats']}")
+    def handle_api_streak_data(self, query_params):
+        """API endpoint to return user's current streak and days since last meal log"""
+        user_id = query_params.get('user_id', ['user_123'])[0]
+        self.send_json_response(run_async(build_streak_api_response(user_id)))
 
-            # DEBUG: Log the final response being sent to frontend
-            logger.info(f"🔍 DEBUG: Final API response being sent to frontend:")
-            logger.info(f"🔍 DEBUG: - user_id: {response['user_id']}")
-            logger.info(f"🔍 DEBUG: - daily_targets: {response['daily_targets']}")
-            logger.info(f"🔍 DEBUG: - last_7_days count: {len(response['last_7_days'])}")
-            for i, day in enumerate(response['last_7_days']):
-                logger.info(f"🔍 DEBUG: - Day {i+1}: {day}")
+    def handle_api_dashboard(self, query_params):
+        """API endpoint to return nutrition, streak and history in one response"""
+        user_id = query_params.get('user_id', ['user_123'])[0]
+        try:
+            days = parse_days(query_params.get('days', ['7'])[0])
+        except ValueError as e:
+            self.send_json_response({'status': 'error', 'message': str(e)}, status_code=400)
+            return
+        self.send_json_response(run_async(build_dashboard_bundle_response(user_id, days)))
 
-            logger.info(f"📈 Historical API response: {len(response['last_7_days'])} days of data")
-            self.send_json_response(response)
+    def handle_api_events(self, query_params):
+        """Server-sent events stream of nutrition changes for one user"""
+        user_id = query_params.get('user_id', [None])[0]
+        if not user_id:
+            self.send_error(400, "User ID required")
+            return
 
-        except Exception as e:
-            logger.error(f"❌ Historical API Error for user {user_id}: {e}")
-            # Return fallback empty data if real data fails
-            fallback_response = {
-                "user_id": user_id,
-                "days": days,
-                "daily_targets": {"calories": 2500, "protein": 200, "carbs": 300, "fats": 80},
-                "last_7_days": []
-            }
-            # Fill with empty days
-            today = datetime.datetime.now(datetime.timezone.utc).date()
-            for i in range(days):
-                target_date = today - datetime.timedelta(days=days - 1 - i)
-                fallback_response["last_7_days"].append({
-                    "date": target_date.isoformat(),
-                    "calories": 0,
-                    "protein": 0,
-                    "carbs": 0,
-                    "fats": 0,
-                    "caloriesSpent": 0
-                })
-            self.send_json_response(fallback_response)
+        change_poller.start(get_event_loop())
+        # The stream has no length and ends with the connection
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.send_header('Connection', 'close')
+        self.end_headers()
 
-    def handle_api_streak_data(self, query_params):
-        """API endpoint to return user's current streak and days since last meal log"""
+        subscription = event_hub.subscribe(user_id)
         try:
-            # Get user_id from query parameters
-            user_id = query_params.get('user_id', ['user_123'])[0]
-            logger.info(f"🔥 Streak data API request for user: {user_id}")
-
-            # Get both streak metrics from database
-            streak_data = asyncio.run(get_user_streak_data(user_id))
-            logger.info(f"📊 Streak data for user {user_id}: {streak_data}")
-
-            # Format response with all three values
-            response = {
-                "user_id": user_id,
-                "current_streak": streak_data.get('current_streak', 0),
-                "days_since_last_meal_log": streak_data.get('days_since_last_meal_log', 0),
-                "coins": streak_data.get('coins', 0)
-            }
-
-            self.send_json_response(response)
-        except Exception as e:
-            logger.error(f"❌ Streak data API Error for user {user_id}: {e}")
-            # Return fallback of 0 if API fails
-            fallback_response = {
-                "user_id": user_id,
-                "current_streak": 0,
-                "days_since_last_meal_log": 0,
-                "coins": 0
-            }
-            self.send_json_response(fallback_response)
+            self.wfile.write(b"retry: 5000\n\n")
+            self.wfile.flush()
+            while True:
+                if not subscription.wait(EVENTS_HEARTBEAT_INTERVAL):
+                    self.wfile.write(SSE_HEARTBEAT)
+                    self.wfile.flush()
+                    continue
+                message = subscription.take()
+                if message:
+                    self.wfile.write(format_sse(*message))
+                    self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            event_hub.unsubscribe(subscription)
 
     def handle_static_file(self, path):
-        """Serve static files like images"""
+        """Serve static files like images (conditional, Range and zero-copy via os.sendfile)"""
         try:
-            # Remove leading slash and construct file path
-            file_path = path.lstrip('/')
-
-            # Basic security check
-            if '..' in file_path:
+            try:
+                info, extra_headers = resolve_static_request(path, self.headers.get('Accept', ''))
+            except PermissionError:
                 self.send_error(403, "Forbidden")
                 return
-
-            # Check if file exists
-            if not os.path.exists(file_path):
+            except FileNotFoundError:
                 self.send_error(404, "File not found")
                 return
 
-            # Determine content type
-            if file_path.endswith('.png'):
-                content_type = 'image/png'
-            elif file_path.endswith('.jpg') or file_path.endswith('.jpeg'):
-                content_type = 'image/jpeg'
-            elif file_path.endswith('.gif'):
-                content_type = 'image/gif'
-            else:
-                content_type = 'application/octet-stream'
-
-            # Read and serve file
-            with open(file_path, 'rb') as f:
-                content = f.read()
-
-            self.send_response(200)
-            self.send_header('Content-Type', content_type)
-            self.send_header('Content-Length', len(content))
+            static_response = build_static_response(info, self.headers)
+            static_response.headers.update(extra_headers)
+            self.send_response(static_response.status)
+            for name, value in static_response.headers.items():
+                self.send_header(name, value)
             self.end_headers()
-            self.wfile.write(content)
 
-            logger.info(f"✅ Served static file: {file_path}")
+            if self.command != 'HEAD' and static_response.length:
+                self.send_file_range(info.path, static_response.offset, static_response.length)
 
+            logger.debug("✅ Served static file: %s (%s)", info.path, static_response.status)
+
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("Client closed connection while serving %s", path)
         except Exception as e:
             logger.error(f"❌ Error serving static file {path}: {e}")
             self.send_error(500, f"Error serving file: {str(e)}")
 
-    def read_html_file(self):
-        """Read the HTML template file"""
-        try:
-            with open('nutritions_files.html', 'r', encoding='utf-8') as f:
-                return f.read()
-        except FileNotFoundError:
-            logger.error("❌ nutritions_files.html not found")
-            return None
-
-    def inject_user_data(self, html_content, user_data):
-        """Inject user data into HTML template"""
-        # Calculate progress based on consumed amounts (consumed / goal)
-        # user_data['calories']['value'] is remaining, so consumed = total - remaining
-        calories_consumed = user_data['calories']['total'] - user_data['calories']['value']
-        protein_consumed = user_data['protein']['total'] - user_data['protein']['value']
-        fat_consumed = user_data['fats']['total'] - user_data['fats']['value']
-        carbs_consumed = user_data['carbs']['total'] - user_data['carbs']['value']
-
-        calories_progress = calories_consumed / user_data['calories']['total']
-        protein_progress = protein_consumed / user_data['protein']['total']
-        fat_progress = fat_consumed / user_data['fats']['total']
-        carbs_progress = carbs_consumed / user_data['carbs']['total']
-
-        # Remaining amounts are already in user_data['calories']['value']
-        calories_remaining = user_data['calories']['value']
-        protein_remaining = user_data['protein']['value']
-        fat_remaining = user_data['fats']['value']
-        carbs_remaining = user_data['carbs']['value']
-
-        # Update display values to show remaining amounts
-        html_content = html_content.replace('id="caloriesValue">2199</div>', f'id="caloriesValue">{calories_remaining}</div>')
-        html_content = html_content.replace('id="proteinValue">161</div>', f'id="proteinValue">{protein_remaining}g</div>')
-        html_content = html_content.replace('id="carbsValue">251</div>', f'id="carbsValue">{carbs_remaining}g</div>')
-        html_content = html_content.replace('id="fatsValue">61</div>', f'id="fatsValue">{fat_remaining}g</div>')
-
-        # Update subtitles to show "Kcal Left" and "Left"
-        html_content = html_content.replace('calories left</div>', 'Kcal Осталось</div>')
-        html_content = html_content.replace('protein left</div>', 'Белка Ост.</div>')
-        html_content = html_content.replace('carbs left</div>', 'Углеводов Ост.</div>')
-        html_content = html_content.replace('fats left</div>', 'Жиров Ост.</div>')
-
-        # Update user profile data in JavaScript
-        html_content = html_content.replace(
-            '''this.userProfile = {
-                    goals: {
-                        calories: 2500,
-                        protein: 200, // grams
-                        carbs: 300,   // grams
-                        fats: 80      // grams
-                    },
-                    consumed: {
-                        calories: 301,  // consumed today
-                        protein: 39,    // grams consumed
-                        carbs: 49,      // grams consumed
-                        fats: 19        // grams consumed
-                    }
-                };''',
-            f'''this.userProfile = {{
-                    goals: {{
-                        calories: {user_data['calories']['total']},
-                        protein: {user_data['protein']['total']}, // grams
-                        carbs: {user_data['carbs']['total']},   // grams
-                        fats: {user_data['fats']['total']}      // grams
-                    }},
-                    consumed: {{
-                        calories: {calories_consumed},  // consumed today
-                        protein: {protein_consumed},    // grams consumed
-                        carbs: {carbs_consumed},      // grams consumed
-                        fats: {fat_consumed}        // grams consumed
-                    }}
-                }};'''
-        )
-
-        # Add Telegram WebApp integration
-        telegram_script = f'''
-        <script src="https://telegram.org/js/telegram-web-app.js"></script>
-        <script>
-            console.log('Mini app loaded with user data');
-
-            // Telegram WebApp integration
-            const tg = window.Telegram.WebApp;
-            tg.expand();
-            tg.ready();
-            console.log('Telegram WebApp ready');
-
-            if (tg.MainButton) {{
-                tg.MainButton.setText('Loading...');
-                setTimeout(() => {{
-                    tg.MainButton.setText('Nutrition Dashboard');
-                    console.log('Nutrition Dashboard ready');
-                }}, 1000);
-            }}
-        </script>
-        '''
-
-        html_content = html_content.replace('</head>', f'{telegram_script}</head>')
-        return html_content
-
-    def send_html_response(self, content):
-        """Send HTML response"""
+    def send_file_range(self, file_path, offset, length):
+        """Write `length` bytes of a file starting at `offset` to the socket without copying them through Python"""
+        with open(file_path, 'rb') as f:
+            if hasattr(os, 'sendfile'):
+                socket_fd = self.connection.fileno()
+                while length > 0:
+                    sent = os.sendfile(socket_fd, f.fileno(), offset, length)
+                    if sent == 0:
+                        break
+                    offset += sent
+                    length -= sent
+            else:
+                f.seek(offset)
+                while length > 0:
+                    chunk = f.read(min(length, 64 * 1024))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    length -= len(chunk)
+
+    def send_html_response(self, content, encoding=None):
+        """Send HTML response (str or already encoded UTF-8 bytes, compressed with `encoding` if given)"""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
         self.send_response(200)
         self.send_header('Content-type', 'text/html; charset=utf-8')
         self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
         self.send_header('Pragma', 'no-cache')
         self.send_header('Expires', '0')
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(content)))
         self.end_headers()
-        self.wfile.write(content.encode('utf-8'))
-
-    def send_json_response(self, data):
-        """Send JSON response"""
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
+        self.write_body(content)
+
+    def send_json_response(self, data, status_code=200):
+        """Send a JSON (or, if the client asks, MessagePack) response, compressed when it is large enough and accepted"""
+        with timed('serialize'):
+            body, content_type = encode_payload(data, self.headers.get('Accept'))
+            body, encoding = encode_body(body, self.headers.get('Accept-Encoding'))
+        self.send_response(status_code)
+        self.send_header('Content-type', content_type)
+        self.send_header('Vary', ENCODED_VARY)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
+        self.write_body(body)
 
-def run_server(port=8080):
-    """Run the HTTP server"""
+    def write_body(self, body: bytes):
+        """Write a response body, except for HEAD requests (the connection may carry another response next)"""
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+def create_http_server(port=8080, sock=None):
+    """Create the stdlib HTTP server (a thread per connection, so /api/events streams don't block), optionally on an already bound listening socket"""
     server_address = ('0.0.0.0', port)
-    httpd = HTTPServer(server_address, RequestHandler)
+    if sock is None:
+        return ThreadingHTTPServer(server_address, RequestHandler)
+
+    httpd = ThreadingHTTPServer(server_address, RequestHandler, bind_and_activate=False)
+    httpd.socket.close()
+    httpd.socket = sock
+    httpd.server_address = sock.getsockname()
+    return httpd
+
+def run_server(port=8080, workers=1):
+    """Run the HTTP server, pre-forking `workers` processes when more than one is requested"""
     logger.info(f"🚀 Starting mini app server on port {port}")
     logger.info("📱 Available endpoints:")
     logger.info("   / - Main dashboard")
     logger.info("   /nutrition-dashboard - Nutrition dashboard")
     logger.info("   /test - Test dashboard")
     logger.info("   /health - Health check")
+    logger.info("   /metrics - Prometheus metrics")
     logger.info("   /api/nutrition-data - JSON API for nutrition data")
     logger.info("   /api/historical-data - JSON API for historical nutrition data")
     logger.info("   /api/streak-data - JSON API for streak data")
-    httpd.serve_forever()
+    logger.info("   /api/dashboard - JSON API for nutrition, streak and history in one response")
+    logger.info("   /api/events - Server-sent events with nutrition changes")
+    logger.info("   /api/bulk-update-user-data - Bulk NDJSON/JSON array bot updates (POST)")
+
+    if workers > 1:
+        from prefork import serve_prefork
+        serve_prefork(lambda sock: serve_http(create_http_server(port, sock)), port, workers)
+    else:
+        serve_http(create_http_server(port))
+
+def serve_http(httpd):
+    """Serve until interrupted, then flush pending writes and close the pooled Supabase connections"""
+    try:
+        if summary_replica is not None:
+            summary_replica.start(get_event_loop())
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        if _event_loop is not None:
+            run_async(summary_write_behind.drain())
+            run_async(close_shared_client())
+        USER_DATA.close()
+
+def parse_server_args():
+    """Parse --port/--workers, defaulting to the PORT and WEB_CONCURRENCY env vars"""
+    import argparse
+    parser = argparse.ArgumentParser(description='Nutrition mini app server')
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 8080)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', 1)),
+                        help='number of pre-forked worker processes (env WEB_CONCURRENCY)')
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    port = int(os.getenv('PORT', 8080))
-    run_server(port)
\ No newline at end of file
+    args = parse_server_args()
+    run_server(args.port, args.workers)
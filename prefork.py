@@ -0,0 +1,103 @@
+"""
+Pre-fork worker supervisor for the mini app servers
+The master binds the listening socket once and forks N workers that all accept on it.
+Crashed workers are restarted, and every log line carries the worker number and pid.
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Workers that die faster than this after starting are restarted with a delay
+MIN_WORKER_UPTIME = 1.0
+RESTART_DELAY = 1.0
+
+def create_listen_socket(port, host='0.0.0.0', backlog=1024):
+    """Bind the shared listening socket in the master before forking"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    # Non-blocking so a worker that loses the accept race goes back to polling
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+def configure_worker_logging(worker_id):
+    """Prefix every log line of this process with the worker number and pid"""
+    formatter = logging.Formatter(f'%(levelname)s:[worker {worker_id} pid %(process)d]:%(name)s:%(message)s')
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(formatter)
+
+def _spawn_worker(worker_id, serve, sock):
+    """Fork one worker; returns the child pid in the master"""
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # Child: restore default signal handling and serve until killed
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    configure_worker_logging(worker_id)
+    exit_code = 0
+    try:
+        logger.info(f"👷 Worker {worker_id} started")
+        serve(sock)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.exception(f"❌ Worker {worker_id} crashed: {e}")
+        exit_code = 1
+    finally:
+        logging.shutdown()
+        os._exit(exit_code)
+
+def serve_prefork(serve, port, workers):
+    """Run serve(sock) in `workers` forked processes sharing one socket, restarting any that exit"""
+    sock = create_listen_socket(port)
+    logger.info(f"🚀 Pre-forking {workers} workers on port {port} (master pid {os.getpid()})")
+
+    children = {}  # pid -> (worker_id, started_at)
+    shutting_down = False
+
+    def handle_shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    signal.signal(signal.SIGINT, handle_shutdown)
+
+    for worker_id in range(1, workers + 1):
+        children[_spawn_worker(worker_id, serve, sock)] = (worker_id, time.monotonic())
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        worker_id, started_at = children.pop(pid, (None, None))
+        if worker_id is None or shutting_down:
+            continue
+
+        logger.warning(f"⚠️ Worker {worker_id} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        if time.monotonic() - started_at < MIN_WORKER_UPTIME:
+            time.sleep(RESTART_DELAY)
+        if not shutting_down:
+            children[_spawn_worker(worker_id, serve, sock)] = (worker_id, time.monotonic())
+
+    sock.close()
+    logger.info("🛑 All workers stopped")
+    sys.exit(0)
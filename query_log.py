@@ -0,0 +1,116 @@
+"""
+Per-request accounting of backend (Supabase) queries
+execute_query() records every round trip - table or RPC, filters, rows returned, duration -
+in the QueryLog of the request being served, which it finds through a contextvar. A query
+identical to one already made during the same request is flagged as a repeat (the N+1 /
+re-read signal). The servers open a log per request with track_queries(), which logs a
+one-line summary when the request ends; the summary can also be sent back in a header.
+"""
+
+import json
+import logging
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from config import QUERY_LOG_ENABLED, QUERY_WARN_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Debug response header carrying QueryLog.header_value()
+HEADER_NAME = 'X-Backend-Queries'
+
+_current_log = contextvars.ContextVar('query_log', default=None)
+
+
+def query_target(query) -> tuple:
+    """(table or "rpc/<function>", HTTP method) of a PostgREST query builder"""
+    method = getattr(query, 'http_method', '?')
+    method = getattr(method, 'value', method)   # RequestMethod enum in newer postgrest releases
+    return getattr(query, 'path', '?').lstrip('/'), method
+
+
+class QueryLog:
+    """Backend queries made while serving one request"""
+
+    def __init__(self, request: str):
+        self.request = request
+        self.queries = []          # dicts: table, method, filters, rows, ms, error, repeat
+        self._seen = Counter()     # query identity -> times made
+
+    def record(self, query, data, seconds: float, error: Exception = None):
+        """Add one executed PostgREST query builder (and its result rows) to the log"""
+        table, method = query_target(query)
+        path = getattr(query, 'path', '?')
+        params = getattr(query, 'params', None)
+        filters = '&'.join(f'{key}={value}' for key, value in params.multi_items() if key != 'select') if params is not None else ''
+        body = getattr(query, 'json', None) if path.startswith('/rpc/') else None
+        if body:
+            filters = json.dumps(body, sort_keys=True, default=str)
+        identity = (method, path, filters)
+        self._seen[identity] += 1
+        self.queries.append({
+            'table': table,
+            'method': method,
+            'filters': filters,
+            'rows': len(data) if isinstance(data, list) else (None if data is None else 1),
+            'ms': round(seconds * 1000, 2),
+            'error': type(error).__name__ if error is not None else None,
+            'repeat': self._seen[identity] > 1
+        })
+
+    @property
+    def db_ms(self) -> float:
+        return round(sum(query['ms'] for query in self.queries), 2)
+
+    @property
+    def repeats(self) -> int:
+        return sum(1 for query in self.queries if query['repeat'])
+
+    def header_value(self) -> str:
+        return f"count={len(self.queries)}, db_ms={self.db_ms}, repeated={self.repeats}"
+
+    def report(self):
+        """Log the request's query count and DB time, and warn about repeats and long query chains"""
+        if not self.queries:
+            return
+        tables = Counter(query['table'] for query in self.queries)
+        logger.info("🔎 %s: %d backend queries, %sms (%s)", self.request, len(self.queries), self.db_ms,
+                    ', '.join(f'{table} x{count}' for table, count in tables.items()),
+                    extra={'fields': {'queries': len(self.queries), 'db_ms': self.db_ms, 'repeated': self.repeats}})
+        if logger.isEnabledFor(logging.DEBUG):
+            for query in self.queries:
+                logger.debug("🔎 %s: %s %s %s -> %s rows in %sms%s", self.request, query['method'], query['table'],
+                             query['filters'], query['rows'], query['ms'], f" (error: {query['error']})" if query['error'] else '')
+        for (method, path, filters), count in self._seen.items():
+            if count > 1:
+                logger.warning(f"⚠️ {self.request} made the same backend query {count} times: {method} {path.lstrip('/')} {filters}")
+        if len(self.queries) > QUERY_WARN_THRESHOLD:
+            logger.warning(f"⚠️ {self.request} made {len(self.queries)} backend queries (more than {QUERY_WARN_THRESHOLD})")
+
+
+def current_query_log():
+    """The QueryLog of the request being served, or None"""
+    return _current_log.get()
+
+
+def record_query(query, data, seconds: float, error: Exception = None):
+    """Record a query in the current request's log; a no-op outside a tracked request"""
+    log = _current_log.get()
+    if log is not None:
+        log.record(query, data, seconds, error)
+
+
+@contextmanager
+def track_queries(request: str):
+    """Open a QueryLog for the request (None when QUERY_LOG_ENABLED is off) and report it on exit"""
+    if not QUERY_LOG_ENABLED:
+        yield None
+        return
+    log = QueryLog(request)
+    token = _current_log.set(log)
+    try:
+        yield log
+    finally:
+        _current_log.reset(token)
+        log.report()
+
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator for load and query-plan testing
+Generates users, nutrition_logs and daily_nutrition_summary rows at production scale
+(e.g. 100k users x 365 days) from configurable distributions: per-user targets, how often
+each user logs, meals per day and how closely intake tracks the target. Summaries are
+aggregated from the generated logs, so the two tables agree. Users are generated and
+written in batches, so memory stays flat however large the dataset is.
+
+Targets:
+  postgres  COPY into a local Postgres (needs psycopg or psycopg2); users are COPYed into a
+            staging table and upserted, logs and summaries are COPYed directly
+  sqlite    the embedded summary replica file (summary_replica.py schema) plus nutrition_logs
+  csv       users.csv, nutrition_logs.csv, daily_nutrition_summary.csv for psql \\copy
+
+Usage: python seed_data.py --users 100000 --days 365 --target postgres --dsn postgresql://localhost/wellness
+       python seed_data.py --users 1000 --days 90 --target sqlite --path data/seed.sqlite3
+Re-running with the same --seed and user id range replaces the seeded users' data.
+"""
+
+import os
+import csv
+import sys
+import math
+import time
+import random
+import sqlite3
+import argparse
+import datetime
+import logging
+from summary_replica import SCHEMA as REPLICA_SCHEMA, TARGET_COLUMNS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+USER_COLUMNS = (
+    'user_id', 'username', 'calorie_target', 'protein_target_g', 'fat_target_g', 'carbs_target_g',
+    'current_streak', 'days_since_last_meal_log', 'coins'
+)
+LOG_COLUMNS = ('user_telegram_id', 'logged_at', 'total_calories', 'protein_g', 'carbs_g', 'fat_g')
+SUMMARY_COLUMNS = (
+    'user_telegram_id', 'date', 'total_calories', 'total_protein_g', 'total_carbs_g', 'total_fat_g',
+    'meals_logged_count', 'calorie_target', 'protein_target_g', 'carbs_target_g', 'fat_target_g', 'updated_at'
+)
+# Synthetic Telegram ids start here, well above the ids of real test accounts
+DEFAULT_USER_ID_START = 9_000_000_000
+# Meals are logged between these hours (UTC)
+FIRST_MEAL_HOUR, LAST_MEAL_HOUR = 7, 23
+MAX_MEALS_PER_DAY = 8
+
+# Minimal stand-ins for the bot's users and nutrition_logs tables, for --create-schema on an empty database
+POSTGRES_BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username TEXT,
+    calorie_target DECIMAL(10,2),
+    protein_target_g DECIMAL(10,2),
+    fat_target_g DECIMAL(10,2),
+    carbs_target_g DECIMAL(10,2),
+    current_streak INTEGER DEFAULT 0,
+    days_since_last_meal_log INTEGER DEFAULT 0,
+    coins INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS nutrition_logs (
+    id BIGSERIAL PRIMARY KEY,
+    user_telegram_id BIGINT NOT NULL,
+    logged_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    total_calories DECIMAL(10,2),
+    protein_g DECIMAL(10,2),
+    carbs_g DECIMAL(10,2),
+    fat_g DECIMAL(10,2)
+);
+"""
+
+SQLITE_LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nutrition_logs (
+    id INTEGER PRIMARY KEY,
+    user_telegram_id INTEGER NOT NULL,
+    logged_at TEXT NOT NULL,
+    total_calories REAL,
+    protein_g REAL,
+    carbs_g REAL,
+    fat_g REAL
+);
+CREATE INDEX IF NOT EXISTS idx_nutrition_logs_user_logged_at ON nutrition_logs(user_telegram_id, logged_at);
+"""
+
+
+def poisson(rng: random.Random, mean: float) -> int:
+    """Knuth's Poisson sampler (fine for the small means used here)"""
+    limit = math.exp(-mean)
+    count, product = 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+class DatasetGenerator:
+    """Deterministic (per --seed) users, logs and summaries from the distribution arguments"""
+
+    def __init__(self, args):
+        self.args = args
+        self.end_date = datetime.date.today()
+        self.dates = [self.end_date - datetime.timedelta(days=args.days - 1 - i) for i in range(args.days)]
+        self.date_strings = [day.isoformat() for day in self.dates]
+        self.updated_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    def targets(self, rng: random.Random) -> dict:
+        """Calorie target ~ Normal, split into macros around the configured protein/fat shares"""
+        args = self.args
+        calories = round(clamp(rng.gauss(args.calorie_mean, args.calorie_sd), 1200, 4500))
+        protein_share = clamp(rng.gauss(args.protein_share, 0.04), 0.15, 0.45)
+        fat_share = clamp(rng.gauss(args.fat_share, 0.04), 0.15, 0.45)
+        return {
+            'calorie_target': float(calories),
+            'protein_target_g': round(calories * protein_share / 4),
+            'fat_target_g': round(calories * fat_share / 9),
+            'carbs_target_g': round(calories * (1 - protein_share - fat_share) / 4)
+        }
+
+    def user(self, user_id: int):
+        """(users row, log rows, summary rows) for one user over the whole window"""
+        args = self.args
+        rng = random.Random(args.seed * 1_000_003 + user_id)
+        targets = self.targets(rng)
+        # How regularly this user logs: per-user rate ~ Beta, some users joined mid-window
+        log_rate = rng.betavariate(args.active_alpha, args.active_beta)
+        first_day = rng.randrange(args.days) if rng.random() < args.new_user_share else 0
+        calorie_target = targets['calorie_target']
+        protein_share = targets['protein_target_g'] * 4 / calorie_target
+        fat_share = targets['fat_target_g'] * 9 / calorie_target
+
+        logs, summaries = [], []
+        logged_days = set()
+        for day in range(first_day, args.days):
+            if rng.random() >= log_rate:
+                continue
+            meals = clamp(poisson(rng, args.meals_mean), 1, MAX_MEALS_PER_DAY)
+            day_calories = calorie_target * clamp(rng.gauss(args.adherence_mean, args.adherence_sd), 0.2, 2.5)
+            weights = [rng.uniform(0.5, 1.5) for _ in range(meals)]
+            weight_total = sum(weights)
+            minutes = sorted(rng.randrange(FIRST_MEAL_HOUR * 60, LAST_MEAL_HOUR * 60) for _ in range(meals))
+            date_string = self.date_strings[day]
+            totals = [0.0, 0.0, 0.0, 0.0]
+            for weight, minute in zip(weights, minutes):
+                calories = round(day_calories * weight / weight_total, 1)
+                protein_kcal = calories * clamp(rng.gauss(protein_share, 0.05), 0.05, 0.6)
+                fat_kcal = calories * clamp(rng.gauss(fat_share, 0.05), 0.05, 0.6)
+                protein = round(protein_kcal / 4, 1)
+                fat = round(fat_kcal / 9, 1)
+                carbs = round(max(0.0, calories - protein_kcal - fat_kcal) / 4, 1)
+                logs.append((user_id, f'{date_string}T{minute // 60:02d}:{minute % 60:02d}:{rng.randrange(60):02d}+00:00', calories, protein, carbs, fat))
+                totals[0] += calories
+                totals[1] += protein
+                totals[2] += carbs
+                totals[3] += fat
+            summaries.append((
+                user_id, date_string, round(totals[0], 2), round(totals[1], 2), round(totals[2], 2), round(totals[3], 2), meals,
+                calorie_target, targets['protein_target_g'], targets['carbs_target_g'], targets['fat_target_g'], self.updated_at
+            ))
+            logged_days.add(day)
+
+        streak = 0
+        while args.days - 1 - streak in logged_days:
+            streak += 1
+        last_logged = max(logged_days) if logged_days else None
+        days_since = args.days - 1 - last_logged if last_logged is not None else args.days
+        user = (
+            user_id, f'seed_user_{user_id}', calorie_target, targets['protein_target_g'], targets['fat_target_g'],
+            targets['carbs_target_g'], streak, days_since, len(logged_days) * 2 + streak * 5
+        )
+        return user, logs, summaries
+
+    def batches(self):
+        """(users, logs, summaries) lists for --batch-size users at a time"""
+        args = self.args
+        for batch_start in range(0, args.users, args.batch_size):
+            users, logs, summaries = [], [], []
+            for offset in range(batch_start, min(args.users, batch_start + args.batch_size)):
+                user, user_logs, user_summaries = self.user(args.user_id_start + offset)
+                users.append(user)
+                logs.extend(user_logs)
+                summaries.extend(user_summaries)
+            yield users, logs, summaries
+
+
+def load_postgres_driver():
+    """psycopg (3) or psycopg2, or exit with an install hint"""
+    try:
+        import psycopg
+        return psycopg
+    except ImportError:
+        pass
+    try:
+        import psycopg2
+        return psycopg2
+    except ImportError:
+        logger.error("❌ --target postgres needs psycopg: pip install 'psycopg[binary]' (or use --target csv and psql \\copy)")
+        sys.exit(1)
+
+
+class PostgresWriter:
+    """COPY-based loader; each batch is one transaction"""
+
+    def __init__(self, dsn: str, create_schema: bool, skip_triggers: bool):
+        driver = load_postgres_driver()
+        self.connection = driver.connect(dsn)
+        with self.connection.cursor() as cursor:
+            if create_schema:
+                cursor.execute(POSTGRES_BASE_SCHEMA)
+                setup_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'daily_nutrition_summary_setup.sql')
+                with open(setup_path) as f:
+                    cursor.execute(f.read())
+            if skip_triggers:
+                # Summaries are written directly, so the per-statement delta triggers are redundant work
+                cursor.execute("SET session_replication_role = replica")
+            cursor.execute(f"CREATE TEMP TABLE seed_users ON COMMIT DELETE ROWS AS SELECT {', '.join(USER_COLUMNS)} FROM users WITH NO DATA")
+        self.connection.commit()
+
+    def _copy(self, cursor, table: str, columns: tuple, rows: list):
+        sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+        if hasattr(cursor, 'copy'):
+            with cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            cursor.copy_expert(sql, TabSeparatedRows(rows))
+
+    def write(self, users: list, logs: list, summaries: list):
+        first_user, last_user = users[0][0], users[-1][0]
+        updates = ', '.join(f'{column} = EXCLUDED.{column}' for column in USER_COLUMNS[1:])
+        with self.connection.cursor() as cursor:
+            # Users are upserted (other tables may reference them); logs and summaries are replaced
+            self._copy(cursor, 'seed_users', USER_COLUMNS, users)
+            cursor.execute(f"INSERT INTO users ({', '.join(USER_COLUMNS)}) SELECT {', '.join(USER_COLUMNS)} FROM seed_users "
+                           f"ON CONFLICT (user_id) DO UPDATE SET {updates}")
+            cursor.execute("DELETE FROM nutrition_logs WHERE user_telegram_id BETWEEN %s AND %s", (first_user, last_user))
+            self._copy(cursor, 'nutrition_logs', LOG_COLUMNS, logs)
+            # After the logs: with the delta triggers on, the COPY above creates summary rows of its own
+            cursor.execute("DELETE FROM daily_nutrition_summary WHERE user_telegram_id BETWEEN %s AND %s", (first_user, last_user))
+            self._copy(cursor, 'daily_nutrition_summary', SUMMARY_COLUMNS, summaries)
+        self.connection.commit()
+
+    def close(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("ANALYZE users")
+            cursor.execute("ANALYZE nutrition_logs")
+            cursor.execute("ANALYZE daily_nutrition_summary")
+        self.connection.commit()
+        self.connection.close()
+
+
+class TabSeparatedRows:
+    """Read-only file over rows in COPY text format, for psycopg2's copy_expert"""
+
+    def __init__(self, rows: list):
+        self._lines = ('\t'.join('\\N' if value is None else str(value) for value in row) + '\n' for row in rows)
+        self._buffer = ''
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class SqliteWriter:
+    """Loader for the embedded replica file (summary_replica.py schema plus nutrition_logs)"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=OFF')
+        self.db.executescript(REPLICA_SCHEMA + SQLITE_LOG_SCHEMA)
+
+    def write(self, users: list, logs: list, summaries: list):
+        first_user, last_user = users[0][0], users[-1][0]
+        synced_at = time.time()
+        with self.db:
+            target_indexes = [USER_COLUMNS.index(column) for column in TARGET_COLUMNS]
+            self.db.executemany(
+                f'INSERT OR REPLACE INTO users (user_id, {", ".join(TARGET_COLUMNS)}, synced_at) VALUES (?, ?, ?, ?, ?, ?)',
+                [(user[0], *(user[index] for index in target_indexes), synced_at) for user in users]
+            )
+            self.db.execute('DELETE FROM nutrition_logs WHERE user_telegram_id BETWEEN ? AND ?', (first_user, last_user))
+            self.db.executemany(f'INSERT INTO nutrition_logs ({", ".join(LOG_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)', logs)
+            self.db.execute('DELETE FROM daily_nutrition_summary WHERE user_telegram_id BETWEEN ? AND ?', (first_user, last_user))
+            self.db.executemany(
+                f'INSERT INTO daily_nutrition_summary ({", ".join(SUMMARY_COLUMNS)}) VALUES ({", ".join("?" * len(SUMMARY_COLUMNS))})',
+                summaries
+            )
+
+    def close(self):
+        self.db.execute('ANALYZE')
+        self.db.close()
+
+
+class CsvWriter:
+    """users.csv, nutrition_logs.csv and daily_nutrition_summary.csv (with headers) in one directory"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.files, self.writers = [], {}
+        for table, columns in (('users', USER_COLUMNS), ('nutrition_logs', LOG_COLUMNS), ('daily_nutrition_summary', SUMMARY_COLUMNS)):
+            f = open(os.path.join(directory, f'{table}.csv'), 'w', newline='')
+            self.files.append(f)
+            self.writers[table] = csv.writer(f)
+            self.writers[table].writerow(columns)
+
+    def write(self, users: list, logs: list, summaries: list):
+        self.writers['users'].writerows(users)
+        self.writers['nutrition_logs'].writerows(logs)
+        self.writers['daily_nutrition_summary'].writerows(summaries)
+
+    def close(self):
+        for f in self.files:
+            f.close()
+        for table, columns in (('users', USER_COLUMNS), ('nutrition_logs', LOG_COLUMNS), ('daily_nutrition_summary', SUMMARY_COLUMNS)):
+            path = os.path.join(self.directory, f'{table}.csv')
+            logger.info(f"   \\copy {table} ({', '.join(columns)}) FROM '{path}' WITH (FORMAT csv, HEADER)")
+
+
+def seed(args) -> dict:
+    """Generate the dataset and write it to the chosen target; returns row counts and timing"""
+    if args.target == 'postgres':
+        writer = PostgresWriter(args.dsn, args.create_schema, args.skip_triggers)
+    elif args.target == 'sqlite':
+        writer = SqliteWriter(args.path)
+    else:
+        writer = CsvWriter(args.out)
+
+    started = time.perf_counter()
+    counts = {'users': 0, 'nutrition_logs': 0, 'daily_nutrition_summary': 0}
+    generator = DatasetGenerator(args)
+    for users, logs, summaries in generator.batches():
+        writer.write(users, logs, summaries)
+        counts['users'] += len(users)
+        counts['nutrition_logs'] += len(logs)
+        counts['daily_nutrition_summary'] += len(summaries)
+        elapsed = time.perf_counter() - started
+        logger.info(f"🌱 {counts['users']}/{args.users} users, {counts['nutrition_logs']} logs, "
+                    f"{counts['daily_nutrition_summary']} summaries ({counts['nutrition_logs'] / max(elapsed, 1e-9):.0f} logs/s)")
+    writer.close()
+    counts['seconds'] = round(time.perf_counter() - started, 1)
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and load a synthetic users / nutrition_logs / daily_nutrition_summary dataset")
+    parser.add_argument('--target', choices=('postgres', 'sqlite', 'csv'), default='sqlite')
+    parser.add_argument('--dsn', default=os.getenv('DATABASE_URL', 'postgresql://localhost/postgres'), help="Postgres DSN (default: $DATABASE_URL)")
+    parser.add_argument('--path', default='data/seed.sqlite3', help="SQLite file for --target sqlite")
+    parser.add_argument('--out', default='seed', help="output directory for --target csv")
+    parser.add_argument('--create-schema', action='store_true', help="postgres: create users/nutrition_logs if missing and run daily_nutrition_summary_setup.sql")
+    parser.add_argument('--skip-triggers', action='store_true', help="postgres: disable the summary triggers while loading (needs superuser)")
+
+    scale = parser.add_argument_group('scale')
+    scale.add_argument('--users', type=int, default=1000)
+    scale.add_argument('--days', type=int, default=90)
+    scale.add_argument('--user-id-start', type=int, default=DEFAULT_USER_ID_START)
+    scale.add_argument('--batch-size', type=int, default=200, help="users generated and written per transaction")
+    scale.add_argument('--seed', type=int, default=1)
+
+    distributions = parser.add_argument_group('distributions')
+    distributions.add_argument('--calorie-mean', type=float, default=2100, help="calorie target ~ Normal(mean, sd)")
+    distributions.add_argument('--calorie-sd', type=float, default=350)
+    distributions.add_argument('--protein-share', type=float, default=0.30, help="mean share of target calories from protein")
+    distributions.add_argument('--fat-share', type=float, default=0.30, help="mean share of target calories from fat")
+    distributions.add_argument('--active-alpha', type=float, default=4.0, help="per-user logging rate ~ Beta(alpha, beta)")
+    distributions.add_argument('--active-beta', type=float, default=1.5)
+    distributions.add_argument('--new-user-share', type=float, default=0.3, help="share of users who joined during the window")
+    distributions.add_argument('--meals-mean', type=float, default=3.2, help="meals per logged day ~ Poisson(mean), 1-8")
+    distributions.add_argument('--adherence-mean', type=float, default=1.0, help="daily intake / target ~ Normal(mean, sd)")
+    distributions.add_argument('--adherence-sd', type=float, default=0.18)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logger.info(f"🌱 Seeding {args.users} users x {args.days} days into {args.target}")
+    counts = seed(args)
+    logger.info(f"✅ Seeded {counts['users']} users, {counts['nutrition_logs']} logs and "
+                f"{counts['daily_nutrition_summary']} daily summaries in {counts['seconds']}s")
@@ -0,0 +1,125 @@
+"""
+Response body encoding: fast JSON, optional MessagePack, pre-encoded constant payloads
+JSON goes through orjson when it is installed (it is several times faster than json.dumps
+and returns bytes directly), else the stdlib json module. Clients that ask for MessagePack
+in their Accept header get it when the msgpack package is installed. Payloads that are the
+same for every request apart from a few leading fields (the demo and fallback responses) are
+PayloadTemplates: the constant part is encoded once per format and only the varying fields
+(the user id) are encoded per request.
+"""
+
+import json
+import logging
+from config import JSON_BACKEND, MSGPACK_ENABLED
+from compression import parse_accept_encoding
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+# Media types clients use to ask for MessagePack
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+USE_ORJSON = orjson is not None and JSON_BACKEND in ('auto', 'orjson')
+MSGPACK_AVAILABLE = msgpack is not None and MSGPACK_ENABLED
+# Vary header for encoded responses: the format depends on Accept, the compression on Accept-Encoding
+VARY = 'Accept, Accept-Encoding' if MSGPACK_AVAILABLE else 'Accept-Encoding'
+
+if JSON_BACKEND == 'orjson' and orjson is None:
+    logger.warning("⚠️ JSON_BACKEND=orjson but orjson is not installed, using the json module")
+
+
+def dumps_json(data) -> bytes:
+    """Compact UTF-8 JSON"""
+    if USE_ORJSON:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass   # e.g. integers beyond 64 bits, which json handles
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def dumps_msgpack(data) -> bytes:
+    return msgpack.packb(data, use_bin_type=True)
+
+
+ENCODERS = {
+    JSON_CONTENT_TYPE: dumps_json,
+    MSGPACK_CONTENT_TYPE: dumps_msgpack
+}
+
+
+def negotiate_content_type(accept: str) -> str:
+    """MSGPACK_CONTENT_TYPE when the client prefers MessagePack (and it is available), else JSON"""
+    if not MSGPACK_AVAILABLE or not accept or 'msgpack' not in accept:
+        return JSON_CONTENT_TYPE
+    # Accept uses the same "value;q=..." syntax as Accept-Encoding
+    qualities = parse_accept_encoding(accept)
+    msgpack_quality = max(qualities.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    json_quality = qualities.get(JSON_CONTENT_TYPE, qualities.get('application/*', qualities.get('*/*', 0.0)))
+    return MSGPACK_CONTENT_TYPE if msgpack_quality > 0 and msgpack_quality >= json_quality else JSON_CONTENT_TYPE
+
+
+class PayloadTemplate:
+    """A response payload that is constant except for some leading fields, encoded once per format"""
+
+    def __init__(self, constant: dict):
+        self.constant = constant
+        self._encoded = {}   # content type -> encoded constant fields (without the enclosing object/map header)
+
+    def _constant_part(self, content_type: str) -> bytes:
+        part = self._encoded.get(content_type)
+        if part is None:
+            encoded = ENCODERS[content_type](self.constant)
+            if content_type == JSON_CONTENT_TYPE:
+                part = encoded[1:-1]   # drop the braces
+            else:
+                part = encoded[len(msgpack.Packer().pack_map_header(len(self.constant))):]
+            self._encoded[content_type] = part
+        return part
+
+    def render(self, content_type: str, fields: dict) -> bytes:
+        """`fields` followed by the constant ones, encoded as `content_type`"""
+        encode = ENCODERS[content_type]
+        constant = self._constant_part(content_type)
+        if content_type == JSON_CONTENT_TYPE:
+            parts = [encode(str(key)) + b':' + encode(value) for key, value in fields.items()]
+            if constant:
+                parts.append(constant)
+            return b'{' + b','.join(parts) + b'}'
+        header = msgpack.Packer().pack_map_header(len(fields) + len(self.constant))
+        return header + b''.join(encode(key) + encode(value) for key, value in fields.items()) + constant
+
+    def bind(self, **fields) -> 'BoundPayload':
+        return BoundPayload(self, fields)
+
+
+class BoundPayload(dict):
+    """The full payload as a plain dict (so it can be nested in other responses), encoded through its template"""
+
+    def __init__(self, template: PayloadTemplate, fields: dict):
+        super().__init__(fields)
+        self.update(template.constant)
+        self.template = template
+        self.fields = fields
+
+    def encode(self, content_type: str) -> bytes:
+        return self.template.render(content_type, self.fields)
+
+
+def encode_payload(data, accept: str = None):
+    """(body, content type) of a response payload in the format the Accept header asks for"""
+    content_type = negotiate_content_type(accept)
+    if isinstance(data, BoundPayload):
+        return data.encode(content_type), content_type
+    return ENCODERS[content_type](data), content_type
@@ -0,0 +1,109 @@
+"""
+Per-request phase timing, sent back as a Server-Timing header
+Code on the request path wraps its phases in timed('profile'), timed('render'), ... and
+execute_query() adds every Supabase round trip to a 'db' phase; all of it lands in the
+ServerTiming of the request being served, found through a contextvar (so it works across
+run_async() and asyncio.gather()). The servers open one per request with track_timing() and
+send `Server-Timing: profile;dur=12.3, db;dur=10.1;desc="2 queries", ..., total;dur=15.8`,
+which browser devtools (including the Telegram webview's) show per request. With
+SERVER_TIMING_LOG the same breakdown is logged as one structured record.
+"""
+
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from config import SERVER_TIMING_ENABLED, SERVER_TIMING_LOG
+
+logger = logging.getLogger(__name__)
+
+HEADER_NAME = 'Server-Timing'
+
+_current_timing = contextvars.ContextVar('server_timing', default=None)
+
+
+class ServerTiming:
+    """Milliseconds spent per phase while serving one request"""
+
+    def __init__(self, request: str):
+        self.request = request
+        self.started = time.perf_counter()
+        self.phases = {}   # name -> [ms, calls], in first-seen order
+
+    def add(self, name: str, seconds: float):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = [0.0, 0]
+        phase[0] += seconds * 1000
+        phase[1] += 1
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def breakdown(self) -> dict:
+        timings = {name: round(ms, 2) for name, (ms, _) in self.phases.items()}
+        timings['total'] = round(self.total_ms, 2)
+        return timings
+
+    def header_value(self) -> str:
+        entries = []
+        for name, (ms, calls) in self.phases.items():
+            description = f';desc="{calls} {"queries" if name == "db" else "calls"}"' if calls > 1 else ''
+            entries.append(f'{name};dur={ms:.1f}{description}')
+        entries.append(f'total;dur={self.total_ms:.1f}')
+        return ', '.join(entries)
+
+    def report(self):
+        """Log the request's phase breakdown as one record (SERVER_TIMING_LOG)"""
+        timings = self.breakdown()
+        logger.info("⏱️ %s: %s", self.request, ', '.join(f'{name} {ms}ms' for name, ms in timings.items()),
+                    extra={'fields': {'timing_ms': timings}})
+
+
+def current_timing():
+    """The ServerTiming of the request being served, or None"""
+    return _current_timing.get()
+
+
+def add_timing(name: str, seconds: float):
+    """Add time to a phase of the current request; a no-op outside a tracked request"""
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+@contextmanager
+def timed(name: str):
+    """Time the enclosed block as (part of) phase `name` of the current request"""
+    timing = _current_timing.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
+
+
+async def timed_call(name: str, awaitable):
+    """Await `awaitable` as phase `name` (for coroutines handed to asyncio.gather)"""
+    with timed(name):
+        return await awaitable
+
+
+@contextmanager
+def track_timing(request: str):
+    """Open a ServerTiming for the request (None when SERVER_TIMING_ENABLED is off) and log it on exit if asked"""
+    if not SERVER_TIMING_ENABLED:
+        yield None
+        return
+    timing = ServerTiming(request)
+    token = _current_timing.set(timing)
+    try:
+        yield timing
+    finally:
+        _current_timing.reset(token)
+        if SERVER_TIMING_LOG:
+            timing.report()
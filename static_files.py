@@ -0,0 +1,193 @@
+"""
+Static file serving helpers for /images/*
+Keeps a bounded cache of file metadata (size, mtime, ETag, content type) and decides
+the response for conditional (If-None-Match / If-Modified-Since) and Range requests.
+The servers send the file bytes themselves (os.sendfile in mini_app_server.py,
+aiohttp's FileResponse in async_server.py); ETags use aiohttp's format so both agree.
+Built image variants are picked by Accept (AVIF/WebP/PNG) through asset_manifest.py.
+Only content-hashed URLs (images/dist/<name>.<hash>.<ext>) are cached as immutable; the
+original images keep their URL when they change, so they get a short max-age.
+"""
+
+import os
+import re
+import time
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from config import STATIC_CACHE_CONTROL, STATIC_ORIGINAL_CACHE_CONTROL
+from asset_manifest import asset_manifest, ASSET_DIST_DIR
+
+logger = logging.getLogger(__name__)
+
+STATIC_ROOT = os.path.realpath('images')
+METADATA_CACHE_SIZE = 256
+METADATA_CHECK_INTERVAL = 1.0
+# URL paths of build_assets.py output: the name carries a 12-digit content hash
+HASHED_PATH_RE = re.compile(rf'^/{re.escape(ASSET_DIST_DIR)}/[^/]+\.[0-9a-f]{{12}}\.[a-z0-9]+$')
+
+mimetypes.add_type('image/webp', '.webp')
+mimetypes.add_type('image/avif', '.avif')
+
+
+class StaticFileInfo:
+    """Metadata of one servable file"""
+
+    __slots__ = ('path', 'size', 'mtime', 'etag', 'last_modified', 'content_type', 'checked_at')
+
+    def __init__(self, path: str, stat_result: os.stat_result):
+        self.path = path
+        self.size = stat_result.st_size
+        self.mtime = stat_result.st_mtime
+        self.etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+        self.last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.checked_at = time.monotonic()
+
+
+class StaticResponse:
+    """Status, headers and the byte range of the file to send (length 0 means no body)"""
+
+    __slots__ = ('status', 'headers', 'offset', 'length')
+
+    def __init__(self, status: int, headers: dict, offset: int = 0, length: int = 0):
+        self.status = status
+        self.headers = headers
+        self.offset = offset
+        self.length = length
+
+
+_metadata = OrderedDict()  # request path -> StaticFileInfo
+_metadata_lock = threading.Lock()
+
+def resolve_static_file(path: str) -> StaticFileInfo:
+    """Map an /images/* request path to its file metadata, or raise PermissionError/FileNotFoundError"""
+    now = time.monotonic()
+    with _metadata_lock:
+        info = _metadata.get(path)
+        if info is not None and now - info.checked_at < METADATA_CHECK_INTERVAL:
+            _metadata.move_to_end(path)
+            return info
+
+    # Remove leading slash and keep the file inside the static root
+    file_path = os.path.realpath(path.lstrip('/'))
+    if not file_path.startswith(STATIC_ROOT + os.sep):
+        raise PermissionError(path)
+
+    try:
+        stat_result = os.stat(file_path)
+    except FileNotFoundError:
+        with _metadata_lock:
+            _metadata.pop(path, None)
+        raise
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(path)
+
+    if info is not None and info.mtime == stat_result.st_mtime and info.size == stat_result.st_size:
+        info.checked_at = now
+    else:
+        info = StaticFileInfo(file_path, stat_result)
+    with _metadata_lock:
+        _metadata[path] = info
+        _metadata.move_to_end(path)
+        while len(_metadata) > METADATA_CACHE_SIZE:
+            _metadata.popitem(last=False)
+    return info
+
+def static_cache_control(path: str) -> str:
+    """Cache-Control for a request path: immutable only for content-hashed files"""
+    return STATIC_CACHE_CONTROL if HASHED_PATH_RE.match(path) else STATIC_ORIGINAL_CACHE_CONTROL
+
+def resolve_static_request(path: str, accept: str = ''):
+    """resolve_static_file for the best format of `path` the client accepts; returns (info, extra headers)
+    where the extra headers are Cache-Control for the requested URL and Vary when Accept picked the file"""
+    extra_headers = {'Cache-Control': static_cache_control(path)}
+    path, negotiated = asset_manifest.negotiate(path, accept)
+    info = resolve_static_file(path)
+    if negotiated:
+        extra_headers['Vary'] = 'Accept'
+    return info, extra_headers
+
+def _etag_matches(header_value: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match / If-Range header against our ETag"""
+    if header_value.strip() == '*':
+        return True
+    for candidate in header_value.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def _not_modified_since(header_value: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= parsedate_to_datetime(header_value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+
+def _parse_range(header_value: str, size: int):
+    """(start, end) inclusive for a single 'bytes=' range, None to ignore the header, or 'unsatisfiable'"""
+    unit, _, spec = header_value.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        # Unknown unit or multiple ranges: serve the whole file
+        return None
+    start_text, _, end_text = spec.strip().partition('-')
+    try:
+        if not start_text:
+            # Suffix range: last N bytes
+            length = int(end_text)
+            if length <= 0:
+                return 'unsatisfiable'
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return 'unsatisfiable'
+    return start, min(end, size - 1)
+
+def build_static_response(info: StaticFileInfo, request_headers) -> StaticResponse:
+    """Decide between 200, 206, 304 and 416 for a GET of `info` given the request headers
+    (Cache-Control and Vary come from resolve_static_request)"""
+    headers = {
+        'Content-Type': info.content_type,
+        'ETag': info.etag,
+        'Last-Modified': info.last_modified,
+        'Accept-Ranges': 'bytes'
+    }
+
+    if_none_match = request_headers.get('If-None-Match')
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, info.etag):
+            return StaticResponse(304, headers)
+    elif request_headers.get('If-Modified-Since') and _not_modified_since(request_headers.get('If-Modified-Since'), info.mtime):
+        return StaticResponse(304, headers)
+
+    range_header = request_headers.get('Range')
+    if_range = request_headers.get('If-Range')
+    if range_header and if_range:
+        # Only honour the range if the client's copy is still current
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            range_is_current = _etag_matches(if_range, info.etag) and not if_range.startswith('W/')
+        else:
+            range_is_current = if_range.strip() == info.last_modified
+        if not range_is_current:
+            range_header = None
+
+    byte_range = _parse_range(range_header, info.size) if range_header else None
+    if byte_range == 'unsatisfiable':
+        headers['Content-Range'] = f'bytes */{info.size}'
+        headers['Content-Length'] = '0'
+        return StaticResponse(416, headers)
+    if byte_range is not None:
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{info.size}'
+        headers['Content-Length'] = str(end - start + 1)
+        return StaticResponse(206, headers, start, end - start + 1)
+
+    headers['Content-Length'] = str(info.size)
+    return StaticResponse(200, headers, 0, info.size)
@@ -0,0 +1,310 @@
+"""
+Local SQLite replica of daily_nutrition_summary and the users target columns
+A background task pulls the summary rows whose updated_at moved past the last watermark
+(keyset-paginated on updated_at, id) plus the targets of the users in them, and upserts
+them into an embedded SQLite file. While the last sync is recent enough, summary and
+target reads are answered from the file instead of a Supabase round trip; when it is
+not (sync failing, just started), callers read through to Supabase as before.
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import datetime
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_COLUMNS = (
+    'id', 'user_telegram_id', 'date', 'total_calories', 'total_protein_g', 'total_carbs_g', 'total_fat_g',
+    'meals_logged_count', 'calorie_target', 'protein_target_g', 'carbs_target_g', 'fat_target_g', 'updated_at'
+)
+TARGET_COLUMNS = ('calorie_target', 'protein_target_g', 'fat_target_g', 'carbs_target_g')
+# Rows fetched per request while catching up
+PAGE_SIZE = 1000
+# Each sync re-reads this many seconds before the watermark: updated_at is the writing
+# transaction's start time, so a slow transaction can commit rows "in the past"
+SYNC_OVERLAP_SECONDS = 5
+# Same window as the recent_daily_nutrition_summary view
+RECENT_DAYS = 30
+# Same cap as the get_daily_nutrition_history function
+MAX_HISTORY_DAYS = 366
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_nutrition_summary (
+    user_telegram_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    total_calories REAL,
+    total_protein_g REAL,
+    total_carbs_g REAL,
+    total_fat_g REAL,
+    meals_logged_count INTEGER,
+    calorie_target REAL,
+    protein_target_g REAL,
+    carbs_target_g REAL,
+    fat_target_g REAL,
+    updated_at TEXT,
+    PRIMARY KEY (user_telegram_id, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    calorie_target REAL,
+    protein_target_g REAL,
+    fat_target_g REAL,
+    carbs_target_g REAL,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SummaryReplica:
+    """SQLite copy of daily_nutrition_summary + users targets, synced by updated_at watermark.
+
+    `fetch_changes(since, after_id, limit)` returns summary rows ordered by (updated_at, id)
+    after that cursor (all rows when `since` is None); `fetch_targets(user_ids)` returns
+    users rows with user_id and the target columns.
+    """
+
+    def __init__(self, path: str, fetch_changes, fetch_targets, interval: float = 2.0,
+                 max_staleness: float = 30.0, targets_ttl: float = 300.0):
+        self.path = path
+        self.fetch_changes = fetch_changes
+        self.fetch_targets = fetch_targets
+        self.interval = interval
+        self.max_staleness = max_staleness
+        self.targets_ttl = targets_ttl
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        self._task_loop = None
+        self._last_sync = None   # monotonic time of the last successful sync in this process
+        self.synced_rows = 0
+        self.failures = 0
+        self.hits = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """This process's connection (pre-forked workers open their own); use under self._lock"""
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def is_fresh(self) -> bool:
+        """Whether reads may be served from the replica"""
+        return self._last_sync is not None and time.monotonic() - self._last_sync <= self.max_staleness
+
+    # Reads
+
+    def get_summary(self, user_telegram_id: int, target_date: datetime.date) -> dict:
+        """The day's totals (zeros when the user has no row for it)"""
+        with self._lock:
+            row = self.db.execute(
+                'SELECT total_calories, total_protein_g, total_carbs_g, total_fat_g FROM daily_nutrition_summary '
+                'WHERE user_telegram_id = ? AND date = ?', (user_telegram_id, target_date.isoformat())
+            ).fetchone()
+            self.hits += 1
+        row = row or (0, 0, 0, 0)
+        return {
+            'total_calories': float(row[0] or 0),
+            'total_protein_g': float(row[1] or 0),
+            'total_carbs_g': float(row[2] or 0),
+            'total_fat_g': float(row[3] or 0)
+        }
+
+    def get_recent(self, user_telegram_id: int, days: int) -> list:
+        """Latest `days` summaries of the last 30 days, newest first (recent_daily_nutrition_summary shape)"""
+        since = (datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=RECENT_DAYS)).isoformat()
+        with self._lock:
+            rows = self.db.execute(
+                'SELECT date, total_calories, total_protein_g, total_carbs_g, total_fat_g, meals_logged_count '
+                'FROM daily_nutrition_summary WHERE user_telegram_id = ? AND date >= ? ORDER BY date DESC LIMIT ?',
+                (user_telegram_id, since, days)
+            ).fetchall()
+            self.hits += 1
+        return [{
+            'date': date,
+            'total_calories': float(calories or 0),
+            'total_protein_g': float(protein or 0),
+            'total_carbs_g': float(carbs or 0),
+            'total_fat_g': float(fat or 0),
+            'meals_logged_count': int(meals or 0)
+        } for date, calories, protein, carbs, fat, meals in rows]
+
+    def get_history(self, user_telegram_id: int, days: int) -> list:
+        """Dense get_daily_nutrition_history rows (oldest first), or None without fresh targets for the user"""
+        targets = self.get_targets(user_telegram_id)
+        if targets is None:
+            return None
+        days = min(max(days, 1), MAX_HISTORY_DAYS)
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        with self._lock:
+            rows = self.db.execute(
+                'WITH RECURSIVE days(date) AS ('
+                "    SELECT ? UNION ALL SELECT date(date, '+1 day') FROM days WHERE date < ?"
+                ') '
+                'SELECT days.date, COALESCE(s.total_calories, 0), COALESCE(s.total_protein_g, 0), COALESCE(s.total_carbs_g, 0), '
+                'COALESCE(s.total_fat_g, 0), COALESCE(s.meals_logged_count, 0), '
+                's.calorie_target, s.protein_target_g, s.carbs_target_g, s.fat_target_g '
+                'FROM days LEFT JOIN daily_nutrition_summary s ON s.user_telegram_id = ? AND s.date = days.date ORDER BY days.date',
+                ((today - datetime.timedelta(days=days - 1)).isoformat(), today.isoformat(), user_telegram_id)
+            ).fetchall()
+        return [{
+            'date': date,
+            'calories': calories,
+            'protein': protein,
+            'carbs': carbs,
+            'fats': fats,
+            'meals_logged_count': meals,
+            'calorie_target': targets['calorie_target'],
+            'protein_target_g': targets['protein_target_g'],
+            'carbs_target_g': targets['carbs_target_g'],
+            'fat_target_g': targets['fat_target_g'],
+            'day_calorie_target': day_calories,
+            'day_protein_target_g': day_protein,
+            'day_carbs_target_g': day_carbs,
+            'day_fat_target_g': day_fat,
+            'user_exists': True
+        } for date, calories, protein, carbs, fats, meals, day_calories, day_protein, day_carbs, day_fat in rows]
+
+    def get_targets(self, user_telegram_id: int) -> dict:
+        """users target columns if they were synced within targets_ttl, else None"""
+        with self._lock:
+            row = self.db.execute(
+                f'SELECT {", ".join(TARGET_COLUMNS)}, synced_at FROM users WHERE user_id = ?', (user_telegram_id,)
+            ).fetchone()
+        if row is None or time.time() - row[-1] > self.targets_ttl:
+            return None
+        self.hits += 1
+        return dict(zip(TARGET_COLUMNS, row[:-1]))
+
+    # Writes
+
+    def store_targets(self, rows: list):
+        """Upsert users rows (user_id + target columns), e.g. after a read-through to Supabase"""
+        now = time.time()
+        with self._lock:
+            self.db.executemany(
+                f'INSERT OR REPLACE INTO users (user_id, {", ".join(TARGET_COLUMNS)}, synced_at) VALUES (?, ?, ?, ?, ?, ?)',
+                [(row['user_id'], *(row.get(column) for column in TARGET_COLUMNS), now) for row in rows]
+            )
+
+    def invalidate_targets(self, user_telegram_id: int = None):
+        """Forget synced targets for one user (or everyone) so the next read goes to Supabase"""
+        with self._lock:
+            if user_telegram_id is None:
+                self.db.execute('DELETE FROM users')
+            else:
+                self.db.execute('DELETE FROM users WHERE user_id = ?', (user_telegram_id,))
+
+    def _store_summaries(self, rows: list, watermark: str) -> list:
+        """Upsert summary rows and advance the watermark in one transaction; returns the rows that changed"""
+        columns = SUMMARY_COLUMNS[1:]
+        with self._lock:
+            db = self.db
+            db.execute('BEGIN')
+            try:
+                changed = [row for row in rows if db.execute(
+                    'SELECT updated_at FROM daily_nutrition_summary WHERE user_telegram_id = ? AND date = ?',
+                    (row['user_telegram_id'], row['date'])
+                ).fetchone() != (row['updated_at'],)]
+                db.executemany(
+                    f'INSERT OR REPLACE INTO daily_nutrition_summary ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})',
+                    [tuple(row.get(column) for column in columns) for row in changed]
+                )
+                db.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES ('summary_watermark', ?)", (watermark,))
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        return changed
+
+    def _watermark(self) -> str:
+        with self._lock:
+            row = self.db.execute("SELECT value FROM sync_state WHERE name = 'summary_watermark'").fetchone()
+        return row[0] if row else None
+
+    # Sync
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start syncing on `loop` (once per process; safe to call from any thread)"""
+        if self._task_loop is not None:
+            return
+        self._task_loop = loop
+        loop.call_soon_threadsafe(lambda: loop.create_task(self.run()))
+
+    async def run(self):
+        logger.info(f"🗄️ Summary replica sync started ({self.path}, every {self.interval}s)")
+        while True:
+            try:
+                await self.sync_once()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Summary replica sync failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def sync_once(self) -> int:
+        """Pull summary rows changed since the watermark and their users' targets; returns rows synced"""
+        started = time.perf_counter()
+        watermark = self._watermark()
+        since = None
+        if watermark is not None:
+            since = (datetime.datetime.fromisoformat(watermark) - datetime.timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()
+
+        synced = 0
+        after_id = 0
+        user_ids = set()
+        while True:
+            rows = await self.fetch_changes(since, after_id, PAGE_SIZE)
+            if not rows:
+                break
+            last = rows[-1]
+            since, after_id = last['updated_at'], last['id']
+            if watermark is None or datetime.datetime.fromisoformat(since) > datetime.datetime.fromisoformat(watermark):
+                watermark = since
+            # Rows re-read because of the overlap are skipped unless they really changed
+            changed = self._store_summaries(rows, watermark)
+            user_ids.update(row['user_telegram_id'] for row in changed)
+            synced += len(changed)
+            if len(rows) < PAGE_SIZE:
+                break
+
+        # Targets are copied into each summary row, but the users row is what the dashboard reads
+        user_ids = sorted(user_ids)
+        for start in range(0, len(user_ids), PAGE_SIZE):
+            self.store_targets(await self.fetch_targets(user_ids[start:start + PAGE_SIZE]))
+
+        self._last_sync = time.monotonic()
+        self.synced_rows += synced
+        if synced:
+            logger.info(f"🗄️ Summary replica synced {synced} rows for {len(user_ids)} users in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return synced
+
+    def stats(self) -> dict:
+        with self._lock:
+            db = self.db
+            summaries = db.execute('SELECT COUNT(*) FROM daily_nutrition_summary').fetchone()[0]
+            users = db.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+            watermark = db.execute("SELECT value FROM sync_state WHERE name = 'summary_watermark'").fetchone()
+        return {
+            'path': self.path,
+            'fresh': self.is_fresh(),
+            'last_sync_age': round(time.monotonic() - self._last_sync, 1) if self._last_sync is not None else None,
+            'watermark': watermark[0] if watermark else None,
+            'summary_rows': summaries,
+            'users': users,
+            'synced_rows': self.synced_rows,
+            'hits': self.hits,
+            'failures': self.failures
+        }
@@ -1,28 +1,213 @@
+import os
+import time
 import asyncio
 import datetime
 import logging
+import threading
+from collections import OrderedDict
 from typing import Dict, List
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_ANON_KEY
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.types import ReturnMethod
+from summary_replica import SummaryReplica, SUMMARY_COLUMNS, TARGET_COLUMNS
+from query_log import record_query, query_target
+from metrics import observe_query
+from server_timing import add_timing, timed
+from config import (
+    SUPABASE_URL, SUPABASE_ANON_KEY, SUPABASE_POOL_SIZE, SUPABASE_TIMEOUT,
+    USER_CACHE_TTL, USER_CACHE_NEGATIVE_TTL, USER_CACHE_MAX_SIZE,
+    SUMMARY_REPLICA_PATH, SUMMARY_REPLICA_SYNC_INTERVAL, SUMMARY_REPLICA_MAX_STALENESS
+)
 
 logger = logging.getLogger(__name__)
 
 
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """Non-blocking PostgREST client whose HTTP connections are pooled and kept alive"""
+
+    def __init__(self, base_url: str, api_key: str, pool_size: int, timeout: float):
+        self.pool_size = pool_size
+        super().__init__(
+            base_url,
+            headers={
+                'Accept': 'application/json',
+                'Content-Type': 'application/json',
+                'apikey': api_key,
+                'Authorization': f'Bearer {api_key}'
+            },
+            timeout=timeout
+        )
+
+    def create_session(self, base_url, headers, timeout) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=60
+            )
+        )
+
+
+# One pooled client per process (pre-forked workers each build their own)
+_shared_client = None
+_shared_client_pid = None
+
+def get_shared_client() -> PooledPostgrestClient:
+    """Return the process-wide pooled client, creating it on first use"""
+    global _shared_client, _shared_client_pid
+    if _shared_client is None or _shared_client_pid != os.getpid():
+        _shared_client = PooledPostgrestClient(f"{SUPABASE_URL}/rest/v1", SUPABASE_ANON_KEY, SUPABASE_POOL_SIZE, SUPABASE_TIMEOUT)
+        _shared_client_pid = os.getpid()
+        logger.info(f"Created pooled Supabase client (pool size {SUPABASE_POOL_SIZE}, timeout {SUPABASE_TIMEOUT}s)")
+    return _shared_client
+
+async def close_shared_client():
+    """Close the pooled client's connections; call once on server shutdown"""
+    global _shared_client
+    if _shared_client is not None and _shared_client_pid == os.getpid():
+        await _shared_client.aclose()
+        logger.info("Closed pooled Supabase client")
+    _shared_client = None
+
+
+async def execute_query(query):
+    """Execute a PostgREST query without blocking the event loop, bounded by SUPABASE_TIMEOUT.
+
+    The query is recorded in the current request's QueryLog (query_log.py) and 'db' timing
+    phase (server_timing.py), if any, and in the Supabase latency metrics.
+    """
+    started = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(query.execute(), SUPABASE_TIMEOUT)
+    except Exception as e:
+        seconds = time.perf_counter() - started
+        record_query(query, None, seconds, e)
+        add_timing('db', seconds)
+        observe_query(*query_target(query), seconds, failed=True)
+        raise
+    seconds = time.perf_counter() - started
+    record_query(query, result.data, seconds)
+    add_timing('db', seconds)
+    observe_query(*query_target(query), seconds)
+    return result
+
+
+class TTLCache:
+    """In-process cache with a TTL and an LRU size bound.
+
+    None is a valid cached value (negative caching) and expires after `negative_ttl`.
+    Safe to use from the stdlib server's handler threads and the event loop at once.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        """Return the cached value, or `default` (TTLCache._MISSING) on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# users rows (targets, streak and coins) keyed by telegram id; None means "no such user"
+USER_COLUMNS = 'calorie_target, protein_target_g, fat_target_g, carbs_target_g, current_streak, days_since_last_meal_log, coins'
+TARGET_KEYS = ('calorie_target', 'protein_target_g', 'fat_target_g', 'carbs_target_g')
+user_cache = TTLCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL, USER_CACHE_NEGATIVE_TTL)
+
+def invalidate_user_cache(user_telegram_id=None):
+    """Forget the cached users row for one user (or all users) so the next read hits Supabase"""
+    user_cache.invalidate(user_telegram_id)
+    if summary_replica is not None:
+        summary_replica.invalidate_targets(user_telegram_id)
+
+def user_cache_stats() -> Dict:
+    """Hit/miss counters of the users row cache"""
+    return user_cache.stats()
+
+
 class SupabaseMiniApp:
     """Minimal Supabase client for nutrition mini app"""
 
-    def __init__(self):
-        self.client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    @property
+    def client(self) -> PooledPostgrestClient:
+        return get_shared_client()
+
+    async def get_user_row(self, user_telegram_id: int) -> Dict:
+        """Get the user's targets, streak and coins, served from user_cache when fresh.
+
+        Returns None when the user does not exist; query errors propagate and are not cached.
+        """
+        row = user_cache.get(user_telegram_id)
+        if row is not TTLCache._MISSING:
+            return row
+
+        result = await execute_query(self.client.table('users').select(USER_COLUMNS).eq('user_id', user_telegram_id))
+        row = result.data[0] if result.data else None
+        user_cache.set(user_telegram_id, row)
+        return row
 
     async def get_user_profile(self, user_telegram_id: int) -> Dict:
         """Get user's complete profile including nutrition targets - SAME AS BOT LOGIC"""
         try:
-            logger.info(f"Getting user profile for user {user_telegram_id}")
-            result = self.client.table('users').select('calorie_target, protein_target_g, fat_target_g, carbs_target_g').eq('user_id', user_telegram_id).execute()
-
-            if result.data:
-                logger.info(f"Found user profile: {result.data[0]}")
-                return result.data[0]
+            logger.info("Getting user profile for user %s", user_telegram_id)
+            if summary_replica is not None:
+                profile = summary_replica.get_targets(user_telegram_id)
+                if profile is not None:
+                    logger.debug("Found user profile in replica: %s", profile)
+                    return profile
+
+            row = await self.get_user_row(user_telegram_id)
+
+            if row:
+                profile = {key: row.get(key) for key in TARGET_KEYS}
+                logger.debug("Found user profile: %s", profile)
+                if summary_replica is not None:
+                    summary_replica.store_targets([{'user_id': user_telegram_id, **profile}])
+                return profile
             else:
                 logger.warning(f"No user profile found for user {user_telegram_id}")
                 return None
@@ -31,13 +216,24 @@ class SupabaseMiniApp:
             logger.exception(f"Failed to get user profile for user {user_telegram_id}: {e}")
             return None
 
+    async def get_user_streak_stats(self, user_telegram_id: int) -> Dict:
+        """Get user's current_streak, days_since_last_meal_log and coins, or None if the user does not exist"""
+        row = await self.get_user_row(user_telegram_id)
+        if not row:
+            return None
+        return {
+            'current_streak': row.get('current_streak', 0) or 0,
+            'days_since_last_meal_log': row.get('days_since_last_meal_log', 0) or 0,
+            'coins': row.get('coins', 0) or 0
+        }
+
     async def get_user_nutrition_targets(self, user_telegram_id: int) -> Dict:
         """Get user's nutrition targets."""
         try:
-            result = self.client.table('users').select('calorie_target, protein_target_g, fat_target_g, carbs_target_g').eq('user_id', user_telegram_id).execute()
+            row = await self.get_user_row(user_telegram_id)
 
-            if result.data:
-                return result.data[0]
+            if row:
+                return {key: row.get(key) for key in TARGET_KEYS}
             else:
                 logger.warning(f"No nutrition targets found for user {user_telegram_id}")
                 return {
@@ -56,24 +252,84 @@ class SupabaseMiniApp:
                 'carbs_target_g': 250
             }
 
-    async def get_today_nutrition_summary(self, user_telegram_id: int) -> Dict:
+    async def get_today_nutrition_summary(self, user_telegram_id: int, use_replica: bool = True) -> Dict:
         """Get total nutrition consumed today."""
-        return await self.get_nutrition_summary_for_date(user_telegram_id, datetime.datetime.now(datetime.timezone.utc).date())
-
-    async def get_nutrition_summary_for_date(self, user_telegram_id: int, target_date: datetime.date) -> Dict:
-        """Get total nutrition consumed for a specific date from daily_nutrition_summary table."""
+        return await self.get_nutrition_summary_for_date(
+            user_telegram_id, datetime.datetime.now(datetime.timezone.utc).date(), use_replica
+        )
+
+    async def get_today_summary_versions(self, user_telegram_ids: List[int]) -> Dict:
+        """Version of today's daily_nutrition_summary row per user (users without one are left out).
+
+        One query for all ids; used to detect which subscribed dashboards need a refresh.
+        """
+        if not user_telegram_ids:
+            return {}
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        result = await execute_query(self.client.table('daily_nutrition_summary').select(
+            'user_telegram_id, updated_at, total_calories, meals_logged_count'
+        ).eq('date', today.isoformat()).in_('user_telegram_id', user_telegram_ids))
+        return {
+            row['user_telegram_id']: (today.isoformat(), row.get('updated_at'), row.get('total_calories'), row.get('meals_logged_count'))
+            for row in result.data or []
+        }
+
+    async def upsert_daily_summaries(self, rows: List[Dict]):
+        """Insert or update many daily_nutrition_summary rows (keyed by user and date), one request per column set.
+
+        PostgREST bulk upserts need the same keys in every row, and rows only carry the
+        columns they have values for (bulk_ingest.summary_rows), so they are grouped by columns.
+        """
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row), []).append(row)
+        for group in groups.values():
+            await execute_query(self.client.table('daily_nutrition_summary').upsert(
+                group, on_conflict='user_telegram_id,date', returning=ReturnMethod.minimal
+            ))
+        logger.info("💾 Upserted %d daily summary rows in %d requests", len(rows), len(groups))
+
+    async def get_summary_changes(self, since: str, after_id: int, limit: int) -> List[Dict]:
+        """daily_nutrition_summary rows after the (updated_at, id) cursor, in that order (replica sync)"""
+        query = self.client.table('daily_nutrition_summary').select(', '.join(SUMMARY_COLUMNS))
+        if since is not None:
+            # Keyset cursor; added as a raw `or` param since not every postgrest release has .or_()
+            query.params = query.params.add('or', f'(updated_at.gt."{since}",and(updated_at.eq."{since}",id.gt.{after_id}))')
+        result = await execute_query(query.order('updated_at').order('id').limit(limit))
+        return result.data or []
+
+    async def get_users_targets(self, user_telegram_ids: List[int]) -> List[Dict]:
+        """user_id and target columns for many users in one request (replica sync)"""
+        result = await execute_query(self.client.table('users').select(
+            'user_id, ' + ', '.join(TARGET_COLUMNS)
+        ).in_('user_id', user_telegram_ids))
+        return result.data or []
+
+    async def get_nutrition_summary_for_date(self, user_telegram_id: int, target_date: datetime.date,
+                                             use_replica: bool = True) -> Dict:
+        """Get total nutrition consumed for a specific date from daily_nutrition_summary table.
+
+        use_replica=False reads Supabase even while the replica is fresh, for callers that must
+        see a change the replica may not have synced yet (the /api/events payloads).
+        """
         try:
-            logger.info(f"Getting nutrition summary for user {user_telegram_id} on date {target_date}")
+            logger.info("Getting nutrition summary for user %s on date %s", user_telegram_id, target_date)
+
+            if use_replica and summary_replica is not None and summary_replica.is_fresh():
+                # The nutrition_logs trigger keeps a summary row for every day with meals, so a missing row means zeros
+                summary = summary_replica.get_summary(user_telegram_id, target_date)
+                logger.info("📊 Date %s: %s calories from the summary replica", target_date, summary['total_calories'])
+                return summary
 
             # First try to get from daily_nutrition_summary table (much faster)
-            result = self.client.table('daily_nutrition_summary').select(
+            result = await execute_query(self.client.table('daily_nutrition_summary').select(
                 'total_calories, total_protein_g, total_carbs_g, total_fat_g, meals_logged_count'
-            ).eq('user_telegram_id', user_telegram_id).eq('date', target_date.isoformat()).execute()
+            ).eq('user_telegram_id', user_telegram_id).eq('date', target_date.isoformat()))
 
             if result.data and len(result.data) > 0:
                 # Found daily summary
                 daily_summary = result.data[0]
-                logger.info(f"📊 Date {target_date}: Found daily summary with {daily_summary.get('total_calories', 0)} calories from {daily_summary.get('meals_logged_count', 0)} meals")
+                logger.info("📊 Date %s: Found daily summary with %s calories from %s meals", target_date, daily_summary.get('total_calories', 0), daily_summary.get('meals_logged_count', 0))
                 return {
                     'total_calories': float(daily_summary.get('total_calories', 0) or 0),
                     'total_protein_g': float(daily_summary.get('total_protein_g', 0) or 0),
@@ -82,14 +338,15 @@ class SupabaseMiniApp:
                 }
             else:
                 # Fallback to calculating from nutrition_logs (for missing days or when daily_nutrition_summary doesn't exist yet)
-                logger.info(f"No daily summary found for {target_date}, calculating from nutrition_logs...")
-                result = self.client.table('nutrition_logs').select(
-                    'total_calories, protein_g, carbs_g, fat_g'
-                ).eq('user_telegram_id', user_telegram_id).gte(
-                    'logged_at', target_date.isoformat()
-                ).lt(
-                    'logged_at', (target_date + datetime.timedelta(days=1)).isoformat()
-                ).execute()
+                logger.info("No daily summary found for %s, calculating from nutrition_logs...", target_date)
+                with timed('logs_fallback'):
+                    result = await execute_query(self.client.table('nutrition_logs').select(
+                        'total_calories, protein_g, carbs_g, fat_g'
+                    ).eq('user_telegram_id', user_telegram_id).gte(
+                        'logged_at', target_date.isoformat()
+                    ).lt(
+                        'logged_at', (target_date + datetime.timedelta(days=1)).isoformat()
+                    ))
 
                 # Sum up the values from individual logs
                 total_calories = sum(float(log.get('total_calories', 0) or 0) for log in result.data)
@@ -97,7 +354,7 @@ class SupabaseMiniApp:
                 total_carbs = sum(float(log.get('carbs_g', 0) or 0) for log in result.data)
                 total_fat = sum(float(log.get('fat_g', 0) or 0) for log in result.data)
 
-                logger.info(f"📊 Date {target_date}: Calculated from {len(result.data)} nutrition logs, totaling {total_calories} calories")
+                logger.info("📊 Date %s: Calculated from %s nutrition logs, totaling %s calories", target_date, len(result.data), total_calories)
                 return {
                     'total_calories': total_calories,
                     'total_protein_g': total_protein,
@@ -117,14 +374,19 @@ class SupabaseMiniApp:
     async def get_recent_daily_summaries(self, user_telegram_id: int, days: int = 7) -> List[Dict]:
         """Get recent daily nutrition summaries directly from recent_daily_nutrition_summary view."""
         try:
-            logger.info(f"🔍 Getting {days} days from recent_daily_nutrition_summary view for user {user_telegram_id}")
+            logger.info("🔍 Getting %s days from recent_daily_nutrition_summary view for user %s", days, user_telegram_id)
 
-            result = self.client.table('recent_daily_nutrition_summary').select(
+            if summary_replica is not None and summary_replica.is_fresh():
+                summaries = summary_replica.get_recent(user_telegram_id, days)
+                logger.info("✅ Found %s days of data in the summary replica", len(summaries))
+                return summaries
+
+            result = await execute_query(self.client.table('recent_daily_nutrition_summary').select(
                 'date, total_calories, total_protein_g, total_carbs_g, total_fat_g, meals_logged_count'
-            ).eq('user_telegram_id', user_telegram_id).order('date', desc=True).limit(days).execute()
+            ).eq('user_telegram_id', user_telegram_id).order('date', desc=True).limit(days))
 
             if result.data:
-                logger.info(f"✅ Found {len(result.data)} days of data from recent_daily_nutrition_summary view")
+                logger.info("✅ Found %s days of data from recent_daily_nutrition_summary view", len(result.data))
                 summaries = []
                 for row in result.data:
                     summaries.append({
@@ -135,7 +397,7 @@ class SupabaseMiniApp:
                         'total_fat_g': float(row.get('total_fat_g', 0) or 0),
                         'meals_logged_count': int(row.get('meals_logged_count', 0) or 0)
                     })
-                    logger.info(f"📊 {row.get('date')}: {row.get('total_calories', 0)} calories, {row.get('meals_logged_count', 0)} meals")
+                    logger.debug("📊 %s: %s calories, %s meals", row.get('date'), row.get('total_calories', 0), row.get('meals_logged_count', 0))
                 return summaries
             else:
                 logger.warning(f"No data found in recent_daily_nutrition_summary view for user {user_telegram_id}")
@@ -145,6 +407,27 @@ class SupabaseMiniApp:
             logger.exception(f"Failed to get recent daily summaries for user {user_telegram_id}: {e}")
             return []
 
+    async def get_daily_history(self, user_telegram_id: int, days: int = 7) -> List[Dict]:
+        """Dense last-N-days history with the user's targets on every row, oldest first.
+
+        Rows come from the get_daily_nutrition_history RPC (or the fresh local replica) with keys
+        date, calories, protein, carbs, fats, meals_logged_count, the target columns, the targets stored
+        with that day's summary (day_calorie_target, ...; None for days without one) and user_exists.
+        Query errors propagate.
+        """
+        if summary_replica is not None and summary_replica.is_fresh():
+            rows = summary_replica.get_history(user_telegram_id, days)
+            if rows is not None:
+                logger.info("✅ %s days of history for user %s from the summary replica", len(rows), user_telegram_id)
+                return rows
+
+        result = await execute_query(self.client.rpc('get_daily_nutrition_history', {
+            'p_user_telegram_id': user_telegram_id,
+            'p_days': days
+        }))
+        logger.info("✅ %s days of history for user %s from get_daily_nutrition_history", len(result.data or []), user_telegram_id)
+        return result.data or []
+
     async def get_user_nutrition_data(self, user_telegram_id: int) -> Dict:
         """Get complete nutrition data for user (targets + consumed today)"""
         try:
@@ -172,7 +455,7 @@ class SupabaseMiniApp:
                 }
             }
 
-            logger.info(f"📊 Nutrition data for user {user_telegram_id}: {data}")
+            logger.debug("📊 Nutrition data for user %s: %s", user_telegram_id, data)
             return data
 
         except Exception as e:
@@ -188,7 +471,7 @@ class SupabaseMiniApp:
     async def populate_sample_daily_data(self, user_telegram_id: int, days: int = 7) -> bool:
         """Populate sample daily nutrition data for testing (when no real data exists)."""
         try:
-            logger.info(f"Populating sample daily data for user {user_telegram_id}")
+            logger.info("Populating sample daily data for user %s", user_telegram_id)
 
             # Sample data that mimics real consumption patterns
             sample_data = [
@@ -209,7 +492,7 @@ class SupabaseMiniApp:
                 day_data = sample_data[i % len(sample_data)]
 
                 # Insert sample daily summary
-                self.client.table('daily_nutrition_summary').upsert({
+                await execute_query(self.client.table('daily_nutrition_summary').upsert({
                     'user_telegram_id': user_telegram_id,
                     'date': target_date.isoformat(),
                     'total_calories': day_data['calories'],
@@ -223,11 +506,22 @@ class SupabaseMiniApp:
                     'fat_target_g': user_targets['fat_target_g'],
                     'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
                     'updated_at': datetime.datetime.now(datetime.timezone.utc).isoformat()
-                }).execute()
+                }))
 
-            logger.info(f"✅ Successfully populated {days} days of sample data for user {user_telegram_id}")
+            logger.info("✅ Successfully populated %s days of sample data for user %s", days, user_telegram_id)
             return True
 
         except Exception as e:
             logger.exception(f"Failed to populate sample daily data: {e}")
             return False
+
+
+# Optional local replica of daily_nutrition_summary and users targets (SUMMARY_REPLICA_PATH); start() it on the server's loop
+summary_replica = SummaryReplica(
+    SUMMARY_REPLICA_PATH,
+    SupabaseMiniApp().get_summary_changes,
+    SupabaseMiniApp().get_users_targets,
+    SUMMARY_REPLICA_SYNC_INTERVAL,
+    SUMMARY_REPLICA_MAX_STALENESS,
+    USER_CACHE_TTL
+) if SUMMARY_REPLICA_PATH else None
@@ -0,0 +1,148 @@
+"""
+Precompiled HTML template renderer
+The template file is read and split once into static byte segments and typed slots,
+so rendering a page is a single join instead of a str.replace pass per placeholder.
+The file is recompiled automatically when its mtime (or the image manifest) changes.
+Static segments can also be precompressed once, so gzip responses only deflate-frame the slot values.
+"""
+
+import os
+import time
+import string
+import logging
+import threading
+from compression import deflate_segment, gzip_from_parts
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledTemplate:
+    """HTML file compiled into static segments and slots.
+
+    `replacements` maps an exact anchor string in the file to a str.format-style
+    template that replaces every occurrence of it, e.g.
+    'id="proteinValue">161</div>' -> 'id="proteinValue">{protein_remaining}g</div>'.
+    Literal text (including `{{`/`}}` escapes) is folded into the static segments,
+    and each `{field:spec}` becomes a slot filled by render(values).
+    With an `asset_manifest` (asset_manifest.AssetManifest), image references are
+    rewritten to the built variants before compiling. With a `compress_level`, the
+    static segments are deflated at compile time for render_gzip().
+    """
+
+    def __init__(self, path: str, replacements: dict = None, check_interval: float = 1.0, asset_manifest=None,
+                 compress_level: int = None):
+        self.path = path
+        self.replacements = replacements or {}
+        self.check_interval = check_interval
+        self.asset_manifest = asset_manifest
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        self._compiled = None  # (source version, static_segments, slots, deflated_segments)
+        self._last_check = 0.0
+        try:
+            self._load()
+        except FileNotFoundError:
+            logger.error(f"❌ {self.path} not found")
+
+    def _source_version(self):
+        """mtime of the template file plus the version of the image manifest"""
+        manifest_version = self.asset_manifest.version if self.asset_manifest is not None else None
+        return os.stat(self.path).st_mtime, manifest_version
+
+    def _load(self):
+        """Read and compile the template file"""
+        version = self._source_version()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            html_content = f.read()
+        if self.asset_manifest is not None:
+            html_content = self.asset_manifest.rewrite_html(html_content)
+        static_segments, slots = self.compile(html_content)
+        deflated_segments = None
+        if self.compress_level is not None:
+            deflated_segments = [deflate_segment(segment, self.compress_level) for segment in static_segments]
+        self._compiled = (version, static_segments, slots, deflated_segments)
+        self._last_check = time.monotonic()
+        logger.info(f"📄 Compiled template {self.path}: {len(slots)} slots")
+
+    def compile(self, html_content: str):
+        """Split the document into static byte segments and (field, format_spec) slots"""
+        # Every occurrence of every anchor, in document order
+        matches = []
+        for anchor, template in self.replacements.items():
+            start = html_content.find(anchor)
+            if start == -1:
+                logger.debug(f"Template anchor not found in {self.path}: {anchor[:40]!r}")
+            while start != -1:
+                matches.append((start, start + len(anchor), template))
+                start = html_content.find(anchor, start + len(anchor))
+        matches.sort()
+
+        static_segments = []
+        slots = []
+        pending = []  # literal text accumulated for the current static segment
+        position = 0
+        for start, end, template in matches:
+            if start < position:
+                raise ValueError(f"Overlapping template anchors in {self.path} at offset {start}")
+            pending.append(html_content[position:start])
+            for literal, field_name, format_spec, conversion in string.Formatter().parse(template):
+                pending.append(literal)
+                if field_name is not None:
+                    static_segments.append(''.join(pending).encode('utf-8'))
+                    slots.append((field_name, format_spec or ''))
+                    pending = []
+            position = end
+        pending.append(html_content[position:])
+        static_segments.append(''.join(pending).encode('utf-8'))
+
+        return static_segments, slots
+
+    def _maybe_reload(self):
+        """Recompile if the file changed since the last check (at most once per check_interval)"""
+        now = time.monotonic()
+        if self._compiled is not None and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if self._compiled is not None and now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            try:
+                version = self._source_version()
+            except FileNotFoundError:
+                if self._compiled is None:
+                    raise
+                return
+            if self._compiled is None or version != self._compiled[0]:
+                self._load()
+
+    @property
+    def slot_names(self):
+        """Field names of the slots, in document order"""
+        self._maybe_reload()
+        return [field_name for field_name, format_spec in self._compiled[2]]
+
+    def render(self, values: dict = None) -> bytes:
+        """Render the template with slot values as UTF-8 bytes"""
+        self._maybe_reload()
+        version, static_segments, slots, deflated_segments = self._compiled
+        if not slots:
+            return static_segments[0]
+
+        parts = [static_segments[0]]
+        for (field_name, format_spec), segment in zip(slots, static_segments[1:]):
+            parts.append(format(values[field_name], format_spec).encode('utf-8'))
+            parts.append(segment)
+        return b''.join(parts)
+
+    def render_gzip(self, values: dict = None) -> bytes:
+        """Render the template as a gzip stream from the precompressed static segments"""
+        self._maybe_reload()
+        version, static_segments, slots, deflated_segments = self._compiled
+        if deflated_segments is None:
+            raise ValueError(f"Template {self.path} was compiled without compress_level")
+
+        parts = [(static_segments[0], deflated_segments[0])]
+        for (field_name, format_spec), segment, deflated in zip(slots, static_segments[1:], deflated_segments[1:]):
+            parts.append((format(values[field_name], format_spec).encode('utf-8'), None))
+            parts.append((segment, deflated))
+        return gzip_from_parts(parts)
@@ -0,0 +1,81 @@
+"""
+/api/dashboard and /api/historical-data reject days below 1 on both servers
+Validation happens before any Supabase lookup, so no backend is needed.
+"""
+
+import json
+import threading
+import unittest
+import urllib.request
+import urllib.error
+from http.server import ThreadingHTTPServer
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import async_server
+from mini_app_server import RequestHandler
+
+INVALID_DAYS = ('0', '-1', '-30', 'abc')
+
+
+class StdlibServerDaysTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.httpd = ThreadingHTTPServer(('127.0.0.1', 0), RequestHandler)
+        threading.Thread(target=cls.httpd.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.httpd.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(self.base_url + path) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_dashboard_rejects_days_below_one(self):
+        for days in INVALID_DAYS:
+            with self.subTest(days=days):
+                status, body = self.get(f'/api/dashboard?user_id=123&days={days}')
+                self.assertEqual(status, 400)
+                self.assertEqual(body['status'], 'error')
+
+    def test_historical_data_rejects_days_below_one(self):
+        for days in INVALID_DAYS:
+            with self.subTest(days=days):
+                status, body = self.get(f'/api/historical-data?user_id=123&days={days}')
+                self.assertEqual(status, 400)
+                self.assertEqual(body['status'], 'error')
+
+
+class AsyncServerDaysTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.client = TestClient(TestServer(async_server.create_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_dashboard_rejects_days_below_one(self):
+        for days in INVALID_DAYS:
+            with self.subTest(days=days):
+                response = await self.client.get('/api/dashboard', params={'user_id': '123', 'days': days})
+                self.assertEqual(response.status, 400)
+                self.assertEqual((await response.json())['status'], 'error')
+
+    async def test_historical_data_rejects_days_below_one(self):
+        for days in INVALID_DAYS:
+            with self.subTest(days=days):
+                response = await self.client.get('/api/historical-data', params={'user_id': '123', 'days': days})
+                self.assertEqual(response.status, 400)
+                self.assertEqual((await response.json())['status'], 'error')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+Caching of /images/*: original images are revalidated, only content-hashed files are immutable
+Run from the repository root (static files are resolved relative to it).
+"""
+
+import unittest
+
+from static_files import resolve_static_request, build_static_response, static_cache_control
+
+ORIGINAL_IMAGE = '/images/cat_1.png'
+HASHED_IMAGE = '/images/dist/cat_1-120w.0123456789ab.png'
+
+
+class StaticCachingTest(unittest.TestCase):
+
+    def respond(self, request_headers):
+        info, extra_headers = resolve_static_request(ORIGINAL_IMAGE)
+        response = build_static_response(info, request_headers)
+        response.headers.update(extra_headers)
+        return info, response
+
+    def test_original_image_is_not_immutable(self):
+        _, response = self.respond({})
+        self.assertEqual(response.status, 200)
+        self.assertNotIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('max-age=', response.headers['Cache-Control'])
+        self.assertIn('ETag', response.headers)
+        self.assertIn('Last-Modified', response.headers)
+
+    def test_original_image_is_revalidated_by_etag(self):
+        info, _ = self.respond({})
+        _, response = self.respond({'If-None-Match': info.etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(response.length, 0)
+        self.assertNotIn('immutable', response.headers['Cache-Control'])
+
+    def test_original_image_is_revalidated_by_last_modified(self):
+        info, _ = self.respond({})
+        _, response = self.respond({'If-Modified-Since': info.last_modified})
+        self.assertEqual(response.status, 304)
+
+    def test_changed_original_image_is_sent_again(self):
+        _, response = self.respond({'If-None-Match': '"0-0"'})
+        self.assertEqual(response.status, 200)
+
+    def test_only_hashed_files_are_immutable(self):
+        self.assertIn('immutable', static_cache_control(HASHED_IMAGE))
+        self.assertNotIn('immutable', static_cache_control(ORIGINAL_IMAGE))
+        self.assertNotIn('immutable', static_cache_control('/images/dist/manifest.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
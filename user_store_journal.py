@@ -0,0 +1,196 @@
+"""
+Crash-safe journal of the in-memory user store (USER_DATA) for warm restarts
+Every stored update is appended to one file as a checksummed, fixed-layout record, and
+a restart replays the latest record per user instead of starting from demo numbers. A
+record torn by a crash mid-write fails its checksum and is cut off on replay. Once the
+journal holds several records per user it is compacted: rewritten with one record per
+user to a temporary file, fsynced and renamed over the old one. Appends and compaction
+are serialized through a lock file, so pre-forked workers can share one journal.
+"""
+
+import os
+import time
+import zlib
+import fcntl
+import struct
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# crc32 of the rest of the record, user id length, stored-at time (epoch seconds)
+RECORD_HEADER = struct.Struct('<IHd')
+# Don't bother compacting journals smaller than this many records
+MIN_COMPACT_RECORDS = 10000
+# Appends are written immediately (safe against process crashes) and fsynced at most this often
+FSYNC_INTERVAL = 1.0
+
+
+class UserStoreJournal:
+    """Append-only user id -> (row, meal count) journal with replay and compaction"""
+
+    def __init__(self, path: str, columns: int, compact_ratio: float = 4.0, max_age_hours: float = 24.0):
+        self.path = path
+        self.body = struct.Struct(f'<{columns}dq')   # row columns + meal count
+        self.compact_ratio = compact_ratio
+        self.max_age = max_age_hours * 3600
+        self._fd = None
+        self._last_fsync = 0.0
+        self.records = 0     # records in the file (this process's view)
+        self.users = 0       # distinct users as of the last replay/compaction
+        self.compactions = 0
+        self.write_errors = 0
+        self._lock_fd = None
+        self._pid = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @contextmanager
+    def _locked(self, operation):
+        if self._pid != os.getpid():
+            # flock locks belong to the open file, so forked workers need their own descriptors
+            self._lock_fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+            self._fd = None
+            self._pid = os.getpid()
+        fcntl.flock(self._lock_fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _open(self):
+        """Open (or reopen after another worker's compaction) the journal for appending"""
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if self._fd is not None and current == os.fstat(self._fd).st_ino:
+            return
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _encode(self, user_id: str, row, meal_count: int, stored_at: float) -> bytes:
+        key = user_id.encode('utf-8')
+        rest = struct.pack('<Hd', len(key), stored_at) + key + self.body.pack(*row, meal_count)
+        return struct.pack('<I', zlib.crc32(rest)) + rest
+
+    def _read(self):
+        """(latest record per user in recency order, length of the valid prefix, records read)"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return {}, 0, 0
+
+        latest = {}
+        offset = count = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            crc, key_length, stored_at = RECORD_HEADER.unpack_from(data, offset)
+            key_end = offset + RECORD_HEADER.size + key_length
+            end = key_end + self.body.size
+            if end > len(data) or zlib.crc32(data[offset + 4:end]) != crc:
+                break
+            user_id = data[offset + RECORD_HEADER.size:key_end].decode('utf-8')
+            *row, meal_count = self.body.unpack_from(data, key_end)
+            latest.pop(user_id, None)
+            latest[user_id] = (stored_at, row, meal_count)
+            offset = end
+            count += 1
+        if offset < len(data):
+            logger.warning(f"⚠️ User store journal: dropped {len(data) - offset} bytes of torn or corrupt records at the end")
+        return latest, offset, count
+
+    def replay(self) -> list:
+        """(user id, row, meal count, stored-at time) of the latest record per user, least recently stored first"""
+        started = time.perf_counter()
+        cutoff = time.time() - self.max_age
+        with self._locked(fcntl.LOCK_EX):
+            latest, valid_length, self.records = self._read()
+            if os.path.exists(self.path) and os.path.getsize(self.path) > valid_length:
+                os.truncate(self.path, valid_length)
+            self.users = len(latest)
+            self._open()
+
+        entries = [(user_id, row, meal_count, stored_at) for user_id, (stored_at, row, meal_count) in latest.items() if stored_at >= cutoff]
+        logger.info(f"💾 Replayed {len(entries)} users from {self.records} journal records in {(time.perf_counter() - started) * 1000:.0f}ms")
+        if self._needs_compaction():
+            self.compact()
+        return entries
+
+    def append(self, entries: list):
+        """Journal (user id, row, meal count) entries in one write; errors are logged, not raised"""
+        stored_at = time.time()
+        data = b''.join(self._encode(user_id, row, meal_count, stored_at) for user_id, row, meal_count in entries)
+        try:
+            with self._locked(fcntl.LOCK_SH):
+                self._open()
+                os.write(self._fd, data)
+                if stored_at - self._last_fsync >= FSYNC_INTERVAL:
+                    os.fsync(self._fd)
+                    self._last_fsync = stored_at
+        except OSError as e:
+            self.write_errors += 1
+            logger.error(f"❌ User store journal write failed: {e}")
+            return
+        self.records += len(entries)
+        if self._needs_compaction():
+            self.compact()
+
+    def _needs_compaction(self) -> bool:
+        return self.records >= MIN_COMPACT_RECORDS and self.records > self.compact_ratio * max(1, self.users)
+
+    def compact(self):
+        """Rewrite the journal with the latest record per user (dropping expired ones)"""
+        started = time.perf_counter()
+        cutoff = time.time() - self.max_age
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with self._locked(fcntl.LOCK_EX):
+                # Re-read the file rather than trusting memory: other workers append to it too
+                latest, _, records_before = self._read()
+                with open(temporary, 'wb') as f:
+                    for user_id, (stored_at, row, meal_count) in latest.items():
+                        if stored_at >= cutoff:
+                            f.write(self._encode(user_id, row, meal_count, stored_at))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporary, self.path)
+                directory_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+                try:
+                    os.fsync(directory_fd)
+                finally:
+                    os.close(directory_fd)
+                self.records = self.users = sum(1 for stored_at, _, _ in latest.values() if stored_at >= cutoff)
+                self._open()
+        except OSError as e:
+            self.write_errors += 1
+            logger.error(f"❌ User store journal compaction failed: {e}")
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return
+        self.compactions += 1
+        logger.info(f"💾 Compacted user store journal: {records_before} -> {self.records} records in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    def close(self):
+        """fsync and close the journal"""
+        if self._fd is not None:
+            try:
+                os.fsync(self._fd)
+            except OSError as e:
+                logger.error(f"❌ User store journal fsync failed: {e}")
+            os.close(self._fd)
+            self._fd = None
+
+    def stats(self) -> dict:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        return {
+            'path': self.path,
+            'bytes': size,
+            'records': self.records,
+            'users': self.users,
+            'compactions': self.compactions,
+            'write_errors': self.write_errors
+        }
@@ -9,29 +9,24 @@ import json
 from aiohttp import web, ClientSession
 from aiohttp.web import Request, Response
 import logging
+from user_store import UserNutritionStore
+from serialization import PayloadTemplate, encode_payload, VARY as ENCODED_VARY
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# In-memory storage for user nutrition data
+# In-memory storage for user nutrition data (compact, LRU-bounded; see user_store.py)
 # In production, this should be replaced with a proper database
-USER_DATA = {}
+USER_DATA = UserNutritionStore()
 
 # Sample user data for testing
-sample_data = {
-    'user_123': {
-        'user_id': 'user_123',
-        'targets': {'calories': 2500, 'protein_g': 200, 'fats_g': 80, 'carbs_g': 300},
-        'consumed_today': {'calories': 301, 'protein_g': 39, 'fats_g': 19, 'carbs_g': 49},
-        'remaining': {'calories': 2199, 'protein_g': 161, 'fats_g': 61, 'carbs_g': 251},
-        'progress': {'calories': 0.12, 'protein_g': 0.195, 'fats_g': 0.2375, 'carbs_g': 0.1633},
-        'meal_count': 1
-    }
-}
-
-# Initialize with sample data
-USER_DATA.update(sample_data)
+USER_DATA.update(
+    'user_123',
+    targets={'calories': 2500, 'protein_g': 200, 'fats_g': 80, 'carbs_g': 300},
+    consumed_today={'calories': 301, 'protein_g': 39, 'fats_g': 19, 'carbs_g': 49},
+    meal_count=1
+)
 
 # Utility function for bots to update user data
 def update_user_nutrition_data(user_id, targets=None, consumed_today=None, meal_count=0):
@@ -51,39 +46,12 @@ def update_user_nutrition_data(user_id, targets=None, consumed_today=None, meal_
             consumed_today={'calories': 450, 'protein_g': 35, 'fats_g': 15, 'carbs_g': 60},
             meal_count=2
         )
-    """
-    user_id_str = str(user_id)
-
-    # Calculate remaining amounts
-    remaining = {}
-    progress = {}
-
-    if targets and consumed_today:
-        remaining = {
-            'calories': max(0, targets.get('calories', 2000) - consumed_today.get('calories', 0)),
-            'protein_g': max(0, targets.get('protein_g', 150) - consumed_today.get('protein_g', 0)),
-            'fats_g': max(0, targets.get('fats_g', 65) - consumed_today.get('fats_g', 0)),
-            'carbs_g': max(0, targets.get('carbs_g', 250) - consumed_today.get('carbs_g', 0))
-        }
-
-        progress = {
-            'calories': min(1.0, consumed_today.get('calories', 0) / targets.get('calories', 2000)),
-            'protein_g': min(1.0, consumed_today.get('protein_g', 0) / targets.get('protein_g', 150)),
-            'fats_g': min(1.0, consumed_today.get('fats_g', 0) / targets.get('fats_g', 65)),
-            'carbs_g': min(1.0, consumed_today.get('carbs_g', 0) / targets.get('carbs_g', 250))
-        }
-
-    USER_DATA[user_id_str] = {
-        'user_id': user_id_str,
-        'targets': targets or {'calories': 2000, 'protein_g': 150, 'fats_g': 65, 'carbs_g': 250},
-        'consumed_today': consumed_today or {'calories': 0, 'protein_g': 0, 'fats_g': 0, 'carbs_g': 0},
-        'remaining': remaining or {'calories': 2000, 'protein_g': 150, 'fats_g': 65, 'carbs_g': 250},
-        'progress': progress or {'calories': 0, 'protein_g': 0, 'fats_g': 0, 'carbs_g': 0},
-        'meal_count': meal_count
-    }
 
-    print(f"Updated nutrition data for user {user_id}: {USER_DATA[user_id_str]}")
-    return USER_DATA[user_id_str]
+    Remaining amounts and progress are derived from targets and consumed_today when read.
+    """
+    user_data = USER_DATA.update(user_id, targets, consumed_today, meal_count)
+    print(f"Updated nutrition data for user {user_id}: {user_data}")
+    return user_data
 
 async def nutrition_dashboard(request: Request) -> Response:
     """Serve the nutrition dashboard HTML."""
@@ -200,6 +168,20 @@ async def api_update_data(request: Request) -> Response:
     except Exception as e:
         return web.json_response({'status': 'error', 'message': str(e)}, status=400)
 
+# /api/nutrition-data demo payload, encoded once (serialization.py)
+DEMO_NUTRITION_PAYLOAD = PayloadTemplate({
+    'targets': {'calories': 2500, 'protein_g': 200, 'fats_g': 80, 'carbs_g': 300},
+    'consumed_today': {'calories': 301, 'protein_g': 39, 'fats_g': 19, 'carbs_g': 49},
+    'remaining': {'calories': 2199, 'protein_g': 161, 'fats_g': 61, 'carbs_g': 251},
+    'progress': {'calories': 0.12, 'protein_g': 0.195, 'fats_g': 0.2375, 'carbs_g': 0.1633},
+    'meal_count': 1
+})
+
+def demo_nutrition_response(request: Request, user_id: str) -> Response:
+    """Demo nutrition data for a user, as JSON or MessagePack"""
+    body, content_type = encode_payload(DEMO_NUTRITION_PAYLOAD.bind(user_id=user_id), request.headers.get('Accept'))
+    return web.Response(body=body, content_type=content_type, headers={'Vary': ENCODED_VARY})
+
 async def api_nutrition_data(request: Request) -> Response:
     """API endpoint to get real nutrition data for dashboard."""
     user_id = request.query.get('user_id', 'user_123')
@@ -273,14 +255,7 @@ async def api_nutrition_data(request: Request) -> Response:
         else:
             # Use fallback demo data when Supabase is not available
             logger.info("Supabase not configured, using demo data")
-            return web.json_response({
-                'user_id': user_id,
-                'targets': {'calories': 2500, 'protein_g': 200, 'fats_g': 80, 'carbs_g': 300},
-                'consumed_today': {'calories': 301, 'protein_g': 39, 'fats_g': 19, 'carbs_g': 49},
-                'remaining': {'calories': 2199, 'protein_g': 161, 'fats_g': 61, 'carbs_g': 251},
-                'progress': {'calories': 0.12, 'protein_g': 0.195, 'fats_g': 0.2375, 'carbs_g': 0.1633},
-                'meal_count': 1
-            })
+            return demo_nutrition_response(request, user_id)
 
     except Exception as e:
         logger.error(f"Error fetching nutrition data for user {user_id}: {e}")
@@ -293,14 +268,7 @@ async def api_nutrition_data(request: Request) -> Response:
 
         # Fallback to demo data
         print(f"Using demo data for user {user_id}")
-        return web.json_response({
-            'user_id': user_id,
-            'targets': {'calories': 2500, 'protein_g': 200, 'fats_g': 80, 'carbs_g': 300},
-            'consumed_today': {'calories': 301, 'protein_g': 39, 'fats_g': 19, 'carbs_g': 49},
-            'remaining': {'calories': 2199, 'protein_g': 161, 'fats_g': 61, 'carbs_g': 251},
-            'progress': {'calories': 0.12, 'protein_g': 0.195, 'fats_g': 0.2375, 'carbs_g': 0.1633},
-            'meal_count': 1
-        })
+        return demo_nutrition_response(request, user_id)
 
 async def api_update_user_data(request: Request) -> Response:
     """API endpoint for bot to update user nutrition data."""
@@ -308,13 +276,10 @@ async def api_update_user_data(request: Request) -> Response:
         data = await request.json()
         user_id = str(data.get('user_id', 'user_123'))
 
-        # Store the real user data
+        # Store the real user data (remaining and progress are derived from targets and consumed_today)
         USER_DATA[user_id] = {
-            'user_id': user_id,
             'targets': data.get('targets', {'calories': 2500, 'protein_g': 200, 'fats_g': 80, 'carbs_g': 300}),
             'consumed_today': data.get('consumed_today', {'calories': 0, 'protein_g': 0, 'fats_g': 0, 'carbs_g': 0}),
-            'remaining': data.get('remaining', {'calories': 2500, 'protein_g': 200, 'fats_g': 80, 'carbs_g': 300}),
-            'progress': data.get('progress', {'calories': 0, 'protein_g': 0, 'fats_g': 0, 'carbs_g': 0}),
             'meal_count': data.get('meal_count', 0)
         }
 